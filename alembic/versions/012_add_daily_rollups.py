@@ -0,0 +1,121 @@
+"""Add daily report rollup tables
+
+Revision ID: 012_add_daily_rollups
+Revises: 011_remove_log_format
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "012_add_daily_rollups"
+down_revision: str | None = "011_remove_log_format"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def _counter(name: str) -> sa.Column:
+    return sa.Column(name, sa.BigInteger(), nullable=False, server_default="0")
+
+
+def _rollup_tables() -> dict:
+    """Return ``{table: (columns, (index_name, index_columns, unique))}``."""
+    return {
+        "rollup_daily_totals": (
+            [
+                sa.Column(
+                    "total_users", sa.Integer(), nullable=False, server_default="0"
+                ),
+                _counter("total_log_entries"),
+                _counter("total_requests"),
+                _counter("total_data_transmitted"),
+                _counter("source_max_user_id"),
+                _counter("source_max_log_id"),
+                sa.Column("built_at", sa.DateTime(), nullable=False),
+            ],
+            ("ix_rollup_daily_totals_day", ["day"], True),
+        ),
+        "rollup_daily_users": (
+            [
+                sa.Column("username", sa.String(length=255), nullable=False),
+                _counter("requests"),
+                _counter("data_transmitted"),
+            ],
+            ("ux_rollup_daily_users_day_username", ["day", "username"], True),
+        ),
+        "rollup_daily_domains": (
+            [
+                sa.Column("domain", sa.String(length=255), nullable=False),
+                _counter("requests"),
+                _counter("data_transmitted"),
+            ],
+            ("ux_rollup_daily_domains_day_domain", ["day", "domain"], True),
+        ),
+        "rollup_daily_urls": (
+            [
+                sa.Column("url", sa.Text(), nullable=False),
+                _counter("requests"),
+                sa.Column(
+                    "unique_users", sa.Integer(), nullable=False, server_default="0"
+                ),
+                _counter("data_transmitted"),
+            ],
+            ("ix_rollup_daily_urls_day", ["day"], False),
+        ),
+        "rollup_daily_responses": (
+            [
+                sa.Column("response", sa.Integer(), nullable=False),
+                _counter("requests"),
+            ],
+            ("ux_rollup_daily_responses_day_response", ["day", "response"], True),
+        ),
+        "rollup_daily_ips": (
+            [
+                sa.Column("ip", sa.String(length=255), nullable=False),
+                sa.Column(
+                    "user_count", sa.Integer(), nullable=False, server_default="0"
+                ),
+                sa.Column("usernames", sa.Text(), nullable=False),
+                _counter("requests"),
+                _counter("data_transmitted"),
+            ],
+            ("ux_rollup_daily_ips_day_ip", ["day", "ip"], True),
+        ),
+    }
+
+
+def upgrade() -> None:
+    """Create the per-day rollup tables served for closed days."""
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    for table_name, (columns, index) in _rollup_tables().items():
+        if inspector.has_table(table_name):
+            print(f"Skipping creation of '{table_name}' because it already exists")
+            continue
+
+        op.create_table(
+            table_name,
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("day", sa.Date(), nullable=False),
+            *columns,
+            sa.PrimaryKeyConstraint("id"),
+        )
+        index_name, index_columns, unique = index
+        op.create_index(index_name, table_name, index_columns, unique=unique)
+
+
+def downgrade() -> None:
+    """Drop the rollup tables; they can be rebuilt from the daily tables."""
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    for table_name in reversed(list(_rollup_tables())):
+        if inspector.has_table(table_name):
+            op.drop_table(table_name)
@@ -0,0 +1,62 @@
+"""Add retention_runs table
+
+Revision ID: 013_add_retention_runs
+Revises: 012_add_daily_rollups
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "013_add_retention_runs"
+down_revision: str | None = "012_add_daily_rollups"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def _counter(name: str) -> sa.Column:
+    return sa.Column(name, sa.BigInteger(), nullable=False, server_default="0")
+
+
+def upgrade() -> None:
+    """Create retention_runs table."""
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    if not inspector.has_table("retention_runs"):
+        op.create_table(
+            "retention_runs",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("started_at", sa.DateTime(), nullable=False),
+            sa.Column("finished_at", sa.DateTime(), nullable=True),
+            sa.Column("days_dropped", sa.Integer(), nullable=False, server_default="0"),
+            _counter("rows_deleted"),
+            _counter("bytes_reclaimed"),
+            sa.Column(
+                "archived_files", sa.Integer(), nullable=False, server_default="0"
+            ),
+            sa.Column("details", sa.Text(), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index(
+            "ix_retention_runs_started_at", "retention_runs", ["started_at"]
+        )
+    else:
+        print("Skipping creation of 'retention_runs' because it already exists")
+
+
+def downgrade() -> None:
+    """Drop retention_runs table."""
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    if inspector.has_table("retention_runs"):
+        op.drop_table("retention_runs")
+    else:
+        print("Skipping drop of 'retention_runs' because it does not exist")
@@ -0,0 +1,87 @@
+"""Add blacklist hit summary tables
+
+Revision ID: 014_add_blacklist_hits
+Revises: 013_add_retention_runs
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "014_add_blacklist_hits"
+down_revision: str | None = "013_add_retention_runs"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Create the per-day blacklist hit summary tables."""
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    if not inspector.has_table("blacklist_daily_hit_days"):
+        op.create_table(
+            "blacklist_daily_hit_days",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("day", sa.Date(), nullable=False),
+            sa.Column(
+                "last_log_id", sa.BigInteger(), nullable=False, server_default="0"
+            ),
+            sa.Column(
+                "untagged", sa.SmallInteger(), nullable=False, server_default="0"
+            ),
+            sa.Column("built_at", sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index(
+            "ix_blacklist_daily_hit_days_day",
+            "blacklist_daily_hit_days",
+            ["day"],
+            unique=True,
+        )
+    else:
+        print(
+            "Skipping creation of 'blacklist_daily_hit_days' because it already exists"
+        )
+
+    if not inspector.has_table("blacklist_daily_hits"):
+        op.create_table(
+            "blacklist_daily_hits",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("day", sa.Date(), nullable=False),
+            sa.Column("username", sa.String(length=255), nullable=False),
+            sa.Column("host", sa.String(length=255), nullable=False),
+            sa.Column("domain", sa.String(length=255), nullable=False),
+            sa.Column("requests", sa.BigInteger(), nullable=False, server_default="0"),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index(
+            "ux_blacklist_daily_hits_day_user_host",
+            "blacklist_daily_hits",
+            ["day", "username", "host"],
+            unique=True,
+        )
+        op.create_index(
+            "ix_blacklist_daily_hits_username", "blacklist_daily_hits", ["username"]
+        )
+        op.create_index(
+            "ix_blacklist_daily_hits_domain", "blacklist_daily_hits", ["domain"]
+        )
+    else:
+        print("Skipping creation of 'blacklist_daily_hits' because it already exists")
+
+
+def downgrade() -> None:
+    """Drop the summary tables; they can be rebuilt from the daily tables."""
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    for table_name in ("blacklist_daily_hits", "blacklist_daily_hit_days"):
+        if inspector.has_table(table_name):
+            op.drop_table(table_name)
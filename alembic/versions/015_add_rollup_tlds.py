@@ -0,0 +1,55 @@
+"""Add per-TLD report rollup table
+
+Revision ID: 015_add_rollup_tlds
+Revises: 014_add_blacklist_hits
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "015_add_rollup_tlds"
+down_revision: str | None = "014_add_blacklist_hits"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Create rollup_daily_tlds; older rollups keep serving per-host totals."""
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    if not inspector.has_table("rollup_daily_tlds"):
+        op.create_table(
+            "rollup_daily_tlds",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("day", sa.Date(), nullable=False),
+            sa.Column("tld", sa.String(length=63), nullable=False),
+            sa.Column("requests", sa.BigInteger(), nullable=False, server_default="0"),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index(
+            "ux_rollup_daily_tlds_day_tld",
+            "rollup_daily_tlds",
+            ["day", "tld"],
+            unique=True,
+        )
+    else:
+        print("Skipping creation of 'rollup_daily_tlds' because it already exists")
+
+
+def downgrade() -> None:
+    """Drop rollup_daily_tlds; it is rebuilt with the rollups."""
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    if inspector.has_table("rollup_daily_tlds"):
+        op.drop_table("rollup_daily_tlds")
+    else:
+        print("Skipping drop of 'rollup_daily_tlds' because it does not exist")
@@ -0,0 +1,68 @@
+"""Add the blacklist entries the hit summary was counted against
+
+Revision ID: 016_add_blacklist_summary_entries
+Revises: 015_add_rollup_tlds
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "016_add_blacklist_summary_entries"
+down_revision: str | None = "015_add_rollup_tlds"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Create blacklist_summary_entries from the active blacklist.
+
+    A summary counted before this table existed was counted against the
+    blacklist as it is now, barring an edit whose recount failed.
+    """
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    if not inspector.has_table("blacklist_summary_entries"):
+        op.create_table(
+            "blacklist_summary_entries",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("entry", sa.String(length=255), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index(
+            "ix_blacklist_summary_entries_entry",
+            "blacklist_summary_entries",
+            ["entry"],
+            unique=True,
+        )
+        counted = inspector.has_table("blacklist_daily_hit_days") and (
+            conn.execute(sa.text("SELECT 1 FROM blacklist_daily_hit_days")).first()
+            is not None
+        )
+        if counted and inspector.has_table("blacklist_domains"):
+            op.execute(
+                "INSERT INTO blacklist_summary_entries (entry) "
+                "SELECT domain FROM blacklist_domains WHERE active = 1"
+            )
+    else:
+        print(
+            "Skipping creation of 'blacklist_summary_entries' because it already exists"
+        )
+
+
+def downgrade() -> None:
+    """Drop blacklist_summary_entries."""
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    if inspector.has_table("blacklist_summary_entries"):
+        op.drop_table("blacklist_summary_entries")
+    else:
+        print("Skipping drop of 'blacklist_summary_entries' because it does not exist")
@@ -16,6 +16,7 @@ from loguru import logger
 
 from config import Config
 from database.database import migrate_database
+from parsers.log_tailer import stop_log_tailer
 from routes import register_routes
 from routes.auth_routes import csrf
 from routes.stats_routes import realtime_data_thread
@@ -230,6 +231,10 @@ def shutdown_app(scheduler, socketio, app=None):
     logger.info("Stopping notification monitor...")
     stop_notification_monitor()
 
+    # Flush buffered log rows and stop the tailer
+    logger.info("Stopping log tailer...")
+    stop_log_tailer()
+
     # Cleanup Telegram service
     if TELEGRAM_AVAILABLE and cleanup_telegram:
         logger.info("Cleaning up Telegram service...")
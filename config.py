@@ -109,6 +109,71 @@ class Config:
     SQUID_PORT = safe_get_env("SQUID_PORT", 3128, var_type=int)
     BLACKLIST_DOMAINS = safe_get_env("BLACKLIST_DOMAINS", "")
 
+    # Access-log import: rows buffered before each bulk write/commit.
+    LOG_IMPORT_BATCH_SIZE = safe_get_env("LOG_IMPORT_BATCH_SIZE", 5000, var_type=int)
+    # Worker processes used to parse large historical imports (0 = auto).
+    LOG_IMPORT_WORKERS = safe_get_env("LOG_IMPORT_WORKERS", 0, var_type=int)
+    # Live ingestion: a long-lived tailer thread instead of 30-second polling.
+    LOG_TAILER_ENABLED = safe_get_env("LOG_TAILER_ENABLED", True, var_type=bool)
+    # Longest time (seconds) tailed rows stay buffered before being committed.
+    LOG_TAIL_FLUSH_SECONDS = safe_get_env("LOG_TAIL_FLUSH_SECONDS", 2.0, var_type=float)
+    # File check interval (seconds) when inotify is not available.
+    LOG_TAIL_POLL_SECONDS = safe_get_env("LOG_TAIL_POLL_SECONDS", 1.0, var_type=float)
+    # Merge hits of the same user, URL and response within this many seconds into
+    # one log row (request_count > 1). 0 keeps one row per request.
+    LOG_AGGREGATION_BUCKET_SECONDS = safe_get_env(
+        "LOG_AGGREGATION_BUCKET_SECONDS", 0, var_type=int
+    )
+    # Parsed chunks (about 1 MiB of log each) buffered between the import
+    # pipeline's reader/parser stages and the database writer.
+    LOG_PIPELINE_QUEUE_SIZE = safe_get_env("LOG_PIPELINE_QUEUE_SIZE", 8, var_type=int)
+    # Serve reports of closed days from the nightly rollup tables.
+    REPORT_ROLLUPS_ENABLED = safe_get_env("REPORT_ROLLUPS_ENABLED", True, var_type=bool)
+    # Busiest URLs kept per day in the rollup (reports show the top 20).
+    REPORT_ROLLUP_TOP_URLS = safe_get_env("REPORT_ROLLUP_TOP_URLS", 100, var_type=int)
+    # Days of a range report aggregated in parallel, one pooled connection each.
+    REPORT_DAY_WORKERS = safe_get_env("REPORT_DAY_WORKERS", 4, var_type=int)
+    # Seconds a per-day range report may run before it is cancelled (0 = no limit).
+    REPORT_DAY_TIMEOUT = safe_get_env("REPORT_DAY_TIMEOUT", 60.0, var_type=float)
+    # "tables": one user/log table pair per day. "partitions" (PostgreSQL only):
+    # the same daily tables created as day partitions of access_user/access_log.
+    DAILY_TABLE_BACKEND = safe_get_env("DAILY_TABLE_BACKEND", "tables").lower()
+    # Retention, in days (0 = keep forever). Daily user/log tables older than
+    # RETENTION_LOG_DAYS are dropped whole, optionally archived first.
+    RETENTION_LOG_DAYS = safe_get_env("RETENTION_LOG_DAYS", 0, var_type=int)
+    RETENTION_ROLLUP_DAYS = safe_get_env("RETENTION_ROLLUP_DAYS", 0, var_type=int)
+    RETENTION_DENIED_LOG_DAYS = safe_get_env(
+        "RETENTION_DENIED_LOG_DAYS", 0, var_type=int
+    )
+    RETENTION_METRICS_DAYS = safe_get_env("RETENTION_METRICS_DAYS", 1, var_type=int)
+    # Directory for gzip CSV archives of expired days (empty = no archive).
+    RETENTION_ARCHIVE_DIR = safe_get_env("RETENTION_ARCHIVE_DIR", "")
+    # Rows removed per DELETE statement when trimming denied_logs/system_metrics.
+    RETENTION_DELETE_CHUNK = safe_get_env("RETENTION_DELETE_CHUNK", 5000, var_type=int)
+    # Connection pool of MySQL/PostgreSQL engines (SQLite keeps its defaults).
+    DB_POOL_SIZE = safe_get_env("DB_POOL_SIZE", 10, var_type=int)
+    DB_MAX_OVERFLOW = safe_get_env("DB_MAX_OVERFLOW", 10, var_type=int)
+    # Seconds a checkout waits for a free connection before failing.
+    DB_POOL_TIMEOUT = safe_get_env("DB_POOL_TIMEOUT", 30.0, var_type=float)
+    # Seconds after which a pooled connection is replaced (-1 = never); keep it
+    # below the server's idle timeout (MySQL wait_timeout).
+    DB_POOL_RECYCLE = safe_get_env("DB_POOL_RECYCLE", 1800, var_type=int)
+    DB_POOL_PRE_PING = safe_get_env("DB_POOL_PRE_PING", True, var_type=bool)
+    # Days whose mapped user/log classes stay cached (least recently used
+    # days are dropped first; 0 = no limit).
+    DYNAMIC_MODEL_CACHE_SIZE = safe_get_env(
+        "DYNAMIC_MODEL_CACHE_SIZE", 64, var_type=int
+    )
+    # Hosts whose registrable domain/public suffix stay cached (0 = no limit).
+    HOST_CACHE_SIZE = safe_get_env("HOST_CACHE_SIZE", 65536, var_type=int)
+    # Optional public_suffix_list.dat (publicsuffix.org) replacing the built-in
+    # list of common multi-label suffixes (co.uk, com.cu, ...).
+    PUBLIC_SUFFIX_FILE = safe_get_env("PUBLIC_SUFFIX_FILE", "")
+    # Seconds the cached list of database tables is trusted before re-listing.
+    TABLE_CATALOG_TTL_SECONDS = safe_get_env(
+        "TABLE_CATALOG_TTL_SECONDS", 60.0, var_type=float
+    )
+
     # Multi-proxy load-balancing: comma-separated list of host:port entries.
     # Example: SQUID_HOSTS="192.168.0.10:3128,192.168.0.11:3128"
     # When set, overrides SQUID_HOST / SQUID_PORT for the connections page.
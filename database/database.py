@@ -1,9 +1,11 @@
 import os
 import re
 import sqlite3
+import threading
 import time
 import uuid
-from datetime import date, datetime
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
 from pathlib import Path
 from typing import Any
 from urllib.parse import unquote, urlparse
@@ -28,6 +30,7 @@ from sqlalchemy.orm import sessionmaker
 from alembic import command
 from config import Config
 from database.base import Base  # noqa: F401
+from database.model_registry import ModelRegistry
 from database.models import (
     AdminUser,
     DeniedLog,
@@ -35,11 +38,25 @@ from database.models import (
     Notification,
     SystemMetrics,
 )
-from database.models.models import BlacklistDomain, create_dynamic_models
+from database.models.models import (
+    BlacklistDomain,
+    create_dynamic_models,
+    ensure_dynamic_columns,
+    ensure_dynamic_indexes,
+)
+from database.partitions import (
+    create_day_partitions,
+    drop_day_partitions,
+    ensure_partition_parents,
+    partitioned_storage,
+)
+from database.pool import pool_options
+from database.table_catalog import table_catalog
 
 _engine = None
 _Session = None
-dynamic_model_cache: dict[str, Any] = {}
+# Mapped (DynamicUser, DynamicLog) classes of the most recently used days.
+dynamic_model_cache: ModelRegistry = ModelRegistry()
 
 # SQLite startup failures can be transient when another process is closing the
 # database or when its WAL files are being initialized.  Keep this bounded so
@@ -279,7 +296,7 @@ def get_engine():
             cursor.execute("PRAGMA busy_timeout=30000")
             cursor.close()
     else:
-        _engine = create_engine(db_url, echo=False, future=True)
+        _engine = create_engine(db_url, echo=False, future=True, **pool_options())
     return _engine
 
 
@@ -292,9 +309,38 @@ def get_session():
     return _Session()
 
 
+_thread_sessions = threading.local()
+
+
+@contextmanager
+def session_scope():
+    """Transactional session shared by nested scopes of the same thread.
+
+    Meant for background threads: a loop iteration opens one scope and every
+    helper it calls that also uses ``session_scope`` joins the same session,
+    and so the same pooled connection, instead of checking out another one.
+    The outermost scope commits (or rolls back) and closes the session,
+    which hands the connection back to the pool.
+    """
+    session = getattr(_thread_sessions, "session", None)
+    if session is not None:
+        yield session
+        return
+
+    session = _thread_sessions.session = get_session()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        _thread_sessions.session = None
+        session.close()
+
+
 def table_exists(engine, table_name: str) -> bool:
-    inspector = inspect(engine)
-    return inspector.has_table(table_name)
+    return table_catalog.has_table(engine, table_name)
 
 
 def create_dynamic_tables(engine, date_suffix: str = None):
@@ -329,22 +375,25 @@ def create_dynamic_tables(engine, date_suffix: str = None):
 
     logger.info(f"CreateTable_{date_suffix or 'today'}")
 
-    if not table_exists(engine, user_table_name) or not table_exists(
-        engine, log_table_name
+    inspector = inspect(engine)
+    if not inspector.has_table(user_table_name) or not inspector.has_table(
+        log_table_name
     ):
         logger.info(
             f"Creating dynamic tables for date suffix '{date_suffix}': {user_table_name}, {log_table_name}"
         )
         # Use create_dynamic_models to define and create the per-day user/log tables
         try:
+            if partitioned_storage(engine):
+                create_day_partitions(engine, user_table_name, log_table_name)
             create_dynamic_models(engine, user_table_name, log_table_name)
         except Exception as e:
             logger.error(f"Error creating dynamic user/log tables: {e}")
             raise
 
-    created_tables = sorted(
-        set(inspect(engine).get_table_names()).difference(existing_tables)
-    )
+    current_tables = inspect(engine).get_table_names()
+    table_catalog.replace(engine, current_tables)
+    created_tables = sorted(set(current_tables).difference(existing_tables))
     if created_tables:
         logger.warning(
             "Database schema repair created missing tables: {}",
@@ -360,17 +409,15 @@ def repair_database_schema(engine, date_suffix: str = None) -> list[str]:
     database backup is required for data recovery.
     """
     before = set(inspect(engine).get_table_names())
+    table_catalog.replace(engine, before)
+    if partitioned_storage(engine):
+        ensure_partition_parents(engine)
     current_suffix = date_suffix or get_table_suffix()
     create_dynamic_tables(engine, date_suffix=current_suffix)
 
     # Keep historical user/log pairs consistent as well.  If one side of a
     # known pair was removed, recreate only that side and preserve the other.
-    known_suffixes = {current_suffix}
-    for table_name in inspect(engine).get_table_names():
-        if table_name.startswith(("user_", "log_")):
-            _, suffix = table_name.split("_", 1)
-            if suffix.isdigit() and len(suffix) == 8:
-                known_suffixes.add(suffix)
+    known_suffixes = {current_suffix, *get_dynamic_table_suffixes(engine)}
 
     for historical_suffix in sorted(known_suffixes):
         user_table_name, log_table_name = get_dynamic_table_names(historical_suffix)
@@ -381,6 +428,22 @@ def repair_database_schema(engine, date_suffix: str = None) -> list[str]:
         ):
             create_dynamic_tables(engine, date_suffix=historical_suffix)
 
+    # Daily tables created before their columns/indexes were declared still
+    # need them.  Only the days the ingester writes to are checked here;
+    # older days are left to ``manage_db.py index-tables``, so a long history
+    # neither delays the start nor gets locked by ALTER TABLE / CREATE INDEX.
+    current_day = datetime.strptime(current_suffix, "%Y%m%d")
+    recent_suffixes = {
+        current_suffix,
+        (current_day - timedelta(days=1)).strftime("%Y%m%d"),
+    }
+    added_indexes = ensure_dynamic_table_indexes(engine, recent_suffixes)
+    if added_indexes:
+        logger.warning(
+            "Database schema repair added missing columns and indexes: {}",
+            ", ".join(name for names in added_indexes.values() for name in names),
+        )
+
     after = set(inspect(engine).get_table_names())
     created_tables = sorted(after.difference(before))
 
@@ -394,16 +457,58 @@ def repair_database_schema(engine, date_suffix: str = None) -> list[str]:
     return created_tables
 
 
+def get_dynamic_table_suffixes(engine) -> list[str]:
+    """Return the ``YYYYMMDD`` suffixes of every daily user/log table."""
+    return list(table_catalog.day_suffixes(engine))
+
+
+def ensure_dynamic_table_indexes(engine, date_suffixes=None) -> dict[str, list[str]]:
+    """Add missing columns and indexes to existing daily tables.
+
+    Checks every daily table when ``date_suffixes`` is None.  Returns the
+    columns and indexes created per date suffix; days that needed none are
+    left out.
+    """
+    if date_suffixes is None:
+        date_suffixes = get_dynamic_table_suffixes(engine)
+    existing_tables = table_catalog.table_names(engine)
+
+    added = {}
+    for date_suffix in sorted(date_suffixes):
+        user_table_name, log_table_name = get_dynamic_table_names(date_suffix)
+        if (
+            user_table_name not in existing_tables
+            or log_table_name not in existing_tables
+        ):
+            continue
+        DynamicUser, DynamicLog = create_dynamic_models(
+            engine, user_table_name, log_table_name, ensure_indexes=False
+        )
+        created = ensure_dynamic_columns(engine, DynamicLog.__table__)
+        created += ensure_dynamic_indexes(engine, DynamicUser.__table__)
+        created += ensure_dynamic_indexes(engine, DynamicLog.__table__)
+        if created:
+            added[date_suffix] = created
+    return added
+
+
 def get_dynamic_table_names(date_suffix: str = None) -> tuple[str, str]:
     if date_suffix is None:
         date_suffix = get_table_suffix()
     return f"user_{date_suffix}", f"log_{date_suffix}"
 
 
+def drop_daily_tables(engine, date_suffix: str) -> None:
+    """Drop one day's user/log tables and forget their cached models."""
+    drop_day_partitions(engine, date_suffix)
+    dynamic_model_cache.pop(f"user_log_{date_suffix}", None)
+
+
 def get_dynamic_models(date_suffix: str):
     cache_key = f"user_log_{date_suffix}"
-    if cache_key in dynamic_model_cache:
-        return dynamic_model_cache[cache_key]
+    models = dynamic_model_cache.get(cache_key)
+    if models is not None:
+        return models
 
     engine = get_engine()
     user_table_name, log_table_name = get_dynamic_table_names(date_suffix)
@@ -423,8 +528,11 @@ def get_dynamic_models(date_suffix: str):
             )
             return None, None
 
+    # Read path: existing days are mapped as they are.  Missing columns and
+    # indexes are added by repair_database_schema and ``manage_db.py
+    # index-tables``, never on a cache miss.
     DynamicUser, DynamicLog = create_dynamic_models(
-        engine, user_table_name, log_table_name
+        engine, user_table_name, log_table_name, ensure_indexes=False
     )
 
     dynamic_model_cache[cache_key] = (DynamicUser, DynamicLog)
@@ -0,0 +1,55 @@
+"""Bounded registry of the mapped classes of the daily tables.
+
+``get_dynamic_models`` maps one day's ``user_YYYYMMDD`` / ``log_YYYYMMDD``
+pair on demand.  The classes are kept in a ``ModelRegistry`` so the same day
+is mapped once, but only for the ``Config.DYNAMIC_MODEL_CACHE_SIZE`` most
+recently used days: browsing through months of history no longer keeps a
+declarative base (and its ``MetaData``) alive for every day ever viewed.
+"""
+
+import threading
+from collections import OrderedDict
+
+from config import Config
+
+
+class ModelRegistry(OrderedDict):
+    """Least-recently-used mapping with a size limit.
+
+    Reads through ``[]`` or ``get`` mark an entry as used; once the registry
+    holds more than ``maxsize`` entries the least recently used one is
+    dropped.  ``maxsize`` defaults to ``Config.DYNAMIC_MODEL_CACHE_SIZE``
+    (0 = unbounded).
+    """
+
+    def __init__(self, *args, maxsize: int | None = None, **kwargs):
+        self.maxsize = maxsize
+        self._lock = threading.RLock()
+        super().__init__(*args, **kwargs)
+
+    def _limit(self) -> int:
+        return Config.DYNAMIC_MODEL_CACHE_SIZE if self.maxsize is None else self.maxsize
+
+    def __getitem__(self, key):
+        with self._lock:
+            value = super().__getitem__(key)
+            self.move_to_end(key)
+            return value
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self:
+                return default
+            return self[key]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            super().__setitem__(key, value)
+            self.move_to_end(key)
+            limit = self._limit()
+            while limit > 0 and len(self) > limit:
+                self.popitem(last=False)
+
+    def copy(self):
+        with self._lock:
+            return type(self)(self.items(), maxsize=self.maxsize)
@@ -1,13 +1,20 @@
 from datetime import datetime
 
+from loguru import logger
 from sqlalchemy import (
     BigInteger,
     Column,
+    Date,
     DateTime,
+    Index,
     Integer,
+    SmallInteger,
     String,
     Text,
+    inspect,
+    text,
 )
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declared_attr
 from sqlalchemy.orm import declarative_base
 
@@ -253,15 +260,195 @@ class SquidConfig(Base):
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
 
 
-def create_dynamic_models(engine, user_table_name: str, log_table_name: str):
+class RollupDay(Base):
+    """Report totals of one closed day, materialized from its daily tables.
+
+    ``source_max_*_id`` fingerprint the daily tables the rollup was built
+    from; rows added to the day afterwards (late lines, historical imports)
+    make the rollup stale until it is rebuilt.
+    """
+
+    __tablename__ = "rollup_daily_totals"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    day = Column(Date, nullable=False, unique=True, index=True)
+    total_users = Column(Integer, nullable=False, default=0)
+    total_log_entries = Column(BigInteger, nullable=False, default=0)
+    total_requests = Column(BigInteger, nullable=False, default=0)
+    total_data_transmitted = Column(BigInteger, nullable=False, default=0)
+    source_max_user_id = Column(BigInteger, nullable=False, default=0)
+    source_max_log_id = Column(BigInteger, nullable=False, default=0)
+    built_at = Column(DateTime, default=datetime.now, nullable=False)
+
+
+class RollupUser(Base):
+    __tablename__ = "rollup_daily_users"
+    __table_args__ = (
+        Index("ux_rollup_daily_users_day_username", "day", "username", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    day = Column(Date, nullable=False)
+    username = Column(String(255), nullable=False)
+    requests = Column(BigInteger, nullable=False, default=0)
+    data_transmitted = Column(BigInteger, nullable=False, default=0)
+
+
+class RollupDomain(Base):
+    __tablename__ = "rollup_daily_domains"
+    __table_args__ = (
+        Index("ux_rollup_daily_domains_day_domain", "day", "domain", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    day = Column(Date, nullable=False)
+    domain = Column(String(255), nullable=False)
+    requests = Column(BigInteger, nullable=False, default=0)
+    data_transmitted = Column(BigInteger, nullable=False, default=0)
+
+
+class RollupTld(Base):
+    """Requests per top-level domain, the source of the country chart."""
+
+    __tablename__ = "rollup_daily_tlds"
+    __table_args__ = (Index("ux_rollup_daily_tlds_day_tld", "day", "tld", unique=True),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    day = Column(Date, nullable=False)
+    tld = Column(String(63), nullable=False)
+    requests = Column(BigInteger, nullable=False, default=0)
+
+
+class RollupUrl(Base):
+    """The day's busiest URLs, by requests and by data (not every URL)."""
+
+    __tablename__ = "rollup_daily_urls"
+    __table_args__ = (Index("ix_rollup_daily_urls_day", "day"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    day = Column(Date, nullable=False)
+    url = Column(Text, nullable=False)
+    requests = Column(BigInteger, nullable=False, default=0)
+    unique_users = Column(Integer, nullable=False, default=0)
+    data_transmitted = Column(BigInteger, nullable=False, default=0)
+
+
+class RollupResponse(Base):
+    __tablename__ = "rollup_daily_responses"
+    __table_args__ = (
+        Index("ux_rollup_daily_responses_day_response", "day", "response", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    day = Column(Date, nullable=False)
+    response = Column(Integer, nullable=False)
+    requests = Column(BigInteger, nullable=False, default=0)
+
+
+class RollupIp(Base):
+    __tablename__ = "rollup_daily_ips"
+    __table_args__ = (Index("ux_rollup_daily_ips_day_ip", "day", "ip", unique=True),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    day = Column(Date, nullable=False)
+    ip = Column(String(255), nullable=False)
+    user_count = Column(Integer, nullable=False, default=0)
+    usernames = Column(Text, nullable=False, default="")
+    requests = Column(BigInteger, nullable=False, default=0)
+    data_transmitted = Column(BigInteger, nullable=False, default=0)
+
+
+class BlacklistHitDay(Base):
+    """Progress of the blacklist-hit summary of one day.
+
+    ``last_log_id`` is the highest ``log_YYYYMMDD`` id already counted in
+    ``blacklist_daily_hits``; later rows are added incrementally.
+    ``untagged`` marks days with rows imported before log rows carried their
+    host, which are matched by URL and rebuilt whole after blacklist edits.
+    """
+
+    __tablename__ = "blacklist_daily_hit_days"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    day = Column(Date, nullable=False, unique=True, index=True)
+    last_log_id = Column(BigInteger, nullable=False, default=0)
+    untagged = Column(SmallInteger, nullable=False, default=0)
+    built_at = Column(DateTime, default=datetime.now, nullable=False)
+
+
+class BlacklistSummaryEntry(Base):
+    """Blacklist entry the blacklist-hit summary was counted against.
+
+    Compared with the active blacklist, these rows tell which domains an
+    edit touched, whether it happened before or after a restart.
+    """
+
+    __tablename__ = "blacklist_summary_entries"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    entry = Column(String(255), nullable=False, unique=True, index=True)
+
+
+class BlacklistHit(Base):
+    """Blacklisted requests of one user to one host on one day."""
+
+    __tablename__ = "blacklist_daily_hits"
+    __table_args__ = (
+        Index(
+            "ux_blacklist_daily_hits_day_user_host",
+            "day",
+            "username",
+            "host",
+            unique=True,
+        ),
+        Index("ix_blacklist_daily_hits_username", "username"),
+        Index("ix_blacklist_daily_hits_domain", "domain"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    day = Column(Date, nullable=False)
+    username = Column(String(255), nullable=False)
+    host = Column(String(255), nullable=False)
+    domain = Column(String(255), nullable=False)
+    requests = Column(BigInteger, nullable=False, default=0)
+
+
+class RetentionRun(Base):
+    """Outcome of one retention pass, shown in the database admin page."""
+
+    __tablename__ = "retention_runs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    started_at = Column(DateTime, default=datetime.now, nullable=False, index=True)
+    finished_at = Column(DateTime, nullable=True)
+    days_dropped = Column(Integer, nullable=False, default=0)
+    rows_deleted = Column(BigInteger, nullable=False, default=0)
+    bytes_reclaimed = Column(BigInteger, nullable=False, default=0)
+    archived_files = Column(Integer, nullable=False, default=0)
+    details = Column(Text, nullable=False, default="")
+
+
+def create_dynamic_models(
+    engine, user_table_name: str, log_table_name: str, ensure_indexes: bool = True
+):
     """Factory to create dynamic user/log models bound to a fresh declarative base.
 
     Returns (DynamicUser, DynamicLog) and ensures tables are created on the given engine.
+    With ``ensure_indexes`` daily tables created before a column or index was
+    added to the models get the missing ones as well (see
+    ``ensure_dynamic_indexes``); callers that only read existing days pass
+    False so that no DDL runs on their behalf.  With partitioned storage the
+    caller creates the day's partitions first (see ``create_dynamic_tables``).
     """
     DynamicBase = declarative_base()
 
     class DynamicUser(DynamicBase):
         __tablename__ = user_table_name
+        # The unique index also serves username lookups (leftmost column).
+        __table_args__ = (
+            Index(f"ux_{user_table_name}_username_ip", "username", "ip", unique=True),
+            Index(f"ix_{user_table_name}_ip", "ip"),
+        )
         id = Column(Integer, primary_key=True, autoincrement=True)
         username = Column(String(255), nullable=False)
         ip = Column(String(255), nullable=False)
@@ -269,6 +456,21 @@ def create_dynamic_models(engine, user_table_name: str, log_table_name: str):
 
     class DynamicLog(DynamicBase):
         __tablename__ = log_table_name
+        # Every report joins on user_id and sums the counters, so the index
+        # covers them; the audit views also filter on response codes and
+        # created_at windows.
+        __table_args__ = (
+            Index(
+                f"ix_{log_table_name}_user_id",
+                "user_id",
+                "request_count",
+                "data_transmitted",
+            ),
+            Index(f"ix_{log_table_name}_created_at", "created_at"),
+            Index(f"ix_{log_table_name}_response", "response"),
+            Index(f"ix_{log_table_name}_host", "host"),
+            Index(f"ix_{log_table_name}_domain", "domain"),
+        )
         id = Column(Integer, primary_key=True, autoincrement=True)
         user_id = Column(Integer, nullable=False)
         url = Column(Text, nullable=False)
@@ -276,6 +478,64 @@ def create_dynamic_models(engine, user_table_name: str, log_table_name: str):
         request_count = Column(Integer, default=1)
         data_transmitted = Column(BigInteger, default=0)
         created_at = Column(DateTime, default=datetime.now)
+        # Filled at ingestion (see parsers.log_writer); NULL in rows imported
+        # before these columns existed.
+        host = Column(String(255))
+        domain = Column(String(255))
+        tld = Column(String(63))
 
     DynamicBase.metadata.create_all(engine, checkfirst=True)
+    if ensure_indexes:
+        ensure_dynamic_columns(engine, DynamicLog.__table__)
+        ensure_dynamic_indexes(engine, DynamicUser.__table__)
+        ensure_dynamic_indexes(engine, DynamicLog.__table__)
     return DynamicUser, DynamicLog
+
+
+def ensure_dynamic_columns(engine, table) -> list[str]:
+    """Add the nullable columns declared on a daily table that the database lacks.
+
+    Daily tables are not managed by Alembic, so columns added to the models
+    later reach the tables of past days here.  Returns the columns added.
+    """
+    existing = {item["name"] for item in inspect(engine).get_columns(table.name)}
+    missing = [column for column in table.columns if column.name not in existing]
+    if not missing:
+        return []
+
+    preparer = engine.dialect.identifier_preparer
+    with engine.begin() as conn:
+        for column in missing:
+            conn.execute(
+                text(
+                    f"ALTER TABLE {preparer.format_table(table)} "
+                    f"ADD COLUMN {preparer.quote(column.name)} "
+                    f"{column.type.compile(dialect=engine.dialect)}"
+                )
+            )
+    return [column.name for column in missing]
+
+
+def ensure_dynamic_indexes(engine, table) -> list[str]:
+    """Create the indexes declared on a daily table that the database lacks.
+
+    Returns the names of the indexes created.  A unique index is skipped, with
+    a warning, while the table holds duplicate rows.
+    """
+    existing = {item["name"] for item in inspect(engine).get_indexes(table.name)}
+    created = []
+    for index in sorted(table.indexes, key=lambda item: item.name):
+        if index.name in existing:
+            continue
+        try:
+            index.create(engine)
+        except IntegrityError as error:
+            logger.warning(
+                "Duplicate rows in {}; unique index {} not created: {}",
+                table.name,
+                index.name,
+                error.orig,
+            )
+            continue
+        created.append(index.name)
+    return created
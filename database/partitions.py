@@ -0,0 +1,201 @@
+"""PostgreSQL storage of the daily tables as partitions of two parents.
+
+With ``DAILY_TABLE_BACKEND=partitions`` every ``user_YYYYMMDD`` /
+``log_YYYYMMDD`` table is created as a partition of ``access_user`` /
+``access_log``, both range-partitioned by day on ``created_at``.  The
+partitions keep their daily names, so the ingestion pipeline, the dynamic
+models and the per-day report queries work unchanged, while:
+
+* SQL over a span of days can query the parents and let PostgreSQL prune
+  the partitions outside the ``created_at`` range;
+* ids come from one sequence per parent and are unique across days;
+* dropping a day (see ``drop_day_partitions``) is a metadata operation.
+
+A row belongs to the partition of the day of its ``created_at``, the log
+timestamp, which is also how the importer picks a row's daily table.
+
+MySQL partitions cannot be addressed as tables and every unique key of a
+partitioned MySQL table has to include the partition column, which rules
+out the per-day ``(username, ip)`` key; MySQL and SQLite therefore always
+use plain daily tables.
+"""
+
+import weakref
+from datetime import datetime, timedelta
+
+from loguru import logger
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    Integer,
+    MetaData,
+    Sequence,
+    String,
+    Table,
+    Text,
+    text,
+)
+
+from config import Config
+from database.table_catalog import table_catalog
+
+PARENT_METADATA = MetaData()
+
+_user_id_seq = Sequence("access_user_id_seq", metadata=PARENT_METADATA)
+_log_id_seq = Sequence("access_log_id_seq", metadata=PARENT_METADATA)
+
+# Column for column the layout of the daily tables (see create_dynamic_models);
+# PostgreSQL only attaches tables with exactly the parent's columns.
+access_user = Table(
+    "access_user",
+    PARENT_METADATA,
+    Column("id", Integer, server_default=_user_id_seq.next_value(), nullable=False),
+    Column("username", String(255), nullable=False),
+    Column("ip", String(255), nullable=False),
+    Column("created_at", DateTime),
+    postgresql_partition_by="RANGE (created_at)",
+)
+
+access_log = Table(
+    "access_log",
+    PARENT_METADATA,
+    Column("id", Integer, server_default=_log_id_seq.next_value(), nullable=False),
+    Column("user_id", Integer, nullable=False),
+    Column("url", Text, nullable=False),
+    Column("response", Integer, nullable=False),
+    Column("request_count", Integer),
+    Column("data_transmitted", BigInteger),
+    Column("created_at", DateTime),
+    Column("host", String(255)),
+    Column("domain", String(255)),
+    Column("tld", String(63)),
+    postgresql_partition_by="RANGE (created_at)",
+)
+
+PARENTS = {"user_": access_user, "log_": access_log}
+SEQUENCES = {"access_user": _user_id_seq, "access_log": _log_id_seq}
+
+_warned_unsupported = False
+# Engines whose parents were checked by ensure_partition_parents.
+_checked_parents = weakref.WeakSet()
+
+
+def partitioned_storage(engine) -> bool:
+    """Whether daily tables on ``engine`` are created as partitions."""
+    global _warned_unsupported
+    if Config.DAILY_TABLE_BACKEND != "partitions":
+        return False
+    if engine.dialect.name == "postgresql":
+        return True
+    if not _warned_unsupported:
+        _warned_unsupported = True
+        logger.warning(
+            f"DAILY_TABLE_BACKEND=partitions needs PostgreSQL; "
+            f"{engine.dialect.name} keeps plain daily tables"
+        )
+    return False
+
+
+def day_bounds(date_suffix: str) -> tuple[datetime, datetime]:
+    """``[start, end)`` of ``created_at`` in the partition of one day."""
+    start = datetime.strptime(date_suffix, "%Y%m%d")
+    return start, start + timedelta(days=1)
+
+
+def _bounds_sql(date_suffix: str) -> str:
+    start, end = day_bounds(date_suffix)
+    return f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+
+
+def _split(table_name: str) -> tuple[Table, str]:
+    prefix, _, date_suffix = table_name.rpartition("_")
+    return PARENTS[f"{prefix}_"], date_suffix
+
+
+def partition_ddl(table_name: str) -> str:
+    """``CREATE TABLE`` statement of the partition ``user_/log_YYYYMMDD``."""
+    parent, date_suffix = _split(table_name)
+    sequence = SEQUENCES[parent.name].name
+    return (
+        f'CREATE TABLE IF NOT EXISTS "{table_name}" PARTITION OF {parent.name} '
+        f"(id DEFAULT nextval('{sequence}'), PRIMARY KEY (id)) "
+        f"{_bounds_sql(date_suffix)}"
+    )
+
+
+def ensure_partition_parents(engine) -> None:
+    """Create the parents and add the columns they miss.
+
+    Run by ``repair_database_schema`` at startup; ``create_day_partitions``
+    only repeats it for an engine that was not checked yet.
+    """
+    # Columns added to the daily tables later are added to the parents, from
+    # which PostgreSQL propagates them to every partition.
+    from database.models.models import ensure_dynamic_columns
+
+    PARENT_METADATA.create_all(engine, checkfirst=True)
+    for parent in PARENTS.values():
+        ensure_dynamic_columns(engine, parent)
+    _checked_parents.add(engine)
+
+
+def create_day_partitions(engine, *table_names: str) -> None:
+    """Create the given daily tables as partitions (existing ones are kept).
+
+    Their indexes are added afterwards by ``ensure_dynamic_indexes``.
+    """
+    if engine not in _checked_parents:
+        ensure_partition_parents(engine)
+    with engine.begin() as conn:
+        for table_name in table_names:
+            conn.execute(text(partition_ddl(table_name)))
+
+
+def attach_day_tables(engine, *table_names: str) -> list[str]:
+    """Attach existing plain daily tables to the parents.
+
+    Returns the tables attached.  PostgreSQL checks every row against the
+    day's bounds; a table with rows outside them is left as it is.
+    """
+    ensure_partition_parents(engine)
+    attached = []
+    for table_name in table_names:
+        parent, date_suffix = _split(table_name)
+        try:
+            with engine.begin() as conn:
+                conn.execute(
+                    text(
+                        f'ALTER TABLE {parent.name} ATTACH PARTITION "{table_name}" '
+                        f"{_bounds_sql(date_suffix)}"
+                    )
+                )
+        except Exception as error:
+            logger.warning(f"Could not attach {table_name} to {parent.name}: {error}")
+            continue
+        attached.append(table_name)
+    return attached
+
+
+def partitions(engine, parent: Table) -> set[str]:
+    """Names of the tables attached to ``parent``."""
+    with engine.connect() as conn:
+        return set(
+            conn.execute(
+                text(
+                    "SELECT child.relname FROM pg_inherits "
+                    "JOIN pg_class parent ON pg_inherits.inhparent = parent.oid "
+                    "JOIN pg_class child ON pg_inherits.inhrelid = child.oid "
+                    "WHERE parent.relname = :parent"
+                ),
+                {"parent": parent.name},
+            ).scalars()
+        )
+
+
+def drop_day_partitions(engine, date_suffix: str) -> None:
+    """Drop one day's partitions (plain daily tables are dropped alike)."""
+    with engine.begin() as conn:
+        for prefix in ("log_", "user_"):
+            conn.execute(text(f'DROP TABLE IF EXISTS "{prefix}{date_suffix}"'))
+    table_catalog.invalidate(engine)
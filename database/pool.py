@@ -0,0 +1,99 @@
+"""Connection pool of the MySQL/PostgreSQL engines.
+
+The scheduler jobs, the realtime and notification threads and the request
+threads all open short sessions concurrently, so the pool is sized and
+tuned from the ``DB_POOL_*`` settings:
+
+* ``pool_pre_ping`` replaces connections the server closed while idle;
+* ``pool_recycle`` reopens connections before MySQL's ``wait_timeout``;
+* ``pool_size`` + ``max_overflow`` bound the connections to the server and
+  ``pool_timeout`` how long a thread waits for one of them;
+* checkouts reuse the most recently returned connection (LIFO), so the
+  connections left idle after a burst are the ones that get recycled.
+
+``TimedQueuePool`` records how long checkouts wait, so an undersized pool
+shows up in ``pool_stats`` (the ``/admin/api/db-pool`` endpoint) instead of
+as unexplained slow pages.
+"""
+
+import threading
+import time
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+from config import Config
+
+# Checkouts taking longer than this (seconds) count as having waited.
+WAIT_THRESHOLD = 0.01
+
+
+class TimedQueuePool(QueuePool):
+    """``QueuePool`` that counts checkouts and the time spent waiting."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.timeouts = 0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        waited = time.perf_counter() - started
+        with self._stats_lock:
+            self.checkouts += 1
+            if waited >= WAIT_THRESHOLD:
+                self.waits += 1
+                self.wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        return connection
+
+
+def pool_options() -> dict:
+    """``create_engine`` keyword arguments of a server database engine."""
+    return {
+        "poolclass": TimedQueuePool,
+        "pool_size": Config.DB_POOL_SIZE,
+        "max_overflow": Config.DB_MAX_OVERFLOW,
+        "pool_timeout": Config.DB_POOL_TIMEOUT,
+        "pool_recycle": Config.DB_POOL_RECYCLE,
+        "pool_pre_ping": Config.DB_POOL_PRE_PING,
+        "pool_use_lifo": True,
+    }
+
+
+def pool_stats(engine) -> dict:
+    """Current occupancy and checkout counters of the pool of ``engine``."""
+    pool = engine.pool
+    stats = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            max_overflow=pool._max_overflow,
+            timeout=pool.timeout(),
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+        )
+    if isinstance(pool, TimedQueuePool):
+        with pool._stats_lock:
+            stats.update(
+                checkouts=pool.checkouts,
+                waits=pool.waits,
+                wait_seconds=round(pool.wait_seconds, 3),
+                avg_wait_ms=round(pool.wait_seconds / pool.waits * 1000, 1)
+                if pool.waits
+                else 0.0,
+                max_wait_ms=round(pool.max_wait_seconds * 1000, 1),
+                timeouts=pool.timeouts,
+            )
+    return stats
@@ -0,0 +1,84 @@
+"""Process-wide cache of the table names of each database.
+
+Every daily ``user_YYYYMMDD`` / ``log_YYYYMMDD`` pair is a table of its own,
+so after a few years ``inspect(engine).get_table_names()`` returns thousands
+of names, and reports used to list them several times per request.  The
+catalog lists them once per engine, is updated when ``create_dynamic_tables``
+creates tables and is refreshed after ``Config.TABLE_CATALOG_TTL_SECONDS`` so
+that tables created or dropped by another process are eventually seen.
+
+Code that drops tables in this process should call ``invalidate``.
+"""
+
+import threading
+import time
+import weakref
+
+from sqlalchemy import inspect
+
+from config import Config
+
+
+class TableCatalog:
+    def __init__(self, ttl: float | None = None):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # engine -> (loaded_at, table names, daily suffixes)
+        self._entries = weakref.WeakKeyDictionary()
+
+    def _ttl(self) -> float:
+        return Config.TABLE_CATALOG_TTL_SECONDS if self.ttl is None else self.ttl
+
+    def _load(self, engine, names) -> tuple:
+        names = frozenset(names)
+        users = {name[5:] for name in names if _is_day_table(name, "user_")}
+        logs = {name[4:] for name in names if _is_day_table(name, "log_")}
+        entry = (
+            time.monotonic(),
+            names,
+            tuple(sorted(users | logs)),
+            tuple(sorted(users & logs)),
+        )
+        self._entries[engine] = entry
+        return entry
+
+    def _entry(self, engine) -> tuple:
+        with self._lock:
+            entry = self._entries.get(engine)
+            if entry is None or time.monotonic() - entry[0] >= self._ttl():
+                entry = self._load(engine, inspect(engine).get_table_names())
+            return entry
+
+    def table_names(self, engine) -> frozenset[str]:
+        return self._entry(engine)[1]
+
+    def has_table(self, engine, table_name: str) -> bool:
+        return table_name in self._entry(engine)[1]
+
+    def day_suffixes(self, engine, complete: bool = False) -> tuple[str, ...]:
+        """Sorted ``YYYYMMDD`` suffixes of the daily tables.
+
+        With ``complete`` only days that have both their user and log table.
+        """
+        return self._entry(engine)[3 if complete else 2]
+
+    def replace(self, engine, table_names) -> None:
+        """Record a fresh listing of the tables of ``engine``."""
+        with self._lock:
+            self._load(engine, table_names)
+
+    def invalidate(self, engine=None) -> None:
+        """Forget the tables of ``engine`` (of every engine when None)."""
+        with self._lock:
+            if engine is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(engine, None)
+
+
+def _is_day_table(name: str, prefix: str) -> bool:
+    suffix = name[len(prefix) :]
+    return name.startswith(prefix) and len(suffix) == 8 and suffix.isdigit()
+
+
+table_catalog = TableCatalog()
@@ -11,10 +11,16 @@ Usage:
     python manage_db.py current    # Show current migration version
     python manage_db.py history    # Show migration history
     python manage_db.py create     # Create a new migration
+    python manage_db.py import-logs PATH  # Import a log file or rotated-log directory
+    python manage_db.py index-tables      # Add missing indexes to daily tables
+    python manage_db.py rollup-reports    # Summarize closed days for the reports
+    python manage_db.py partition-tables  # Attach old daily tables as partitions
+    python manage_db.py expire-data       # Apply the RETENTION_* settings now
 """
 
 import os
 import sys
+import time
 from pathlib import Path
 
 from alembic.config import Config as AlembicConfig
@@ -23,8 +29,21 @@ from loguru import logger
 from sqlalchemy import inspect
 
 from alembic import command
-from database.database import get_engine
+from database.database import (
+    ensure_dynamic_table_indexes,
+    get_dynamic_table_suffixes,
+    get_engine,
+)
 from database.models.models import BlacklistDomain, SquidConfig
+from database.partitions import (
+    access_log,
+    access_user,
+    attach_day_tables,
+    partitioned_storage,
+    partitions,
+)
+from services.analytics.rollups import rollup_closed_days
+from services.database.retention_service import run_retention
 from services.security.blacklist_service import merge_and_save_blacklist
 
 # Delay import of project modules until runtime (project root added to sys.path above)
@@ -306,6 +325,144 @@ def migrate_env_squid_config(auto_confirm: bool = False):
         session.close()
 
 
+def import_access_logs(path=None):
+    """Import a Squid access log, or every rotated log in a directory.
+
+    Compressed archives (``access.log.2.gz`` etc.) are decompressed while
+    streaming; a directory is imported oldest file first.
+    """
+    if not path:
+        logger.error("Usage: python manage_db.py import-logs PATH")
+        sys.exit(1)
+
+    from parsers.log import import_log_directory, import_logs
+
+    try:
+        if os.path.isdir(path):
+            summary = import_log_directory(path)
+        else:
+            summary = import_logs(path)
+    except (FileNotFoundError, ValueError) as e:
+        logger.error(f"Failed to import logs: {e}")
+        sys.exit(1)
+
+    logger.info(
+        f"✓ Imported {summary['inserted_logs']} log rows, "
+        f"{summary['inserted_users']} users and "
+        f"{summary['inserted_denied']} denied entries "
+        f"({summary['processed_lines']} lines)"
+    )
+    for date_summary in summary["dates"]:
+        logger.info(
+            f"  {date_summary['date']}: {date_summary['inserted_logs']} logs, "
+            f"{date_summary['inserted_users']} users"
+        )
+
+
+def index_daily_tables():
+    """Add missing indexes to every existing user_YYYYMMDD/log_YYYYMMDD table.
+
+    Startup repair only checks today's and yesterday's tables; older days get
+    the columns and indexes added by later releases from this command.
+    """
+    engine = get_engine()
+    suffixes = get_dynamic_table_suffixes(engine)
+    if not suffixes:
+        logger.info("No daily tables found; nothing to index.")
+        return
+
+    logger.info(f"Checking indexes on {len(suffixes)} days of daily tables...")
+    started = time.perf_counter()
+    total = 0
+    for suffix in suffixes:
+        day_started = time.perf_counter()
+        try:
+            added = ensure_dynamic_table_indexes(engine, [suffix]).get(suffix, [])
+        except Exception as e:
+            logger.error(f"Failed to index tables for {suffix}: {e}")
+            sys.exit(1)
+        if added:
+            total += len(added)
+            logger.info(
+                f"  {suffix}: {', '.join(added)} "
+                f"({time.perf_counter() - day_started:.1f}s)"
+            )
+
+    logger.info(
+        f"✓ Added {total} indexes in {time.perf_counter() - started:.1f}s"
+        if total
+        else "✓ All daily tables are already indexed."
+    )
+
+
+def rollup_reports():
+    """Build report rollups for every closed day that lacks a current one.
+
+    The scheduler does this nightly; run it after upgrading or after
+    importing historical logs to have past reports served from rollups now.
+    """
+    started = time.perf_counter()
+    try:
+        built = rollup_closed_days()
+    except Exception as e:
+        logger.error(f"Failed to build report rollups: {e}")
+        sys.exit(1)
+
+    if built:
+        logger.info(
+            f"✓ Built rollups for {len(built)} day(s) "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+    else:
+        logger.info("✓ Report rollups are up to date.")
+
+
+def partition_daily_tables():
+    """Attach existing daily tables to the access_user/access_log parents.
+
+    With DAILY_TABLE_BACKEND=partitions new days are created as partitions;
+    this converts the days created before the switch.  PostgreSQL scans each
+    table once to check that its rows belong to its day.
+    """
+    engine = get_engine()
+    if not partitioned_storage(engine):
+        logger.error("Set DAILY_TABLE_BACKEND=partitions (PostgreSQL) first.")
+        sys.exit(1)
+
+    attached = partitions(engine, access_user) | partitions(engine, access_log)
+    pending = [
+        table_name
+        for suffix in get_dynamic_table_suffixes(engine)
+        for table_name in (f"user_{suffix}", f"log_{suffix}")
+        if table_name not in attached
+    ]
+    if not pending:
+        logger.info("✓ All daily tables are already partitions.")
+        return
+
+    logger.info(f"Attaching {len(pending)} daily tables...")
+    started = time.perf_counter()
+    done = attach_day_tables(engine, *pending)
+    logger.info(
+        f"✓ Attached {len(done)} of {len(pending)} tables "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+    if len(done) < len(pending):
+        sys.exit(1)
+
+
+def expire_data():
+    """Apply the RETENTION_* settings once, as the nightly task does."""
+    started = time.perf_counter()
+    summary = run_retention()
+    logger.info(
+        f"✓ Dropped {summary['days_dropped']} day(s), deleted "
+        f"{summary['rows_deleted']:,} row(s), archived "
+        f"{summary['archived_files']} file(s) "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+
+
 def show_help():
     """Show help message."""
     help_text = """
@@ -318,6 +475,11 @@ Commands:
   current      Show current database migration version
   history      Show complete migration history
   create       Create a new migration file
+  import-logs  Import a log file or a directory of rotated logs
+  index-tables Add missing indexes to existing daily user/log tables
+  rollup-reports  Summarize closed days so past reports skip the raw logs
+  partition-tables  Attach existing daily tables as day partitions (PostgreSQL)
+  expire-data  Drop or archive data older than the RETENTION_* settings
   help         Show this help message
 
 Examples:
@@ -328,6 +490,11 @@ Examples:
 
   python manage_db.py migrate-env-blacklist   # Migrate BLACKLIST_DOMAINS from .env to DB
   python manage_db.py migrate-env-squid-config   # Migrate Squid env vars from .env to DB
+  python manage_db.py import-logs /var/log/squid  # Import rotated (.gz/.bz2/.xz/.zst) logs
+  python manage_db.py index-tables   # Index historical daily tables ahead of startup
+  python manage_db.py rollup-reports # Summarize past days after an upgrade/import
+  python manage_db.py partition-tables  # Convert old days after enabling partitions
+  python manage_db.py expire-data    # Free space without waiting for the 01:00 task
 
 For more information, see the Alembic documentation:
 https://alembic.sqlalchemy.org/
@@ -352,6 +519,13 @@ def main():
         "create": lambda: create_migration(sys.argv[2] if len(sys.argv) > 2 else None),
         "migrate-env-blacklist": migrate_env_blacklist,
         "migrate-env-squid-config": migrate_env_squid_config,
+        "import-logs": lambda: import_access_logs(
+            sys.argv[2] if len(sys.argv) > 2 else None
+        ),
+        "index-tables": index_daily_tables,
+        "rollup-reports": rollup_reports,
+        "partition-tables": partition_daily_tables,
+        "expire-data": expire_data,
         "help": show_help,
     }
 
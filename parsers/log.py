@@ -1,21 +1,38 @@
+import bz2
+import glob
+import gzip
+import io
+import itertools
+import lzma
+import multiprocessing
 import os
 import re
 import time
-from collections import defaultdict
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
+from functools import partial
 from math import isfinite
 
 from loguru import logger
-from sqlalchemy.exc import IntegrityError, OperationalError, SQLAlchemyError
+from sqlalchemy.exc import SQLAlchemyError
 
+from config import Config
 from database.database import (
-    DeniedLog,
     LogMetadata,
-    get_dynamic_models,
     get_dynamic_table_names,
     get_engine,
     get_session,
 )
+from parsers.log_pipeline import PIPELINE_DEPTH, IngestPipeline
+from parsers.log_reader import decode_log_line, iter_log_blocks, iter_log_lines
+from parsers.log_writer import BATCH_SIZE, LogBatchWriter
+
+# zstd support is optional; gzip, bzip2 and xz come with the standard library.
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 
 class DatabaseManager:
@@ -41,9 +58,10 @@ class DatabaseManager:
             self.session.close()
 
 
-# Constants for fields and batch
-BATCH_SIZE = 500
-MAX_RETRIES = 3
+# Parallel import of complete files (see import_logs).
+IMPORT_WORKERS = Config.LOG_IMPORT_WORKERS
+PARALLEL_IMPORT_MIN_BYTES = 32 * 1024 * 1024
+PARALLEL_IMPORT_CHUNK_BYTES = 8 * 1024 * 1024
 
 # Supported Squid access-log families.  Detection is automatic; these names
 # are also used as parser hints after sampling a file.
@@ -66,13 +84,33 @@ HTTP_METHODS = frozenset(
     }
 )
 
+# Magic bytes of the compressors logrotate is commonly configured with.
+COMPRESSION_MAGIC = (
+    (b"\x1f\x8b", "gzip"),
+    (b"BZh", "bzip2"),
+    (b"\xfd7zXZ\x00", "xz"),
+    (b"\x28\xb5\x2f\xfd", "zstd"),
+)
+ROTATED_LOG_INDEX_RE = re.compile(r"\.(\d+)(?:\.(?:gz|bz2|xz|zst))?$")
+ROTATED_LOG_DATE_RE = re.compile(r"-(\d{8})(?:\.(?:gz|bz2|xz|zst))?$")
+
 DETAILED_REQUEST_RE = re.compile(
-    r"^\S+\s+(?P<ip>\S+)\s+(?P<identity>\S+)\s+(?P<username>\S+)\s+"
+    r"^(?P<timestamp>\S+)\s+(?P<ip>\S+)\s+(?P<identity>\S+)\s+(?P<username>\S+)\s+"
     r"\[[^\]]*\]\s+"
     r'"(?P<method>\S+)\s+(?P<url>.*?)\s+HTTP/(?P<http_version>[^"]+)"\s+'
     r"(?P<status>\S+)\s+(?P<bytes>\S+)(?:\s+.*)?$"
 )
 
+# DETAILED covers three layouts.  Once a file has been sampled, the importer
+# compiles a parser that tries the layout found there first.
+STRATEGY_PIPE = "DETAILED_PIPE"
+STRATEGY_QUOTED = "DETAILED_QUOTED"
+STRATEGY_SPACE = "DETAILED_SPACE"
+DETAILED_STRATEGIES = (STRATEGY_PIPE, STRATEGY_QUOTED, STRATEGY_SPACE)
+
+LOG_PARSER_CACHE_SIZE = 64
+_log_parser_cache = {}
+
 
 def find_last_parent_proxy(log_file: str, lines_to_check: int = 5000) -> str | None:
     if not os.path.exists(log_file):
@@ -111,6 +149,47 @@ def find_last_parent_proxy(log_file: str, lines_to_check: int = 5000) -> str | N
     return None
 
 
+def detect_compression(log_file) -> str | None:
+    """Return the compression of a file from its magic bytes, or None."""
+    with open(log_file, "rb") as file:
+        header = file.read(6)
+    for magic, compression in COMPRESSION_MAGIC:
+        if header.startswith(magic):
+            return compression
+    return None
+
+
+def open_log_binary(log_file, compression: str | None = None):
+    """Open a log as a binary stream, decompressing it on the fly if needed."""
+    if compression is None:
+        return open(log_file, "rb")
+    if compression == "gzip":
+        return gzip.open(log_file, "rb")
+    if compression == "bzip2":
+        return bz2.open(log_file, "rb")
+    if compression == "xz":
+        return lzma.open(log_file, "rb")
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError(
+                "zstd-compressed logs require the 'zstandard' package "
+                "(pip install zstandard)"
+            )
+        return zstandard.ZstdDecompressor().stream_reader(
+            open(log_file, "rb"), closefd=True
+        )
+    raise ValueError(f"Unsupported log compression: {compression}")
+
+
+def open_log_text(log_file, compression: str | None = None):
+    """Open a plain or compressed log for line iteration as UTF-8 text."""
+    if compression is None:
+        return open(log_file, encoding="utf-8", errors="replace")
+    return io.TextIOWrapper(
+        open_log_binary(log_file, compression), encoding="utf-8", errors="replace"
+    )
+
+
 def get_table_names():
     today = datetime.now().strftime("%Y%m%d")
     return f"user_{today}", f"log_{today}", "log_metadata"
@@ -160,15 +239,6 @@ def _is_integer(value: str) -> bool:
     return value.isdigit()
 
 
-def _response_code(status: str) -> int:
-    code = status.rsplit("/", 1)[-1]
-    return int(code) if code.isdigit() else 0
-
-
-def _bytes_transmitted(value: str) -> int:
-    return int(value) if _is_integer(value) else 0
-
-
 def _is_default_line(parts: list[str]) -> bool:
     """Recognize Squid's native access.log layout without parsing it twice."""
     return bool(
@@ -209,23 +279,32 @@ def _is_quoted_detailed_line(line: str):
     return bool(match and match.group("method").upper() in HTTP_METHODS)
 
 
-def _detect_line_format(line: str) -> str | None:
+def _detect_line_strategy(line: str) -> str | None:
     if not isinstance(line, str) or not line.strip():
         return None
 
     if _is_pipe_line(line):
-        return FORMAT_DETAILED
+        return STRATEGY_PIPE
 
     parts = line.split()
     if _is_default_line(parts):
         return FORMAT_DEFAULT
 
-    if _is_quoted_detailed_line(line) or _is_space_detailed_line(parts):
-        return FORMAT_DETAILED
+    if _is_quoted_detailed_line(line):
+        return STRATEGY_QUOTED
+    if _is_space_detailed_line(parts):
+        return STRATEGY_SPACE
 
     return None
 
 
+def _detect_line_format(line: str) -> str | None:
+    strategy = _detect_line_strategy(line)
+    if strategy in DETAILED_STRATEGIES:
+        return FORMAT_DETAILED
+    return strategy
+
+
 def _ignore_log_line(line: str) -> bool:
     line_lower = line.lower()
     return (
@@ -261,166 +340,358 @@ def parse_log_line(line: str, format_hint: str = FORMAT_AUTO):
     return None
 
 
+def _record_dict(record):
+    """The dict of the legacy ``parse_log_line_*`` API for a record tuple."""
+    if record is None:
+        return None
+    _, username, ip, url, response, data_transmitted, method, status, is_denied = record
+    return {
+        "ip": ip,
+        "username": username if username != "-" else None,
+        "url": url,
+        "response": response,
+        "data_transmitted": data_transmitted,
+        "method": method,
+        "status": status,
+        "is_denied": is_denied,
+    }
+
+
 def parse_log_line_default(line: str):
     """Parse Squid's standard format.
 
     ``timestamp elapsed client_ip result/status bytes method url user
     hierarchy content-type``
     """
+    return _record_dict(_parse_default_record(line))
+
+
+def parse_log_line_detailed(line: str):
+    """Parse the supported DETAILED variants (pipe, quoted, space)."""
+    return _record_dict(_parse_detailed_record(line))
+
+
+def parse_log_line_pipe_format(line):
+    return _record_dict(_parse_pipe_record(line))
+
+
+def parse_log_line_space_format(line):
+    """Parse the whitespace-separated DETAILED variant."""
+    return _record_dict(_parse_space_record(line))
+
+
+# Single-pass record parsers used by the importer (and, through _record_dict,
+# by the parse_log_line_* functions above).  Each one splits a line once,
+# validates it and returns the writer's record tuple directly.
+def _parse_default_record(line: str):
+    parts = line.split(None, 8)
+    if len(parts) < 7:
+        return None
+
+    timestamp, elapsed, ip, status, data_transmitted, method, url = parts[:7]
+    response = status.rpartition("/")[2]
+    method = method.upper()
+    if (
+        method not in HTTP_METHODS
+        or not response.isdigit()
+        or "/" not in status
+        or not (data_transmitted.isdigit() or data_transmitted == "-")
+        or _ignore_log_line(line)
+    ):
+        return None
+
     try:
-        if _ignore_log_line(line):
-            return None
-        parts = line.split()
-        if not _is_default_line(parts):
+        float(elapsed)
+        timestamp = float(timestamp)
+        if timestamp < 0:
             return None
-
-        status = parts[3]
-        ip = parts[2]
-        user_field = parts[7] if len(parts) > 7 else "-"
-        username = user_field if user_field != "-" else ip
-        return {
-            "ip": ip,
-            "username": username if username != "-" else None,
-            "url": parts[6],
-            "response": _response_code(status),
-            "data_transmitted": _bytes_transmitted(parts[4]),
-            "method": parts[5].upper(),
-            "status": status,
-            "is_denied": "TCP_DENIED" in status,
-        }
-    except (IndexError, TypeError, ValueError) as error:
-        logger.debug("Unable to parse DEFAULT log line: {} ({})", line.strip(), error)
+        log_datetime = datetime.fromtimestamp(timestamp)
+        response = int(response)
+        data_transmitted = int(data_transmitted) if data_transmitted != "-" else 0
+    except (OSError, OverflowError, ValueError):
         return None
 
+    username = parts[7] if len(parts) > 7 else "-"
+    return (
+        log_datetime,
+        username if username != "-" else ip,
+        ip,
+        url,
+        response,
+        data_transmitted,
+        method,
+        status,
+        "TCP_DENIED" in status,
+    )
 
-def parse_log_line_detailed(line: str):
-    """Parse the supported legacy DETAILED variants."""
-    if _ignore_log_line(line):
+
+def _parse_pipe_record(line: str):
+    parts = line.strip().split("|", 14)
+    if len(parts) < 14:
         return None
-    if _is_pipe_line(line):
-        return parse_log_line_pipe_format(line)
 
-    quoted_match = DETAILED_REQUEST_RE.match(line.strip())
-    if quoted_match:
-        try:
-            identity = quoted_match.group("identity")
-            username = quoted_match.group("username")
-            ip = quoted_match.group("ip")
-            if username == "-":
-                username = identity if identity != "-" else ip
-            if username == "-":
-                username = None
-            status = quoted_match.group("status")
-            return {
-                "ip": ip,
-                "username": username,
-                "url": quoted_match.group("url"),
-                "response": _response_code(status),
-                "data_transmitted": _bytes_transmitted(quoted_match.group("bytes")),
-                "method": quoted_match.group("method").upper(),
-                "status": status,
-                "is_denied": "TCP_DENIED" in line,
-            }
-        except (IndexError, TypeError, ValueError) as error:
-            logger.debug(
-                "Unable to parse quoted DETAILED log line: {} ({})",
-                line.strip(),
-                error,
-            )
+    timestamp, ip, _, username, _, method, url, _, response, data_transmitted = parts[
+        :10
+    ]
+    method = method.upper()
+    if (
+        method not in HTTP_METHODS
+        or username == "-"
+        or not response.isdigit()
+        or not data_transmitted.isdigit()
+        or _ignore_log_line(line)
+    ):
+        return None
+
+    try:
+        timestamp = float(timestamp)
+        if timestamp < 0:
             return None
+        log_datetime = datetime.fromtimestamp(timestamp)
+        response = int(response)
+        data_transmitted = int(data_transmitted)
+    except (OSError, OverflowError, ValueError):
+        return None
 
-    return parse_log_line_space_format(line)
+    ip = ip or "-"
+    status = parts[13]
+    return (
+        log_datetime,
+        username or ip,
+        ip,
+        url or "-",
+        response,
+        data_transmitted,
+        method,
+        status,
+        "TCP_DENIED" in status,
+    )
 
 
-def parse_log_line_pipe_format(line):
-    parts = line.strip().split("|")
-    if not _is_pipe_line(line):
+def _parse_quoted_record(line: str):
+    match = DETAILED_REQUEST_RE.match(line.strip())
+    if match is None:
+        return None
+
+    timestamp, ip, identity, username, method, url, _, status, data_transmitted = (
+        match.groups()
+    )
+    method = method.upper()
+    if method not in HTTP_METHODS or _ignore_log_line(line):
         return None
+
     try:
-        username = parts[3]
-        if username == "-":
-            return None
-        return {
-            "ip": parts[1],
-            "username": username,
-            "url": parts[6],
-            "response": int(parts[8]),
-            "data_transmitted": int(parts[9]),
-            "method": parts[5].upper(),
-            "status": parts[13],
-            "is_denied": "TCP_DENIED" in parts[13],
-        }
-    except (IndexError, TypeError, ValueError) as error:
-        logger.debug("Unable to parse pipe log line: {} ({})", line.strip(), error)
+        timestamp = float(timestamp)
+        log_datetime = datetime.fromtimestamp(timestamp) if timestamp >= 0 else None
+    except (OSError, OverflowError):
+        log_datetime = None
+    except ValueError:
+        # Same fallback rules (BOM, pipe-suffixed timestamps) as the slow path.
+        log_datetime = get_log_datetime(timestamp)
+    if log_datetime is None:
         return None
 
+    if username == "-":
+        username = identity if identity != "-" else ip
+    response = status.rpartition("/")[2]
+    try:
+        response = int(response) if response.isdigit() else 0
+        data_transmitted = int(data_transmitted) if data_transmitted.isdigit() else 0
+    except ValueError:
+        return None
+    return (
+        log_datetime,
+        username,
+        ip,
+        url or "-",
+        response,
+        data_transmitted,
+        method,
+        status,
+        "TCP_DENIED" in line,
+    )
+
+
+def _parse_space_record(line: str):
+    parts = line.split(None, 11)
+    if len(parts) < 11:
+        return None
+
+    timestamp, ip, _, username, status, method, url = parts[:7]
+    response = parts[9]
+    data_transmitted = parts[10]
+    method = method.upper()
+    if (
+        method not in HTTP_METHODS
+        or username == "-"
+        or not response.isdigit()
+        or not data_transmitted.isdigit()
+        or _ignore_log_line(line)
+    ):
+        return None
 
-def parse_log_line_space_format(line):
-    """Parse the legacy whitespace-separated DETAILED variant."""
     try:
-        parts = line.split()
-        if not _is_space_detailed_line(parts) or parts[3] == "-":
+        timestamp = float(timestamp)
+        if timestamp < 0:
             return None
-        status = parts[4]
-        return {
-            "ip": parts[1],
-            "username": parts[3],
-            "url": parts[6],
-            "response": int(parts[9]),
-            "data_transmitted": int(parts[10]),
-            "method": parts[5].upper(),
-            "status": status,
-            "is_denied": "TCP_DENIED" in line,
-        }
-    except (IndexError, TypeError, ValueError) as error:
-        logger.debug(
-            "Unable to parse space DETAILED line: {} ({})", line.strip(), error
-        )
+        log_datetime = datetime.fromtimestamp(timestamp)
+        response = int(response)
+        data_transmitted = int(data_transmitted)
+    except (OSError, OverflowError, ValueError):
         return None
 
+    return (
+        log_datetime,
+        username,
+        ip,
+        url,
+        response,
+        data_transmitted,
+        method,
+        status,
+        "TCP_DENIED" in line,
+    )
 
-def detect_log_format(log_file, sample_lines=32, start_position=0):
-    """Detect DEFAULT or DETAILED by validating a small sample of lines."""
-    try:
-        with open(log_file, encoding="utf-8", errors="replace") as file:
-            if start_position:
-                file.seek(start_position)
-
-            counts = {FORMAT_DEFAULT: 0, FORMAT_DETAILED: 0}
-            for _ in range(sample_lines):
-                line = file.readline()
-                if not line:
+
+# Parsers tried in order for each strategy.  DEFAULT never falls back, like
+# the DEFAULT hint of parse_log_line.
+_STRATEGY_PARSERS = {
+    FORMAT_AUTO: (
+        _parse_pipe_record,
+        _parse_default_record,
+        _parse_quoted_record,
+        _parse_space_record,
+    ),
+    FORMAT_DEFAULT: (_parse_default_record,),
+    FORMAT_DETAILED: (_parse_pipe_record, _parse_quoted_record, _parse_space_record),
+    STRATEGY_PIPE: (_parse_pipe_record, _parse_quoted_record, _parse_space_record),
+    STRATEGY_QUOTED: (_parse_quoted_record, _parse_pipe_record, _parse_space_record),
+    STRATEGY_SPACE: (_parse_space_record, _parse_pipe_record, _parse_quoted_record),
+}
+
+
+def _parse_detailed_record(line: str):
+    for parser in _STRATEGY_PARSERS[FORMAT_DETAILED]:
+        record = parser(line)
+        if record is not None:
+            return record
+    return None
+
+
+def compile_log_parser(strategy: str = FORMAT_AUTO):
+    """Return a single-pass ``parse(line)`` function for a detected strategy.
+
+    Each line is tokenized once and turned into a record tuple
+    ``(log_datetime, username, ip, url, response, data_transmitted, method,
+    status, is_denied)``, the row layout of ``LogBatchWriter.add_row``.
+    Unparseable and ignored lines return ``None``.
+    """
+    parsers = _STRATEGY_PARSERS.get(
+        (strategy or FORMAT_AUTO).upper(), _STRATEGY_PARSERS[FORMAT_AUTO]
+    )
+    first_parser, *fallback_parsers = parsers
+    if not fallback_parsers:
+        return first_parser
+
+    def parse_record(line: str):
+        record = first_parser(line)
+        if record is None:
+            for parser in fallback_parsers:
+                record = parser(line)
+                if record is not None:
                     break
-                detected = _detect_line_format(line)
-                if detected:
-                    counts[detected] += 1
-
-            # A tail containing only malformed/ignored lines should not force
-            # a wrong format.  Retry from the beginning in that case.
-            if not any(counts.values()) and start_position:
-                file.seek(0)
-                for _ in range(sample_lines):
-                    line = file.readline()
-                    if not line:
-                        break
-                    detected = _detect_line_format(line)
-                    if detected:
-                        counts[detected] += 1
-
-            if not any(counts.values()):
-                return FORMAT_AUTO
-
-            if counts[FORMAT_DEFAULT] > counts[FORMAT_DETAILED]:
-                return FORMAT_DEFAULT
-            if counts[FORMAT_DETAILED] > counts[FORMAT_DEFAULT]:
-                return FORMAT_DETAILED
-            return FORMAT_AUTO
-    except OSError as error:
+        return record
+
+    return parse_record
+
+
+def _sample_line_strategies(log_file, sample_lines: int, start_position: int):
+    compression = detect_compression(log_file)
+    if compression:
+        start_position = 0
+
+    counts = Counter()
+    with open_log_text(log_file, compression) as file:
+        if start_position:
+            file.seek(start_position)
+        for line in itertools.islice(file, sample_lines):
+            counts[_detect_line_strategy(line)] += 1
+
+        # A tail containing only malformed/ignored lines should not force a
+        # wrong format.  Retry from the beginning in that case.
+        counts.pop(None, None)
+        if not counts and start_position:
+            file.seek(0)
+            for line in itertools.islice(file, sample_lines):
+                counts[_detect_line_strategy(line)] += 1
+            counts.pop(None, None)
+    return counts
+
+
+def detect_log_strategy(log_file, sample_lines=32, start_position=0) -> str:
+    """Detect DEFAULT or the DETAILED layout used by a sample of lines.
+
+    Compressed files are sampled from the start of the decompressed stream.
+    """
+    try:
+        counts = _sample_line_strategies(log_file, sample_lines, start_position)
+    except (OSError, EOFError, RuntimeError, lzma.LZMAError) as error:
         logger.warning(
             "Unable to detect log format; using per-line detection: {}", error
         )
         return FORMAT_AUTO
 
+    default_lines = counts[FORMAT_DEFAULT]
+    detailed_lines = sum(counts[strategy] for strategy in DETAILED_STRATEGIES)
+    if default_lines > detailed_lines:
+        return FORMAT_DEFAULT
+    if detailed_lines > default_lines:
+        return max(DETAILED_STRATEGIES, key=counts.__getitem__)
+    return FORMAT_AUTO
+
+
+def detect_log_format(log_file, sample_lines=32, start_position=0):
+    """Detect DEFAULT or DETAILED by validating a small sample of lines."""
+    strategy = detect_log_strategy(log_file, sample_lines, start_position)
+    if strategy in DETAILED_STRATEGIES:
+        return FORMAT_DETAILED
+    return strategy
+
+
+def get_log_parser(log_file, start_position: int = 0):
+    """Return ``(strategy, parse)`` for a file, reusing it while tailing.
+
+    A full read (``start_position == 0``) always samples the file again, so
+    a truncated or replaced log never keeps a stale strategy.  Resumed reads
+    reuse the parser compiled for the same inode.
+    """
+    try:
+        file_stat = os.stat(log_file)
+        cache_key = (os.path.realpath(log_file), file_stat.st_dev, file_stat.st_ino)
+    except OSError:
+        cache_key = None
+
+    if start_position and cache_key in _log_parser_cache:
+        return _log_parser_cache[cache_key]
+
+    strategy = detect_log_strategy(log_file, start_position=start_position)
+    compiled = (strategy, compile_log_parser(strategy))
+    if cache_key is not None and strategy != FORMAT_AUTO:
+        _log_parser_cache.pop(cache_key, None)
+        if len(_log_parser_cache) >= LOG_PARSER_CACHE_SIZE:
+            _log_parser_cache.pop(next(iter(_log_parser_cache)))
+        _log_parser_cache[cache_key] = compiled
+    return compiled
+
+
+def _date_suffix(log_datetime: datetime, suffixes: dict) -> str:
+    """Return the daily table suffix, formatting each day only once."""
+    day = log_datetime.toordinal()
+    suffix = suffixes.get(day)
+    if suffix is None:
+        suffix = suffixes[day] = log_datetime.strftime("%Y%m%d")
+    return suffix
+
 
 def _new_import_summary() -> dict:
     return {
@@ -448,189 +719,13 @@ def _date_summary(date_summaries: dict, date_suffix: str) -> dict:
     return date_summaries[date_suffix]
 
 
-def _ingest_log_file(log_file, session, start_position: int = 0) -> tuple[dict, int]:
-    """Ingest a log file into the daily tables selected by each line's date."""
-    summary = _new_import_summary()
+def _finish_import_summary(summary: dict, writer, start_time: float) -> dict:
     date_summaries = {}
-    models_by_date = {}
-    user_cache = {}
-    pending_users = defaultdict(list)
-    pending_logs = defaultdict(list)
-    pending_denied = []
-    pending_stats = defaultdict(lambda: {"logs": 0, "users": 0, "denied": 0})
-    start_time = time.time()
-
-    detected_format = detect_log_format(log_file, start_position=start_position)
-    logger.info("Detected Squid log format: {}", detected_format)
-
-    def get_models(date_suffix):
-        if date_suffix not in models_by_date:
-            models = get_dynamic_models(date_suffix)
-            if not models or not models[0] or not models[1]:
-                raise RuntimeError(
-                    f"Could not create daily tables for date suffix {date_suffix}"
-                )
-            models_by_date[date_suffix] = models
-        return models_by_date[date_suffix]
-
-    def commit_batch():
-        if not pending_users and not pending_logs and not pending_denied:
-            return
-
-        for retry_count in range(MAX_RETRIES):
-            try:
-                for _date_suffix, users in pending_users.items():
-                    if users:
-                        session.add_all(users)
-                session.flush()
-
-                for date_suffix, entries in pending_logs.items():
-                    if not entries:
-                        continue
-                    _, dynamic_log = get_models(date_suffix)
-                    mappings = []
-                    for user_ref, mapping in entries:
-                        user_id = (
-                            user_ref.id if not isinstance(user_ref, int) else user_ref
-                        )
-                        mappings.append({**mapping, "user_id": user_id})
-                    session.bulk_insert_mappings(dynamic_log, mappings)
-
-                if pending_denied:
-                    session.add_all(pending_denied)
-                session.commit()
-
-                for date_suffix, users in pending_users.items():
-                    count = len(users)
-                    if count:
-                        summary["inserted_users"] += count
-                        _date_summary(date_summaries, date_suffix)[
-                            "inserted_users"
-                        ] += count
-                for date_suffix, entries in pending_logs.items():
-                    count = len(entries)
-                    if count:
-                        summary["inserted_logs"] += count
-                        _date_summary(date_summaries, date_suffix)["inserted_logs"] += (
-                            count
-                        )
-                for date_suffix, stats in pending_stats.items():
-                    if stats["denied"]:
-                        summary["inserted_denied"] += stats["denied"]
-                        _date_summary(date_summaries, date_suffix)[
-                            "inserted_denied"
-                        ] += stats["denied"]
-
-                pending_users.clear()
-                pending_logs.clear()
-                pending_denied.clear()
-                pending_stats.clear()
-                return
-            except IntegrityError as error:
-                session.rollback()
-                logger.warning(
-                    "Integrity error importing batch (retry {}/{}): {}",
-                    retry_count + 1,
-                    MAX_RETRIES,
-                    error,
-                )
-            except OperationalError as error:
-                session.rollback()
-                if "database is locked" not in str(error).lower():
-                    raise
-                logger.warning(
-                    "Database locked while importing; retrying ({}/{})",
-                    retry_count + 1,
-                    MAX_RETRIES,
-                )
-                time.sleep(0.5 * (retry_count + 1))
-            except SQLAlchemyError:
-                session.rollback()
-                raise
-
-        raise RuntimeError("Could not commit a log import batch")
-
-    current_position = start_position
-    with open(log_file, encoding="utf-8", errors="replace") as file:
-        file.seek(start_position)
-        for line in file:
-            summary["processed_lines"] += 1
-            current_position += len(line.encode("utf-8"))
-
-            log_data = parse_log_line(line, format_hint=detected_format)
-            log_datetime = get_log_datetime(line)
-            if not log_data or log_datetime is None:
-                summary["skipped_lines"] += 1
-                continue
-
-            summary["parsed_lines"] += 1
-            date_suffix = log_datetime.strftime("%Y%m%d")
-            DynamicUser, _ = get_models(date_suffix)
-            date_stats = pending_stats[date_suffix]
-            date_stats["denied"] += int(bool(log_data.get("is_denied")))
-
-            # Some Squid formats use '-' for unauthenticated users.  The IP is
-            # the stable fallback used by the DEFAULT parser as well.
-            username = log_data.get("username") or log_data.get("ip") or "-"
-            ip = log_data.get("ip") or "-"
-
-            if log_data.get("is_denied"):
-                pending_denied.append(
-                    DeniedLog(
-                        username=username,
-                        ip=ip,
-                        url=log_data.get("url") or "-",
-                        method=log_data.get("method") or "",
-                        status=log_data.get("status") or "",
-                        response=log_data.get("response"),
-                        data_transmitted=log_data.get("data_transmitted", 0),
-                        created_at=log_datetime,
-                    )
-                )
-            else:
-                user_key = (date_suffix, username, ip)
-                user_ref = user_cache.get(user_key)
-                if user_ref is None:
-                    existing_user = (
-                        session.query(DynamicUser)
-                        .filter_by(username=username, ip=ip)
-                        .first()
-                    )
-                    if existing_user:
-                        user_ref = existing_user.id
-                    else:
-                        user_ref = DynamicUser(
-                            username=username,
-                            ip=ip,
-                            created_at=log_datetime,
-                        )
-                        pending_users[date_suffix].append(user_ref)
-                        date_stats["users"] += 1
-                    user_cache[user_key] = user_ref
-
-                pending_logs[date_suffix].append(
-                    (
-                        user_ref,
-                        {
-                            "url": log_data.get("url") or "-",
-                            "response": log_data.get("response", 0),
-                            "request_count": 1,
-                            "data_transmitted": log_data.get("data_transmitted", 0),
-                            "created_at": log_datetime,
-                        },
-                    )
-                )
-                date_stats["logs"] += 1
-
-            if (
-                sum(len(items) for items in pending_logs.values())
-                + sum(len(items) for items in pending_users.values())
-                + len(pending_denied)
-                >= BATCH_SIZE
-            ):
-                commit_batch()
-
-    commit_batch()
+    for date_suffix, counts in writer.counts.items():
+        date_summary = _date_summary(date_summaries, date_suffix)
+        for key, value in counts.items():
+            date_summary[key] += value
+            summary[key] += value
     summary["dates"] = [date_summaries[key] for key in sorted(date_summaries)]
     elapsed = time.time() - start_time
     logger.info(
@@ -641,23 +736,236 @@ def _ingest_log_file(log_file, session, start_position: int = 0) -> tuple[dict,
         summary["processed_lines"],
         elapsed,
     )
-    return summary, current_position
+    return summary
+
 
+def _ingest_log_file(
+    log_file,
+    session,
+    start_position: int = 0,
+    batch_size: int = BATCH_SIZE,
+    complete_lines_only: bool = False,
+) -> tuple[dict, int]:
+    """Ingest a log file into the daily tables selected by each line's date.
 
-def import_logs(log_file):
+    Lines are read as raw bytes, so the returned position is an exact byte
+    offset even when the file contains invalid UTF-8.  With
+    ``complete_lines_only`` a final line without a newline is left for the
+    next run, because Squid may still be writing it.
+
+    Compressed files are decompressed while streaming and always read from
+    the beginning; the returned position is then in decompressed bytes.
+
+    Reading (and decompressing), parsing and writing run as separate stages
+    of an :class:`IngestPipeline`, so database commits and parsing overlap.
+    """
+    summary = _new_import_summary()
+    writer = LogBatchWriter(session, batch_size=batch_size)
+    start_time = time.time()
+
+    compression = detect_compression(log_file)
+    if compression and start_position:
+        raise ValueError("Compressed logs can only be read from the beginning")
+
+    strategy, parse_record = get_log_parser(log_file, start_position=start_position)
+    logger.info(
+        "Detected Squid log format: {}{}",
+        strategy,
+        f" ({compression})" if compression else "",
+    )
+
+    current_position = start_position
+    with (
+        open_log_binary(log_file, compression) as file,
+        ThreadPoolExecutor(max_workers=1, thread_name_prefix="LogParser") as parser,
+    ):
+        pipeline = IngestPipeline(parser, partial(_parse_log_block, parse_record))
+        blocks = iter_log_blocks(
+            file, start_position, complete_only=complete_lines_only
+        )
+        for result in pipeline.results(blocks):
+            _write_parsed_chunk(result, writer, summary)
+            current_position = result["end"]
+
+    writer.flush()
+    summary["pipeline"] = pipeline.stats
+    return _finish_import_summary(summary, writer, start_time), current_position
+
+
+def _split_log_file(log_file, chunk_bytes: int):
+    """Yield ``(start, end)`` byte ranges of a file that end on a newline."""
+    file_size = os.path.getsize(log_file)
+    with open(log_file, "rb") as file:
+        start = 0
+        while start < file_size:
+            file.seek(min(start + chunk_bytes, file_size))
+            file.readline()
+            end = min(file.tell(), file_size)
+            yield start, end
+            start = end
+
+
+def _parse_lines(raw_lines, parse_record) -> dict:
+    """Parse raw lines into record tuples grouped by date suffix."""
+    result = {
+        "processed_lines": 0,
+        "parsed_lines": 0,
+        "skipped_lines": 0,
+        "batches": {},
+    }
+    batches = result["batches"]
+    suffixes = {}
+    skipped_lines = 0
+    processed_lines = 0
+    for raw_line in raw_lines:
+        processed_lines += 1
+        record = parse_record(decode_log_line(raw_line))
+        if record is None:
+            skipped_lines += 1
+            continue
+        batches.setdefault(_date_suffix(record[0], suffixes), []).append(record)
+    result["processed_lines"] = processed_lines
+    result["skipped_lines"] = skipped_lines
+    result["parsed_lines"] = processed_lines - skipped_lines
+    return result
+
+
+def _parse_log_block(parse_record, block: bytes, end: int) -> dict:
+    """Parse one block of whole lines read by the pipeline's reader stage."""
+    raw_lines = block.split(b"\n")
+    if not raw_lines[-1]:
+        raw_lines.pop()
+    result = _parse_lines(raw_lines, parse_record)
+    result["end"] = end
+    return result
+
+
+def _parse_log_chunk(log_file, start: int, end: int, strategy: str) -> dict:
+    """Parse one byte range in a worker process; no database access happens here.
+
+    Rows are returned grouped by date suffix as record tuples so the single
+    writer in the parent process only has to buffer and insert them.
+    """
+    started = time.perf_counter()
+    with open(log_file, "rb") as file:
+        result = _parse_lines(
+            (raw_line for raw_line, _ in iter_log_lines(file, start, end)),
+            compile_log_parser(strategy),
+        )
+    result["pid"] = os.getpid()
+    result["end"] = end
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+
+def _write_parsed_chunk(result: dict, writer, summary: dict) -> None:
+    for key in ("processed_lines", "parsed_lines", "skipped_lines"):
+        summary[key] += result[key]
+    add_row = writer.add_row
+    for date_suffix, records in sorted(result["batches"].items()):
+        for record in records:
+            add_row(date_suffix, *record)
+
+
+def _resolve_import_workers(workers: int | None) -> int:
+    if workers is None:
+        workers = IMPORT_WORKERS
+    if workers <= 0:
+        workers = min(os.cpu_count() or 1, 4)
+    return workers
+
+
+def _ingest_log_file_parallel(
+    log_file, session, workers: int, batch_size: int = BATCH_SIZE
+) -> dict:
+    """Parse newline-aligned chunks in worker processes and write them here.
+
+    The pipeline's reader submits byte ranges to the process pool and the
+    results are consumed strictly in file order, so users are inserted in the
+    same order as a serial import and get the same ids.  The bounded queue
+    (at least two chunks per worker) limits the parent's memory.
+    """
+    summary = _new_import_summary()
+    writer = LogBatchWriter(session, batch_size=batch_size)
+    start_time = time.time()
+
+    strategy, _ = get_log_parser(log_file)
+    logger.info(
+        "Detected Squid log format: {} (parallel import, {} workers)",
+        strategy,
+        workers,
+    )
+
+    worker_stats = {}
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        pipeline = IngestPipeline(
+            executor,
+            partial(_parse_log_chunk, log_file, strategy=strategy),
+            depth=max(PIPELINE_DEPTH, workers * 2),
+        )
+        for result in pipeline.results(
+            _split_log_file(log_file, PARALLEL_IMPORT_CHUNK_BYTES)
+        ):
+            stats = worker_stats.setdefault(
+                result["pid"], {"chunks": 0, "lines": 0, "seconds": 0.0}
+            )
+            stats["chunks"] += 1
+            stats["lines"] += result["processed_lines"]
+            stats["seconds"] += result["seconds"]
+            _write_parsed_chunk(result, writer, summary)
+
+    writer.flush()
+    summary["pipeline"] = pipeline.stats
+    summary["workers"] = [
+        {
+            "worker": index,
+            "pid": pid,
+            "chunks": stats["chunks"],
+            "lines": stats["lines"],
+            "seconds": round(stats["seconds"], 3),
+            "lines_per_second": round(stats["lines"] / stats["seconds"])
+            if stats["seconds"]
+            else 0,
+        }
+        for index, (pid, stats) in enumerate(sorted(worker_stats.items()))
+    ]
+    return _finish_import_summary(summary, writer, start_time)
+
+
+def import_logs(log_file, workers: int | None = None):
     """Import a complete log file, routing entries to their daily tables.
 
     Unlike :func:`process_logs`, this function intentionally does not read or
     update ``log_metadata``.  It is therefore safe for an administrator to
     import a rotated or historical file without changing the live tailer's
     cursor.
+
+    gzip, bzip2, xz and zstd archives are detected by their magic bytes and
+    decompressed while streaming.
+
+    Plain files larger than ``PARALLEL_IMPORT_MIN_BYTES`` are parsed by
+    ``workers`` processes (``LOG_IMPORT_WORKERS``; 0 picks one per CPU, up to
+    4) while a single writer inserts the rows.  ``workers=1`` forces a serial
+    import.
     """
     if not os.path.exists(log_file):
         raise FileNotFoundError(log_file)
 
+    workers = _resolve_import_workers(workers)
+    parallel = (
+        workers > 1
+        and os.path.getsize(log_file) >= PARALLEL_IMPORT_MIN_BYTES
+        and detect_compression(log_file) is None
+    )
+
     session = get_session()
     try:
-        summary, _ = _ingest_log_file(log_file, session)
+        if parallel:
+            summary = _ingest_log_file_parallel(log_file, session, workers)
+        else:
+            summary, _ = _ingest_log_file(log_file, session)
         if summary["parsed_lines"] == 0:
             raise ValueError("The log file contains no valid Squid access entries")
         return summary
@@ -669,6 +977,86 @@ def import_logs(log_file):
         session.close()
 
 
+def _rotated_log_sort_key(path: str):
+    """Order rotated logs oldest first.
+
+    ``access.log.3.gz`` is older than ``access.log.1`` which is older than the
+    live ``access.log``; ``dateext`` names sort by their date.
+    """
+    name = os.path.basename(path)
+    dated = ROTATED_LOG_DATE_RE.search(name)
+    if dated:
+        return (0, int(dated.group(1)), name)
+    numbered = ROTATED_LOG_INDEX_RE.search(name)
+    index = int(numbered.group(1)) if numbered else 0
+    return (1, -index, name)
+
+
+def import_log_directory(directory, pattern: str = "access.log*", workers=None):
+    """Import every matching (possibly compressed) log in chronological order."""
+    if not os.path.isdir(directory):
+        raise FileNotFoundError(directory)
+
+    log_files = sorted(
+        (
+            path
+            for path in glob.glob(os.path.join(directory, pattern))
+            if os.path.isfile(path)
+        ),
+        key=_rotated_log_sort_key,
+    )
+    if not log_files:
+        raise ValueError(f"No files matching {pattern!r} in {directory}")
+
+    summary = _new_import_summary()
+    summary["files"] = []
+    dates = {}
+    for log_file in log_files:
+        logger.info("Importing rotated log {}", log_file)
+        try:
+            file_summary = import_logs(log_file, workers=workers)
+        except ValueError as error:
+            logger.warning("Skipping {}: {}", log_file, error)
+            summary["files"].append({"file": log_file, "error": str(error)})
+            continue
+
+        summary["files"].append({"file": log_file, **file_summary})
+        for key in (
+            "processed_lines",
+            "parsed_lines",
+            "skipped_lines",
+            "inserted_logs",
+            "inserted_users",
+            "inserted_denied",
+        ):
+            summary[key] += file_summary[key]
+        for date_summary in file_summary["dates"]:
+            merged = _date_summary(dates, date_summary["date"])
+            for key in ("inserted_logs", "inserted_users", "inserted_denied"):
+                merged[key] += date_summary[key]
+
+    summary["dates"] = [dates[key] for key in sorted(dates)]
+    return summary
+
+
+def resume_position(metadata, current_inode: int, file_size: int) -> int:
+    """Return the byte offset to resume the live log from its stored cursor."""
+    if metadata is None:
+        return 0
+    last_position = metadata.last_position or 0
+    if metadata.last_inode != current_inode:
+        logger.info(
+            f"Inode changed: {metadata.last_inode} -> {current_inode}. Resetting position."
+        )
+        return 0
+    if file_size < last_position:
+        logger.warning(
+            f"File truncated (size: {file_size} < position: {last_position})"
+        )
+        return 0
+    return last_position
+
+
 def process_logs(log_file):
     """Process only the new tail of the live log and update its cursor."""
     if not os.path.exists(log_file):
@@ -680,21 +1068,10 @@ def process_logs(log_file):
     session = get_session()
     try:
         metadata = session.query(LogMetadata).first()
-        last_position = metadata.last_position if metadata else 0
-        if metadata:
-            if metadata.last_inode != current_inode:
-                logger.info(
-                    f"Inode changed: {metadata.last_inode} -> {current_inode}. Resetting position."
-                )
-                last_position = 0
-            elif file_size < last_position:
-                logger.warning(
-                    f"File truncated (size: {file_size} < position: {last_position})"
-                )
-                last_position = 0
+        last_position = resume_position(metadata, current_inode, file_size)
 
         summary, current_position = _ingest_log_file(
-            log_file, session, start_position=last_position
+            log_file, session, start_position=last_position, complete_lines_only=True
         )
         if metadata is None:
             metadata = LogMetadata()
@@ -0,0 +1,137 @@
+"""Bounded producer/consumer pipeline for access-log ingestion.
+
+::
+
+    reader thread --submit--> parser pool (threads or processes)
+          |                          |
+          +--> bounded FIFO of futures --> writer (calling thread)
+
+The reader turns its input into jobs, hands each one to the parser pool and
+queues the future.  The writer consumes futures strictly in queue order, so
+rows are written in file order whatever the pool size.  When the writer falls
+behind the queue fills up and the reader blocks, which keeps memory flat at
+roughly ``depth`` parsed jobs.  The writer stays on the calling thread because
+it owns the database session.
+"""
+
+import queue
+import threading
+import time
+
+from config import Config
+
+PIPELINE_DEPTH = max(1, Config.LOG_PIPELINE_QUEUE_SIZE)
+
+_DONE = object()
+
+
+class _ReaderFailure:
+    __slots__ = ("error",)
+
+    def __init__(self, error):
+        self.error = error
+
+
+class IngestPipeline:
+    """Run ``parse_job(*job)`` on ``executor`` for each job, yielding results.
+
+    ``stats`` describes the stage queues once iteration has finished:
+
+    * ``max_queue_depth`` / ``avg_queue_depth``: jobs queued between the
+      reader and the writer, sampled each time the writer takes one.
+    * ``max_parsing`` / ``max_ready``: how many of those were still being
+      parsed or already parsed and waiting for the writer.
+    * ``reader_blocked_seconds``: time the reader waited on a full queue
+      (the writer is the bottleneck).
+    * ``writer_wait_seconds``: time the writer waited for parsed results
+      (reading or parsing is the bottleneck).
+    """
+
+    def __init__(self, executor, parse_job, depth: int = PIPELINE_DEPTH):
+        self.executor = executor
+        self.parse_job = parse_job
+        self.depth = max(1, int(depth))
+        self.stats = {
+            "jobs": 0,
+            "queue_size": self.depth,
+            "max_queue_depth": 0,
+            "avg_queue_depth": 0.0,
+            "max_parsing": 0,
+            "max_ready": 0,
+            "reader_blocked_seconds": 0.0,
+            "writer_wait_seconds": 0.0,
+        }
+        self._queue = queue.Queue(maxsize=self.depth)
+        self._stop = threading.Event()
+
+    def results(self, jobs):
+        """Yield parse results in job order; ``jobs`` is consumed by the reader."""
+        reader = threading.Thread(
+            target=self._read, args=(jobs,), name="LogPipelineReader", daemon=True
+        )
+        reader.start()
+        stats = self.stats
+        depth_total = 0
+        try:
+            while True:
+                self._sample_depth()
+                depth_total += self._queue.qsize()
+
+                started = time.perf_counter()
+                item = self._queue.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, _ReaderFailure):
+                    raise item.error
+                result = item.result()
+                stats["writer_wait_seconds"] += time.perf_counter() - started
+                stats["jobs"] += 1
+                yield result
+        finally:
+            self._stop.set()
+            self._drain()
+            reader.join()
+            if stats["jobs"]:
+                stats["avg_queue_depth"] = round(depth_total / stats["jobs"], 2)
+            stats["reader_blocked_seconds"] = round(stats["reader_blocked_seconds"], 3)
+            stats["writer_wait_seconds"] = round(stats["writer_wait_seconds"], 3)
+
+    def _read(self, jobs) -> None:
+        try:
+            for job in jobs:
+                if self._stop.is_set():
+                    return
+                self._put(self.executor.submit(self.parse_job, *job))
+        except BaseException as error:
+            self._put(_ReaderFailure(error))
+        finally:
+            self._put(_DONE)
+
+    def _put(self, item) -> None:
+        started = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        self.stats["reader_blocked_seconds"] += time.perf_counter() - started
+
+    def _sample_depth(self) -> None:
+        with self._queue.mutex:
+            items = [item for item in self._queue.queue if hasattr(item, "done")]
+        ready = sum(1 for item in items if item.done())
+        stats = self.stats
+        stats["max_queue_depth"] = max(stats["max_queue_depth"], len(items))
+        stats["max_parsing"] = max(stats["max_parsing"], len(items) - ready)
+        stats["max_ready"] = max(stats["max_ready"], ready)
+
+    def _drain(self) -> None:
+        """Cancel queued work after the writer stopped early."""
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if hasattr(item, "cancel"):
+                item.cancel()
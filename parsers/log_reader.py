@@ -0,0 +1,151 @@
+"""Binary line reader with exact byte offsets for access-log ingestion.
+
+Lines are located in raw bytes and handed out as ``memoryview`` slices
+together with the offset just past each line, so the tailer's cursor never
+depends on re-encoding decoded text.  Large plain files are scanned through
+``mmap``; other streams (including decompressed archives) are read in blocks.
+"""
+
+import mmap
+import os
+
+READ_BLOCK_SIZE = 1024 * 1024
+MMAP_MIN_BYTES = 16 * 1024 * 1024
+
+
+def decode_log_line(raw_line) -> str:
+    """Decode one raw line; invalid UTF-8 never shifts the byte cursor."""
+    return str(raw_line, "utf-8", "replace")
+
+
+def _file_size(file) -> int | None:
+    try:
+        return os.fstat(file.fileno()).st_size
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def iter_log_lines(
+    file,
+    start: int = 0,
+    end: int | None = None,
+    complete_only: bool = False,
+    use_mmap: bool | None = None,
+):
+    """Yield ``(line, end_offset)`` for each line of a binary stream.
+
+    ``line`` is a ``memoryview`` that is only valid until the next item is
+    requested.  ``end_offset`` is the absolute byte position after the line.
+    Reading stops at the first line ending at or beyond ``end``.  With
+    ``complete_only`` a trailing line without ``\\n`` is not returned, so a
+    line that Squid is still writing is picked up by the next run instead.
+    """
+    size = _file_size(file)
+    if use_mmap is None:
+        use_mmap = size is not None and size - start >= MMAP_MIN_BYTES
+    if use_mmap and size:
+        yield from _iter_mmap_lines(file, size, start, end, complete_only)
+    else:
+        yield from _iter_block_lines(file, start, end, complete_only)
+
+
+def _iter_mmap_lines(file, size, start, end, complete_only):
+    limit = size if end is None else min(end, size)
+    with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        view = memoryview(mapped)
+        try:
+            position = start
+            while position < limit:
+                newline = mapped.find(b"\n", position)
+                if newline == -1:
+                    if complete_only:
+                        return
+                    line_end = size
+                else:
+                    line_end = newline + 1
+                line = view[position:line_end]
+                try:
+                    yield line, line_end
+                finally:
+                    line.release()
+                position = line_end
+        finally:
+            view.release()
+
+
+def _iter_block_lines(file, start, end, complete_only):
+    if start:
+        if hasattr(file, "seekable") and file.seekable():
+            file.seek(start)
+        else:
+            _skip_bytes(file, start)
+
+    position = start
+    pending = b""
+    while end is None or position < end:
+        block = file.read(READ_BLOCK_SIZE)
+        if not block:
+            break
+        data = pending + block if pending else block
+        view = memoryview(data)
+        line_start = 0
+        while True:
+            newline = data.find(b"\n", line_start)
+            if newline == -1:
+                break
+            line_end = newline + 1
+            position += line_end - line_start
+            yield view[line_start:line_end], position
+            line_start = line_end
+            if end is not None and position >= end:
+                return
+        pending = data[line_start:]
+
+    if pending and not complete_only and (end is None or position < end):
+        yield memoryview(pending), position + len(pending)
+
+
+def iter_log_blocks(
+    file,
+    start: int = 0,
+    complete_only: bool = False,
+    block_size: int = READ_BLOCK_SIZE,
+):
+    """Yield ``(block, end_offset)`` with whole lines of a binary stream.
+
+    Each ``block`` holds one or more complete lines (the last one only lacks
+    ``\\n`` at EOF without ``complete_only``), so blocks can be split into
+    lines independently of each other, e.g. by a parser pool.
+    """
+    if start:
+        if hasattr(file, "seekable") and file.seekable():
+            file.seek(start)
+        else:
+            _skip_bytes(file, start)
+
+    position = start
+    pending = b""
+    while True:
+        data = file.read(block_size)
+        if not data:
+            break
+        if pending:
+            data = pending + data
+        cut = data.rfind(b"\n") + 1
+        if not cut:
+            pending = data
+            continue
+        position += cut
+        pending = data[cut:]
+        yield (data[:cut] if pending else data), position
+
+    if pending and not complete_only:
+        yield pending, position + len(pending)
+
+
+def _skip_bytes(file, count: int) -> None:
+    while count > 0:
+        skipped = file.read(min(count, READ_BLOCK_SIZE))
+        if not skipped:
+            return
+        count -= len(skipped)
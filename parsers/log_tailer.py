@@ -0,0 +1,437 @@
+"""Continuous ingestion of the live Squid access log.
+
+A single :class:`LogTailer` thread keeps the log file, its compiled parser, a
+database session and a :class:`LogBatchWriter` open for the lifetime of the
+process.  It wakes up on inotify events for the log's directory (or polls when
+inotify is not available), follows rotation by inode like
+:func:`parsers.log.process_logs`, and commits buffered rows when the batch is
+full or ``LOG_TAIL_FLUSH_SECONDS`` after the first buffered line.  The byte
+cursor in ``LogMetadata`` is written in the same transaction as the rows it
+covers, so a restart neither loses nor duplicates lines.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import threading
+import time
+from datetime import datetime
+
+from loguru import logger
+
+from config import Config
+from database.database import LogMetadata, get_session
+from parsers.log import _date_suffix, get_log_parser, resume_position
+from parsers.log_reader import decode_log_line, iter_log_lines
+from parsers.log_writer import BATCH_SIZE, LogBatchWriter
+
+FLUSH_SECONDS = max(0.0, Config.LOG_TAIL_FLUSH_SECONDS)
+POLL_SECONDS = max(0.1, Config.LOG_TAIL_POLL_SECONDS)
+# Longest single wait with inotify, so stop requests are noticed promptly and a
+# missed event never delays ingestion for long.
+MAX_WAIT_SECONDS = 1.0
+ERROR_BACKOFF_SECONDS = 5.0
+
+# inotify(7) event mask for the directory that holds the log.
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+WATCH_MASK = (
+    IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+)
+
+
+class InotifyWatch:
+    """Block until something changes in the directory of a file.
+
+    The directory is watched rather than the file itself so that both the
+    rotated-away file and the newly created log wake the tailer.
+    """
+
+    mode = "inotify"
+
+    def __init__(self, path):
+        libc_name = ctypes.util.find_library("c")
+        libc = ctypes.CDLL(libc_name, use_errno=True) if libc_name else None
+        if libc is None or not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not available on this platform")
+
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+
+        directory = os.path.dirname(os.path.abspath(path))
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, os.strerror(error), directory)
+
+    def wait(self, timeout: float) -> bool:
+        """Wait up to ``timeout`` seconds; return True if events arrived."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+        try:
+            while os.read(self.fd, 64 * 1024):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class LogTailer(threading.Thread):
+    """Follow one access log and ingest new lines as Squid writes them."""
+
+    def __init__(
+        self,
+        log_file,
+        batch_size: int = BATCH_SIZE,
+        flush_seconds: float = FLUSH_SECONDS,
+        poll_seconds: float = POLL_SECONDS,
+    ):
+        super().__init__(name="LogTailer", daemon=True)
+        self.log_file = log_file
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.poll_seconds = poll_seconds
+        self.mode = None
+        self.stats = {
+            "lines_processed": 0,
+            "lines_parsed": 0,
+            "lines_skipped": 0,
+            "rows_committed": 0,
+            "flushes": 0,
+            "rotations": 0,
+            "errors": 0,
+            "last_flush_at": None,
+            "last_entry_at": None,
+            "lag_seconds": None,
+        }
+
+        self._stop_event = threading.Event()
+        self._watch = None
+        self._file = None
+        self._inode = None
+        self._position = 0
+        self._committed = (None, 0)
+        self._strategy = None
+        self._parse_record = None
+        self._suffixes = {}
+        self._session = None
+        self._writer = None
+        self._pending_since = None
+        self._pending_rows = 0
+        self._oldest_pending = None
+        self._newest_pending = None
+
+    # ------------------------------------------------------------------
+    # Thread lifecycle
+    # ------------------------------------------------------------------
+
+    def run(self) -> None:
+        try:
+            self._watch = InotifyWatch(self.log_file)
+            self.mode = InotifyWatch.mode
+        except OSError as error:
+            self.mode = "polling"
+            logger.warning(
+                "inotify unavailable for {} ({}); polling every {}s",
+                self.log_file,
+                error,
+                self.poll_seconds,
+            )
+        logger.info("Log tailer started for {} ({})", self.log_file, self.mode)
+
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    self.poll()
+                except Exception as error:
+                    self.stats["errors"] += 1
+                    logger.error(
+                        "Log tailer error on {}: {}",
+                        self.log_file,
+                        error,
+                        exc_info=True,
+                    )
+                    # Buffered rows are dropped; reopening resumes from the
+                    # last committed cursor, so they are read again.
+                    self._close()
+                    self._stop_event.wait(ERROR_BACKOFF_SECONDS)
+                    continue
+                self._wait()
+
+            try:
+                self.flush()
+            except Exception as error:
+                logger.error("Final log tailer flush failed: {}", error)
+        finally:
+            if self._watch is not None:
+                self._watch.close()
+                self._watch = None
+            self._close()
+            logger.info("Log tailer stopped for {}", self.log_file)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def _wait(self) -> None:
+        timeout = MAX_WAIT_SECONDS if self._watch is not None else self.poll_seconds
+        if self._pending_since is not None:
+            flush_in = self._pending_since + self.flush_seconds - time.monotonic()
+            timeout = min(timeout, max(0.0, flush_in))
+        if self._watch is not None:
+            self._watch.wait(timeout)
+        else:
+            self._stop_event.wait(timeout)
+
+    # ------------------------------------------------------------------
+    # Ingestion
+    # ------------------------------------------------------------------
+
+    def poll(self) -> None:
+        """Ingest what was appended since the last call and flush if due."""
+        if self._file is None and not self._open(resume=True):
+            return
+
+        file_size = os.fstat(self._file.fileno()).st_size
+        if file_size < self._position:
+            logger.warning(
+                f"File truncated (size: {file_size} < position: {self._position})"
+            )
+            self._position = 0
+            self._strategy, self._parse_record = get_log_parser(self.log_file)
+
+        self._read_available(complete_only=True)
+        self._follow_rotation()
+
+        if (
+            self._pending_since is not None
+            and time.monotonic() - self._pending_since >= self.flush_seconds
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        """Commit buffered rows together with the current cursor."""
+        if self._writer is None:
+            return
+        if self._writer.pending:
+            self._writer.flush()
+        elif self._committed != (self._inode, self._position):
+            self._save_cursor(self._session)
+            self._session.commit()
+        self._flushed()
+
+    def _open(self, resume: bool) -> bool:
+        try:
+            file = open(self.log_file, "rb")
+        except FileNotFoundError:
+            return False
+
+        file_stat = os.fstat(file.fileno())
+        if self._session is None:
+            self._session = get_session()
+        position = 0
+        if resume:
+            metadata = self._session.query(LogMetadata).first()
+            position = resume_position(metadata, file_stat.st_ino, file_stat.st_size)
+            if metadata is not None:
+                self._committed = (metadata.last_inode, metadata.last_position or 0)
+
+        self._file = file
+        self._inode = file_stat.st_ino
+        self._position = position
+        self._strategy, self._parse_record = get_log_parser(
+            self.log_file, start_position=position
+        )
+        self._writer = LogBatchWriter(
+            self._session, batch_size=self.batch_size, checkpoint=self._save_cursor
+        )
+        logger.info(
+            "Tailing {} from byte {} (format {})",
+            self.log_file,
+            position,
+            self._strategy,
+        )
+        return True
+
+    def _read_available(self, complete_only: bool) -> None:
+        stats = self.stats
+        writer = self._writer
+        parse_record = self._parse_record
+        suffixes = self._suffixes
+        start_position = self._position
+
+        # Never mmap the live file: a copytruncate while the map is open
+        # would kill the process with SIGBUS instead of raising.
+        for raw_line, line_end in iter_log_lines(
+            self._file, start_position, complete_only=complete_only, use_mmap=False
+        ):
+            self._position = line_end
+            stats["lines_processed"] += 1
+
+            record = parse_record(decode_log_line(raw_line))
+            if record is None:
+                stats["lines_skipped"] += 1
+                continue
+
+            stats["lines_parsed"] += 1
+            if self._oldest_pending is None:
+                self._oldest_pending = record[0]
+            self._newest_pending = record[0]
+            self._pending_rows += 1
+            writer.add_row(_date_suffix(record[0], suffixes), *record)
+            if not writer.pending:
+                # The batch filled up and add_row committed it.
+                self._flushed()
+
+        if self._position != start_position and self._pending_since is None:
+            self._pending_since = time.monotonic()
+
+    def _follow_rotation(self) -> None:
+        try:
+            path_inode = os.stat(self.log_file).st_ino
+        except FileNotFoundError:
+            # Rotated away and not recreated yet; keep the old handle.
+            return
+        if path_inode == self._inode:
+            return
+
+        logger.info(
+            f"Inode changed: {self._inode} -> {path_inode}. Finishing rotated file."
+        )
+        # Squid has reopened its log, so the old file is complete.
+        self._read_available(complete_only=False)
+        self.flush()
+        self._file.close()
+        self._file = None
+        self.stats["rotations"] += 1
+        if self._open(resume=False):
+            self._read_available(complete_only=True)
+
+    def _save_cursor(self, session) -> None:
+        """Checkpoint callback run inside the writer's flush transaction."""
+        metadata = session.query(LogMetadata).first()
+        if metadata is None:
+            metadata = LogMetadata()
+            session.add(metadata)
+        metadata.last_position = self._position
+        metadata.last_inode = self._inode
+        metadata.updated_at = datetime.now()
+
+    def _flushed(self) -> None:
+        now = datetime.now()
+        stats = self.stats
+        stats["flushes"] += 1
+        stats["rows_committed"] += self._pending_rows
+        stats["last_flush_at"] = now
+        if self._oldest_pending is not None:
+            stats["last_entry_at"] = self._newest_pending
+            stats["lag_seconds"] = round(
+                (now - self._oldest_pending).total_seconds(), 3
+            )
+        self._committed = (self._inode, self._position)
+        self._pending_since = None
+        self._pending_rows = 0
+        self._oldest_pending = None
+        self._newest_pending = None
+
+    def _close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._session is not None:
+            try:
+                self._session.rollback()
+            finally:
+                self._session.close()
+                self._session = None
+        self._writer = None
+        self._inode = None
+        self._pending_since = None
+        self._pending_rows = 0
+        self._oldest_pending = None
+        self._newest_pending = None
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+
+    def snapshot(self) -> dict:
+        """Return ingestion counters, lag and unread backlog for monitoring.
+
+        ``lag_seconds`` is the age of the oldest entry of the last committed
+        batch at commit time; ``backlog_bytes`` is what is still unread.
+        """
+        stats = dict(self.stats)
+        backlog_bytes = None
+        try:
+            file_stat = os.stat(self.log_file)
+            if file_stat.st_ino == self._inode:
+                backlog_bytes = max(0, file_stat.st_size - self._position)
+        except OSError:
+            pass
+
+        for key in ("last_flush_at", "last_entry_at"):
+            if stats[key] is not None:
+                stats[key] = stats[key].isoformat()
+        return {
+            "log_file": self.log_file,
+            "running": self.is_alive(),
+            "mode": self.mode,
+            "format": self._strategy,
+            "position": self._position,
+            "backlog_bytes": backlog_bytes,
+            "buffered_rows": self._pending_rows,
+            **stats,
+        }
+
+
+_tailer: LogTailer | None = None
+_tailer_lock = threading.Lock()
+
+
+def ensure_log_tailer(log_file) -> LogTailer:
+    """Start the tailer for ``log_file`` unless it is already following it."""
+    global _tailer
+
+    with _tailer_lock:
+        if _tailer is not None and _tailer.is_alive():
+            if _tailer.log_file == log_file:
+                return _tailer
+            logger.info("Access log changed to {}; restarting the tailer", log_file)
+            _tailer.stop()
+
+        _tailer = LogTailer(log_file)
+        _tailer.start()
+        return _tailer
+
+
+def stop_log_tailer() -> None:
+    global _tailer
+
+    with _tailer_lock:
+        if _tailer is not None:
+            _tailer.stop()
+            _tailer = None
+
+
+def get_ingest_stats() -> dict:
+    """Ingestion metrics of the live tailer, or why there are none."""
+    tailer = _tailer
+    if tailer is None:
+        return {
+            "running": False,
+            "mode": None if Config.LOG_TAILER_ENABLED else "scheduled",
+        }
+    return tailer.snapshot()
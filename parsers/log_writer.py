@@ -0,0 +1,559 @@
+"""Batched, column-oriented writer used by the access-log importer.
+
+Parsed entries are appended to per-table column buffers and written with a
+single statement per table and batch instead of one ORM object per line:
+
+* PostgreSQL (psycopg2): ``COPY ... FROM STDIN``.
+* SQLite / MySQL / MariaDB: a prepared ``INSERT`` run through the driver's
+  ``executemany`` (PyMySQL rewrites it into multi-row ``INSERT`` statements).
+
+Everything happens on the session's connection, so a batch is still committed
+or rolled back as a unit.
+"""
+
+import io
+import threading
+import time
+from array import array
+from collections import OrderedDict, defaultdict
+from datetime import timedelta
+
+from loguru import logger
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import IntegrityError, OperationalError, SQLAlchemyError
+
+from config import Config
+from database.database import DeniedLog, get_dynamic_models
+from utils.url_parsing import host_info, url_host
+
+BATCH_SIZE = max(1, Config.LOG_IMPORT_BATCH_SIZE)
+MAX_RETRIES = 3
+AGGREGATION_BUCKET_SECONDS = max(0, Config.LOG_AGGREGATION_BUCKET_SECONDS)
+# Days of user ids kept in memory: today and yesterday, for late lines.
+USER_ID_CACHE_DAYS = 2
+
+LOG_COLUMNS = (
+    "user_id",
+    "url",
+    "response",
+    "request_count",
+    "data_transmitted",
+    "created_at",
+    "host",
+    "domain",
+    "tld",
+)
+DENIED_COLUMNS = (
+    "username",
+    "ip",
+    "url",
+    "method",
+    "status",
+    "response",
+    "data_transmitted",
+    "created_at",
+)
+
+
+class ColumnBuffer:
+    """Append-only column store; integer columns are backed by ``array``."""
+
+    __slots__ = ("columns", "_values")
+
+    def __init__(self, columns, integer_columns=()):
+        self.columns = tuple(columns)
+        self._values = {
+            name: array("q") if name in integer_columns else [] for name in self.columns
+        }
+
+    def __len__(self) -> int:
+        return len(self._values[self.columns[0]])
+
+    def append(self, *values) -> int:
+        """Append one row and return its index."""
+        for name, value in zip(self.columns, values, strict=True):
+            self._values[name].append(value)
+        return len(self) - 1
+
+    def column(self, name: str):
+        return self._values[name]
+
+    def clear(self) -> None:
+        for values in self._values.values():
+            del values[:]
+
+
+def _new_log_buffer() -> ColumnBuffer:
+    return ColumnBuffer(
+        LOG_COLUMNS,
+        integer_columns=(
+            "response",
+            "request_count",
+            "data_transmitted",
+        ),
+    )
+
+
+def _new_denied_buffer() -> ColumnBuffer:
+    return ColumnBuffer(DENIED_COLUMNS, integer_columns=("data_transmitted",))
+
+
+def _new_date_counts() -> dict:
+    return {"inserted_logs": 0, "inserted_users": 0, "inserted_denied": 0}
+
+
+class DailyUserIds:
+    """Process-wide ``(username, ip) -> id`` maps of the daily user tables.
+
+    A day is bulk-loaded from its table the first time it is needed and then
+    reused by every writer, so repeated imports and the live tailer never look
+    users up row by row.  Only committed ids are published.  Beyond
+    ``max_days`` the least recently used day is evicted, so an import that
+    alternates between a few days keeps all of them loaded.
+    """
+
+    def __init__(self, max_days: int = USER_ID_CACHE_DAYS):
+        self.max_days = max(1, max_days)
+        self._days = OrderedDict()
+        self._lock = threading.Lock()
+
+    def day(self, session, date_suffix: str, user_table) -> dict:
+        """Return the id map of one day, loading it on first use."""
+        with self._lock:
+            user_ids = self._days.get(date_suffix)
+            if user_ids is not None:
+                self._days.move_to_end(date_suffix)
+        if user_ids is None:
+            user_ids = self.load(session, date_suffix, user_table)
+        return user_ids
+
+    def load(self, session, date_suffix: str, user_table) -> dict:
+        """(Re)load one day from its table, replacing any cached map."""
+        rows = session.execute(
+            select(
+                user_table.c.username, user_table.c.ip, func.min(user_table.c.id)
+            ).group_by(user_table.c.username, user_table.c.ip)
+        )
+        user_ids = {(username, ip): user_id for username, ip, user_id in rows}
+        with self._lock:
+            self._days[date_suffix] = user_ids
+            self._days.move_to_end(date_suffix)
+            while len(self._days) > self.max_days:
+                self._days.popitem(last=False)
+        return user_ids
+
+    def publish(self, date_suffix: str, user_ids: dict) -> None:
+        """Add ids committed by a writer to the cached day, if still cached."""
+        with self._lock:
+            cached = self._days.get(date_suffix)
+            if cached is not None:
+                cached.update(user_ids)
+
+    def discard(self, date_suffix: str) -> None:
+        with self._lock:
+            self._days.pop(date_suffix, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._days.clear()
+
+
+daily_user_ids = DailyUserIds()
+
+
+def compact_log_row(log_data: dict) -> tuple:
+    """Reduce a parsed log dict to the positional row stored by the writer."""
+    # Some Squid formats use '-' for unauthenticated users.  The IP is the
+    # stable fallback used by the DEFAULT parser as well.
+    username = log_data.get("username") or log_data.get("ip") or "-"
+    ip = log_data.get("ip") or "-"
+    return (
+        username,
+        ip,
+        log_data.get("url") or "-",
+        log_data.get("response"),
+        log_data.get("data_transmitted", 0) or 0,
+        log_data.get("method") or "",
+        log_data.get("status") or "",
+        bool(log_data.get("is_denied")),
+    )
+
+
+def _copy_text_value(value) -> str:
+    if value is None:
+        return "\\N"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+class LogBatchWriter:
+    """Buffer parsed log entries and flush them to the daily tables in batches.
+
+    ``pending`` is a running counter of buffered rows (logs, denied entries and
+    new users) so the caller never has to re-measure the buffers per line.
+    ``checkpoint(session)``, when given, runs inside every flush transaction
+    right before the commit, so a reader cursor is stored atomically with the
+    rows it covers.  Existing users are resolved through ``user_ids``
+    (:data:`daily_user_ids` by default).
+
+    With ``bucket_seconds`` (``LOG_AGGREGATION_BUCKET_SECONDS`` by default),
+    hits of the same user, URL and response within one time bucket (aligned to
+    midnight) are merged into a single row before the flush: ``request_count``
+    and ``data_transmitted`` are summed and ``created_at`` is the bucket start.
+    ``pending`` then counts rows, not hits.
+    """
+
+    def __init__(
+        self,
+        session,
+        batch_size: int = BATCH_SIZE,
+        checkpoint=None,
+        user_ids: DailyUserIds | None = None,
+        bucket_seconds: int | None = None,
+    ):
+        self.session = session
+        self.batch_size = max(1, int(batch_size))
+        self.checkpoint = checkpoint
+        if bucket_seconds is None:
+            bucket_seconds = AGGREGATION_BUCKET_SECONDS
+        self.bucket_seconds = max(0, int(bucket_seconds))
+        self.user_ids = daily_user_ids if user_ids is None else user_ids
+        self.pending = 0
+        self.counts = defaultdict(_new_date_counts)
+
+        self._tables = {}
+        self._new_users = defaultdict(dict)
+        self._logs = defaultdict(_new_log_buffer)
+        self._log_rows = defaultdict(dict)
+        self._denied = _new_denied_buffer()
+        self._pending_counts = defaultdict(_new_date_counts)
+        self._statements = {}
+        self._url_tags = {}
+
+    def tables(self, date_suffix: str):
+        """Return the ``(user_table, log_table)`` Core tables for one day."""
+        tables = self._tables.get(date_suffix)
+        if tables is None:
+            models = get_dynamic_models(date_suffix)
+            if not models or not models[0] or not models[1]:
+                raise RuntimeError(
+                    f"Could not create daily tables for date suffix {date_suffix}"
+                )
+            tables = (models[0].__table__, models[1].__table__)
+            self._tables[date_suffix] = tables
+        return tables
+
+    def add(self, date_suffix: str, log_datetime, log_data: dict) -> None:
+        """Buffer one parsed entry, flushing when the batch is full."""
+        self.add_row(date_suffix, log_datetime, *compact_log_row(log_data))
+
+    def add_row(
+        self,
+        date_suffix: str,
+        log_datetime,
+        username: str,
+        ip: str,
+        url: str,
+        response,
+        data_transmitted: int,
+        method: str,
+        status: str,
+        is_denied: bool,
+    ) -> None:
+        """Buffer one entry already reduced by :func:`compact_log_row`."""
+        if is_denied:
+            self._denied.append(
+                username,
+                ip,
+                url,
+                method,
+                status,
+                response,
+                data_transmitted,
+                log_datetime,
+            )
+            self._pending_counts[date_suffix]["inserted_denied"] += 1
+        else:
+            user_ref = self._resolve_user(date_suffix, username, ip, log_datetime)
+            response = response or 0
+            if self.bucket_seconds:
+                log_datetime = self._bucket_start(log_datetime)
+                row_key = (user_ref, url, response, log_datetime)
+                log_rows = self._log_rows[date_suffix]
+                row = log_rows.get(row_key)
+                if row is not None:
+                    buffer = self._logs[date_suffix]
+                    buffer.column("request_count")[row] += 1
+                    buffer.column("data_transmitted")[row] += data_transmitted
+                    return
+                log_rows[row_key] = self._logs[date_suffix].append(
+                    user_ref,
+                    url,
+                    response,
+                    1,
+                    data_transmitted,
+                    log_datetime,
+                    *self._tags(url),
+                )
+            else:
+                self._logs[date_suffix].append(
+                    user_ref,
+                    url,
+                    response,
+                    1,
+                    data_transmitted,
+                    log_datetime,
+                    *self._tags(url),
+                )
+            self._pending_counts[date_suffix]["inserted_logs"] += 1
+        self.pending += 1
+
+        if self.pending >= self.batch_size:
+            self.flush()
+
+    def _tags(self, url: str) -> tuple:
+        """``(host, domain, tld)`` stored with a log row of ``url``.
+
+        Computed once per URL and batch.  Blacklist matches are not stored:
+        the blacklist summary matches the ``host`` column when it counts a
+        day, so blacklist edits never leave stale flags behind.
+        """
+        tags = self._url_tags.get(url)
+        if tags is None:
+            info = host_info(url_host(url)[:255])
+            tags = self._url_tags[url] = (info.host, info.domain[:255], info.tld)
+        return tags
+
+    def _bucket_start(self, log_datetime):
+        seconds = (
+            log_datetime.hour * 3600 + log_datetime.minute * 60 + log_datetime.second
+        )
+        return log_datetime.replace(microsecond=0) - timedelta(
+            seconds=seconds % self.bucket_seconds
+        )
+
+    def _resolve_user(self, date_suffix, username, ip, log_datetime):
+        """Return a known user id, or the ``(username, ip)`` key of a new user."""
+        user_key = (username, ip)
+        user_id = self.user_ids.day(
+            self.session, date_suffix, self.tables(date_suffix)[0]
+        ).get(user_key)
+        if user_id is not None:
+            return user_id
+
+        new_users = self._new_users[date_suffix]
+        if user_key in new_users:
+            return user_key
+
+        new_users[user_key] = log_datetime
+        self._pending_counts[date_suffix]["inserted_users"] += 1
+        self.pending += 1
+        return user_key
+
+    def flush(self) -> None:
+        """Write every buffered row in one transaction, retrying lock errors."""
+        if not self.pending:
+            return
+
+        for retry_count in range(MAX_RETRIES):
+            try:
+                inserted_user_ids = self._write_pending()
+                if self.checkpoint is not None:
+                    self.checkpoint(self.session)
+                self.session.commit()
+            except IntegrityError as error:
+                self.session.rollback()
+                logger.warning(
+                    "Integrity error importing batch (retry {}/{}): {}",
+                    retry_count + 1,
+                    MAX_RETRIES,
+                    error,
+                )
+                # Another writer may have committed one of our new users;
+                # reload those days so the retry reuses the stored ids.
+                for date_suffix, new_users in self._new_users.items():
+                    if new_users:
+                        self.user_ids.load(
+                            self.session, date_suffix, self.tables(date_suffix)[0]
+                        )
+                continue
+            except OperationalError as error:
+                self.session.rollback()
+                if "database is locked" not in str(error).lower():
+                    raise
+                logger.warning(
+                    "Database locked while importing; retrying ({}/{})",
+                    retry_count + 1,
+                    MAX_RETRIES,
+                )
+                time.sleep(0.5 * (retry_count + 1))
+                continue
+            except SQLAlchemyError:
+                self.session.rollback()
+                raise
+
+            # Only ids of committed rows may be reused by later batches.
+            for date_suffix, user_ids in inserted_user_ids.items():
+                self.user_ids.publish(date_suffix, user_ids)
+            for date_suffix, pending_counts in self._pending_counts.items():
+                date_counts = self.counts[date_suffix]
+                for key, value in pending_counts.items():
+                    date_counts[key] += value
+            self._clear_pending()
+            return
+
+        raise RuntimeError("Could not commit a log import batch")
+
+    def _clear_pending(self) -> None:
+        self._new_users.clear()
+        self._logs.clear()
+        self._log_rows.clear()
+        self._denied.clear()
+        self._pending_counts.clear()
+        self._url_tags.clear()
+        self.pending = 0
+
+    def _write_pending(self) -> dict:
+        connection = self.session.connection()
+        inserted_user_ids = {}
+
+        for date_suffix, new_users in self._new_users.items():
+            if not new_users:
+                continue
+            user_table, _ = self.tables(date_suffix)
+            known_ids = self.user_ids.day(self.session, date_suffix, user_table)
+            day_ids = {key: known_ids[key] for key in new_users if key in known_ids}
+            missing = {
+                key: created_at
+                for key, created_at in new_users.items()
+                if key not in day_ids
+            }
+            if missing:
+                day_ids.update(self._insert_users(connection, user_table, missing))
+            inserted_user_ids[date_suffix] = day_ids
+
+        for date_suffix, buffer in self._logs.items():
+            if not len(buffer):
+                continue
+            _, log_table = self.tables(date_suffix)
+            day_ids = inserted_user_ids.get(date_suffix, {})
+            user_ids = [
+                ref if isinstance(ref, int) else day_ids[ref]
+                for ref in buffer.column("user_id")
+            ]
+            columns = [user_ids] + [
+                buffer.column(name) for name in LOG_COLUMNS if name != "user_id"
+            ]
+            self._write_columns(connection, log_table, LOG_COLUMNS, columns)
+
+        if len(self._denied):
+            self._write_columns(
+                connection,
+                DeniedLog.__table__,
+                DENIED_COLUMNS,
+                [self._denied.column(name) for name in DENIED_COLUMNS],
+            )
+
+        return inserted_user_ids
+
+    @staticmethod
+    def _insert_users(connection, user_table, new_users: dict) -> dict:
+        """Insert new users and return ``{(username, ip): id}``."""
+        rows = [
+            {"username": username, "ip": ip, "created_at": created_at}
+            for (username, ip), created_at in new_users.items()
+        ]
+        if connection.dialect.insert_executemany_returning:
+            result = connection.execute(
+                insert(user_table).returning(
+                    user_table.c.id,
+                    user_table.c.username,
+                    user_table.c.ip,
+                    sort_by_parameter_order=True,
+                ),
+                rows,
+            )
+            return {(row.username, row.ip): row.id for row in result}
+
+        user_ids = {}
+        for row in rows:
+            result = connection.execute(insert(user_table).values(**row))
+            user_ids[(row["username"], row["ip"])] = result.inserted_primary_key[0]
+        return user_ids
+
+    def _write_columns(self, connection, table, column_names, columns) -> None:
+        dialect = connection.dialect
+        if dialect.name == "postgresql" and self._copy_columns(
+            connection, table, column_names, columns
+        ):
+            return
+
+        statement = self._insert_statement(dialect, table, column_names)
+        if statement is None:
+            connection.execute(
+                insert(table),
+                [
+                    dict(zip(column_names, row, strict=True))
+                    for row in zip(*columns, strict=True)
+                ],
+            )
+            return
+
+        processed = []
+        for name, values in zip(column_names, columns, strict=True):
+            column_type = table.c[name].type.dialect_impl(dialect)
+            processor = column_type.bind_processor(dialect)
+            processed.append(map(processor, values) if processor else values)
+        connection.exec_driver_sql(statement, list(zip(*processed, strict=True)))
+
+    def _insert_statement(self, dialect, table, column_names) -> str | None:
+        """Return a driver-level ``INSERT`` for positional paramstyles."""
+        cache_key = (dialect.name, table.name, column_names)
+        if cache_key in self._statements:
+            return self._statements[cache_key]
+
+        if dialect.paramstyle == "qmark":
+            marker = "?"
+        elif dialect.paramstyle in ("format", "pyformat"):
+            marker = "%s"
+        else:
+            marker = None
+
+        statement = None
+        if marker is not None:
+            preparer = dialect.identifier_preparer
+            statement = (
+                f"INSERT INTO {preparer.format_table(table)} "  # noqa: S608
+                f"({', '.join(preparer.quote(name) for name in column_names)}) "
+                f"VALUES ({', '.join([marker] * len(column_names))})"
+            )
+        self._statements[cache_key] = statement
+        return statement
+
+    @staticmethod
+    def _copy_columns(connection, table, column_names, columns) -> bool:
+        """Stream rows with ``COPY FROM STDIN``; return False if unsupported."""
+        cursor = connection.connection.dbapi_connection.cursor()
+        try:
+            if not hasattr(cursor, "copy_expert"):
+                return False
+            payload = io.StringIO()
+            for row in zip(*columns, strict=True):
+                payload.write("\t".join(map(_copy_text_value, row)))
+                payload.write("\n")
+            payload.seek(0)
+            preparer = connection.dialect.identifier_preparer
+            cursor.copy_expert(
+                f"COPY {preparer.format_table(table)} "
+                f"({', '.join(preparer.quote(name) for name in column_names)}) "
+                "FROM STDIN",
+                payload,
+            )
+            return True
+        finally:
+            cursor.close()
@@ -1,4 +1,4 @@
-"""Admin database overview, health checks and log import API."""
+"""Admin database overview, health and pool stats, log import and retention."""
 
 import os
 import tempfile
@@ -7,6 +7,8 @@ from flask import jsonify, render_template, request
 from flask_babel import gettext as _
 from loguru import logger
 
+from database.database import get_engine
+from database.pool import pool_stats
 from parsers.log import import_logs as import_log_file
 from services.auth.auth_service import (
     admin_required,
@@ -15,6 +17,7 @@ from services.auth.auth_service import (
 )
 from services.database import backup_service
 from services.database.db_info_service import get_db_health, run_integrity_check
+from services.database.retention_service import get_retention_overview, run_retention
 
 from .helpers import json_error, json_success
 
@@ -38,6 +41,12 @@ def register_routes(bp):
         resp, code = run_integrity_check()
         return jsonify(resp), code
 
+    @bp.route("/api/db-pool", methods=["GET"])
+    @api_auth_required
+    def db_pool():
+        """Connection pool occupancy and checkout wait statistics."""
+        return jsonify(pool_stats(get_engine()))
+
     @bp.route("/api/import-logs", methods=["POST"])
     @api_admin_required
     def import_logs():
@@ -74,3 +83,26 @@ def register_routes(bp):
                     os.unlink(temporary_path)
                 except FileNotFoundError:
                     pass
+
+    @bp.route("/api/retention", methods=["GET"])
+    @api_auth_required
+    def retention_overview():
+        """Retention settings, recent runs and total reclaimed space."""
+        try:
+            return jsonify(get_retention_overview())
+        except Exception:
+            logger.exception("Error loading retention overview")
+            return json_error(_("No se pudo cargar el estado de la retención"), 500)
+
+    @bp.route("/api/retention/run", methods=["POST"])
+    @api_admin_required
+    def retention_run():
+        """Apply the retention settings now instead of waiting for 01:00."""
+        try:
+            summary = run_retention()
+            return json_success(
+                _("Retención aplicada correctamente"), extra={"run": summary}
+            )
+        except Exception:
+            logger.exception("Error applying data retention")
+            return json_error(_("No se pudo aplicar la retención"), 500)
@@ -8,11 +8,11 @@ from pathlib import Path
 from flask import render_template, request
 from loguru import logger
 from sqlalchemy import func
-from sqlalchemy import inspect as sqlalchemy_inspect
 from sqlalchemy.exc import IntegrityError
 
 from database.database import get_dynamic_models, get_session
 from database.models.models import QuotaEvent, QuotaGroup, QuotaRule, QuotaUser
+from database.table_catalog import table_catalog
 from services.auth.auth_service import admin_required
 from services.database.admin_helpers import load_env_vars
 from services.quota.quota_service import (
@@ -80,22 +80,12 @@ def register_routes(bp):
             # Map usage from daily log tables into QuotaUser.used_mb to reflect real data
             quota_usernames = [q.username for q in user_quotas]
             usage_by_username = {}
-            inspector = sqlalchemy_inspect(session.get_bind())
-            all_tables = inspector.get_table_names()
             current_month_prefix = datetime.now(timezone.utc).strftime("%Y%m")
 
-            for table_name in all_tables:
-                if not table_name.startswith("user_"):
-                    continue
-
-                suffix = table_name.split("_", 1)[1]
+            for suffix in table_catalog.day_suffixes(session.get_bind(), complete=True):
                 if not suffix.startswith(current_month_prefix):
                     continue
 
-                log_table_name = f"log_{suffix}"
-                if log_table_name not in all_tables:
-                    continue
-
                 UserModel, LogModel = get_dynamic_models(suffix)
                 if not UserModel or not LogModel:
                     continue
@@ -4,6 +4,7 @@ from loguru import logger
 from werkzeug.exceptions import BadRequest
 
 from database.database import get_session
+from parsers.log_tailer import get_ingest_stats
 from routes.admin.helpers import get_config_manager, json_error, json_success
 from services.analytics.auditoria_service import (
     get_all_usernames,
@@ -71,6 +72,15 @@ def get_latest_metric():
         return jsonify({})
 
 
+@api_bp.route("/metrics/ingest")
+def get_ingest_metric():
+    try:
+        return jsonify(get_ingest_stats())
+    except Exception as e:
+        logger.error(f"Error retrieving ingest metrics: {e}")
+        return jsonify({})
+
+
 @api_bp.route("/all-users", methods=["GET"])
 def api_get_all_users():
     db = get_session()
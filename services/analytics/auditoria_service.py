@@ -1,118 +1,145 @@
-from collections import defaultdict
-from datetime import datetime, timedelta
+from collections import Counter, defaultdict
+from datetime import date, datetime
 from typing import Any
 
 from flask_babel import gettext as _
 from loguru import logger
-from sqlalchemy import func, inspect, or_, text
+from sqlalchemy import and_, func, or_, select, text
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 
 from database.database import get_dynamic_models
+from services.analytics.day_executor import add_counts, run_days
+from services.analytics.range_query import (
+    all_days,
+    daily_tables,
+    day_label,
+    days_in_range,
+    recent_window,
+    select_days,
+    select_window,
+)
 from utils.social_media import SOCIAL_MEDIA_DOMAINS
+from utils.url_parsing import host_info
 
 
-def _get_tables_in_range(
-    inspector, start_date: datetime, end_date: datetime
-) -> list[tuple[str, str]]:
-    all_db_tables = inspector.get_table_names()
-    log_tables_in_range = []
-    current_date = start_date
-    while current_date <= end_date:
-        date_suffix = current_date.strftime("%Y%m%d")
-        log_table = f"log_{date_suffix}"
-        user_table = f"user_{date_suffix}"
-        if log_table in all_db_tables and user_table in all_db_tables:
-            log_tables_in_range.append(log_table)
-        current_date += timedelta(days=1)
-    return log_tables_in_range
+def _parse_range(start_str: str, end_str: str) -> tuple[date, date]:
+    return (
+        datetime.strptime(start_str, "%Y-%m-%d").date(),
+        datetime.strptime(end_str, "%Y-%m-%d").date(),
+    )
 
 
-def find_by_keyword(
-    db: Session, start_str: str, end_str: str, keyword: str, username: str = None
-) -> dict[str, Any]:
-    start_date, end_date = (
-        datetime.strptime(start_str, "%Y-%m-%d"),
-        datetime.strptime(end_str, "%Y-%m-%d"),
+def _day_rows(db: Session, suffixes: list[str], build, order: tuple[str, ...]):
+    """Rows of ``build`` over every day, sorted by the ``order`` columns, desc.
+
+    One UNION ALL query normally returns them all.  Days with diverging
+    schemas cannot share it: each day is then queried on its own (in
+    parallel) and the ones that fail are logged and skipped.
+    """
+    days = select_days(suffixes, build)
+    try:
+        return db.execute(
+            select(days).order_by(*(days.c[name].desc() for name in order))
+        ).all()
+    except SQLAlchemyError:
+        db.rollback()
+        logger.warning(
+            f"Range query over {len(suffixes)} day(s) failed; querying per day"
+        )
+
+    def day_rows(session, suffix):
+        return session.execute(build(*daily_tables(suffix), suffix)).all()
+
+    def extend(total, partial):
+        total.extend(partial)
+        return total
+
+    rows = run_days(db, suffixes, day_rows, extend, [])
+    return sorted(
+        rows,
+        key=lambda row: tuple(
+            (row._mapping[name] is not None, row._mapping[name]) for name in order
+        ),
+        reverse=True,
     )
-    inspector = inspect(db.get_bind())
-    tables = _get_tables_in_range(inspector, start_date, end_date)
-    if not tables:
-        return {"error": _("No data for the selected dates.")}
 
-    all_results = []
 
-    for log_table in tables:
-        date_suffix = log_table.split("_")[1]
-        try:
-            UserModel, LogModel = get_dynamic_models(date_suffix)
-            if UserModel is None or LogModel is None:
-                continue
-
-            # Create query using ORM
-            query = (
-                db.query(
-                    UserModel.username,
-                    UserModel.ip,
-                    LogModel.url,
-                    LogModel.data_transmitted,
-                    LogModel.created_at,
-                    func.count(LogModel.id).label("access_count"),
-                    func.sum(LogModel.data_transmitted).label("total_data"),
-                    func.max(LogModel.created_at).label("last_seen"),
-                )
-                .join(LogModel, LogModel.user_id == UserModel.id)
-                .filter(LogModel.url.like(f"%{keyword}%"))
+def _find_log_rows(
+    db: Session,
+    start_str: str,
+    end_str: str,
+    condition,
+    username: str = None,
+    with_response: bool = False,
+) -> dict[str, Any]:
+    """Per-day log rows matching ``condition(user, log)`` in one UNION query."""
+    start_date, end_date = _parse_range(start_str, end_str)
+    suffixes = days_in_range(db, start_date, end_date)
+    if not suffixes:
+        return {"error": _("No data for the selected dates.")}
+
+    def build(user, log, suffix):
+        group = [
+            user.c.username,
+            user.c.ip,
+            log.c.url,
+            *([log.c.response] if with_response else []),
+            log.c.data_transmitted,
+            log.c.created_at,
+        ]
+        query = (
+            select(
+                day_label(suffix),
+                *group,
+                func.sum(log.c.request_count).label("access_count"),
+                func.sum(log.c.data_transmitted).label("total_data"),
+                func.max(log.c.created_at).label("last_seen"),
             )
+            .join_from(user, log, log.c.user_id == user.c.id)
+            .where(condition(user, log))
+        )
+        if username:
+            query = query.where(user.c.username == username)
+        return query.group_by(*group)
 
-            if username:
-                query = query.filter(UserModel.username == username)
+    rows = _day_rows(db, suffixes, build, ("username", "log_date", "access_count"))
 
-            query = query.group_by(
-                UserModel.username,
-                UserModel.ip,
-                LogModel.url,
-                LogModel.data_transmitted,
-                LogModel.created_at,
-            )
+    all_results = []
+    for row in rows:
+        result = {
+            "log_date": row.log_date,
+            "username": row.username,
+            "ip": row.ip,
+            "url": row.url,
+        }
+        if with_response:
+            result["response"] = row.response
+        result["access_count"] = row.access_count
+        result["total_data"] = row.total_data
+        result["last_seen"] = row.last_seen
+        all_results.append(result)
 
-            results = query.all()
-
-            for row in results:
-                all_results.append(
-                    {
-                        "log_date": date_suffix,
-                        "username": row.username,
-                        "ip": row.ip,
-                        "url": row.url,
-                        "access_count": row.access_count,
-                        "total_data": row.total_data,
-                        "last_seen": row.last_seen,
-                    }
-                )
+    return {"results": all_results}
 
-        except Exception as e:
-            print(f"Error processing table {log_table}: {e}")
-            continue
 
-    # Sort results
-    all_results.sort(
-        key=lambda x: (x["username"], x["log_date"], x["access_count"]), reverse=True
+def find_by_keyword(
+    db: Session, start_str: str, end_str: str, keyword: str, username: str = None
+) -> dict[str, Any]:
+    return _find_log_rows(
+        db,
+        start_str,
+        end_str,
+        lambda user, log: log.c.url.like(f"%{keyword}%"),
+        username,
     )
 
-    return {"results": all_results}
-
 
 def find_social_media_activity(
     db: Session, start_str: str, end_str: str, sites: list[str], username: str = None
 ) -> dict[str, Any]:
-    start_date, end_date = (
-        datetime.strptime(start_str, "%Y-%m-%d"),
-        datetime.strptime(end_str, "%Y-%m-%d"),
-    )
-    inspector = inspect(db.get_bind())
-    tables = _get_tables_in_range(inspector, start_date, end_date)
-    if not tables:
+    start_date, end_date = _parse_range(start_str, end_str)
+    if not days_in_range(db, start_date, end_date):
         return {"error": _("No data for the selected dates.")}
 
     domain_list = []
@@ -122,231 +149,61 @@ def find_social_media_activity(
     if not domain_list:
         return {"error": _("No valid domains specified for search.")}
 
-    all_results = []
-
-    for log_table in tables:
-        date_suffix = log_table.split("_")[1]
-        try:
-            UserModel, LogModel = get_dynamic_models(date_suffix)
-            if UserModel is None or LogModel is None:
-                continue
-
-            # Create OR conditions for each domain using ORM
-            domain_conditions = []
-            for domain in domain_list:
-                domain_conditions.extend(
-                    [
-                        LogModel.url.like(f"%.{domain}/%"),
-                        LogModel.url.like(f"%.{domain}:%"),
-                        LogModel.url.like(f"%.{domain}"),
-                        LogModel.url.like(f"%//{domain}/%"),
-                        LogModel.url.like(f"%//{domain}:%"),
-                        LogModel.url.like(f"%//{domain}"),
-                    ]
-                )
-
-            # Create query using ORM
-            query = (
-                db.query(
-                    UserModel.username,
-                    UserModel.ip,
-                    LogModel.url,
-                    LogModel.data_transmitted,
-                    LogModel.created_at,
-                    func.count(LogModel.id).label("access_count"),
-                    func.sum(LogModel.data_transmitted).label("total_data"),
-                    func.max(LogModel.created_at).label("last_seen"),
+    # A site entry matches its host and every subdomain.  Registrable
+    # domains are looked up on the indexed ``domain`` column; entries below
+    # one ("yt3.ggpht.com") narrow their domain's rows by host.
+    registrable = sorted(
+        {domain for domain in domain_list if host_info(domain).domain == domain}
+    )
+    subdomains = [domain for domain in domain_list if domain not in registrable]
+
+    def condition(user, log):
+        tagged = [log.c.domain.in_(registrable)] if registrable else []
+        for domain in subdomains:
+            tagged.append(
+                and_(
+                    log.c.domain == host_info(domain).domain,
+                    or_(log.c.host == domain, log.c.host.like(f"%.{domain}")),
                 )
-                .join(LogModel, LogModel.user_id == UserModel.id)
-                .filter(or_(*domain_conditions))
             )
-
-            if username:
-                query = query.filter(UserModel.username == username)
-
-            query = query.group_by(
-                UserModel.username,
-                UserModel.ip,
-                LogModel.url,
-                LogModel.data_transmitted,
-                LogModel.created_at,
+        # Rows imported before log rows carried their host.
+        untagged = []
+        for domain in domain_list:
+            untagged.extend(
+                [
+                    log.c.url.like(f"%.{domain}/%"),
+                    log.c.url.like(f"%.{domain}:%"),
+                    log.c.url.like(f"%.{domain}"),
+                    log.c.url.like(f"%//{domain}/%"),
+                    log.c.url.like(f"%//{domain}:%"),
+                    log.c.url.like(f"%//{domain}"),
+                ]
             )
+        return or_(*tagged, and_(log.c.host.is_(None), or_(*untagged)))
 
-            results = query.all()
-
-            for row in results:
-                all_results.append(
-                    {
-                        "log_date": date_suffix,
-                        "username": row.username,
-                        "ip": row.ip,
-                        "url": row.url,
-                        "access_count": row.access_count,
-                        "total_data": row.total_data,
-                        "last_seen": row.last_seen,
-                    }
-                )
-
-        except Exception as e:
-            print(f"Error processing table {log_table}: {e}")
-            continue
-
-    # Sort results
-    all_results.sort(
-        key=lambda x: (x["username"], x["log_date"], x["access_count"]), reverse=True
-    )
-
-    return {"results": all_results}
+    return _find_log_rows(db, start_str, end_str, condition, username)
 
 
 def find_by_ip(
     db: Session, start_str: str, end_str: str, ip_address: str
 ) -> dict[str, Any]:
-    start_date, end_date = (
-        datetime.strptime(start_str, "%Y-%m-%d"),
-        datetime.strptime(end_str, "%Y-%m-%d"),
+    return _find_log_rows(
+        db, start_str, end_str, lambda user, log: user.c.ip == ip_address
     )
-    inspector = inspect(db.get_bind())
-    tables = _get_tables_in_range(inspector, start_date, end_date)
-    if not tables:
-        return {"error": _("No data for the selected dates.")}
-
-    all_results = []
-
-    for log_table in tables:
-        date_suffix = log_table.split("_")[1]
-        try:
-            UserModel, LogModel = get_dynamic_models(date_suffix)
-            if UserModel is None or LogModel is None:
-                continue
-
-            # Create query using ORM
-            query = (
-                db.query(
-                    UserModel.username,
-                    UserModel.ip,
-                    LogModel.url,
-                    LogModel.data_transmitted,
-                    LogModel.created_at,
-                    func.count(LogModel.id).label("access_count"),
-                    func.sum(LogModel.data_transmitted).label("total_data"),
-                    func.max(LogModel.created_at).label("last_seen"),
-                )
-                .join(LogModel, LogModel.user_id == UserModel.id)
-                .filter(UserModel.ip == ip_address)
-                .group_by(
-                    UserModel.username,
-                    UserModel.ip,
-                    LogModel.url,
-                    LogModel.data_transmitted,
-                    LogModel.created_at,
-                )
-            )
-
-            results = query.all()
-
-            for row in results:
-                all_results.append(
-                    {
-                        "log_date": date_suffix,
-                        "username": row.username,
-                        "ip": row.ip,
-                        "url": row.url,
-                        "access_count": row.access_count,
-                        "total_data": row.total_data,
-                        "last_seen": row.last_seen,
-                    }
-                )
-
-        except Exception as e:
-            print(f"Error processing table {log_table}: {e}")
-            continue
-
-    # Sort results
-    all_results.sort(
-        key=lambda x: (x["username"], x["log_date"], x["access_count"]), reverse=True
-    )
-
-    return {"results": all_results}
 
 
 def find_by_response_code(
     db: Session, start_str: str, end_str: str, code: int, username: str = None
 ) -> dict[str, Any]:
-    start_date, end_date = (
-        datetime.strptime(start_str, "%Y-%m-%d"),
-        datetime.strptime(end_str, "%Y-%m-%d"),
-    )
-    inspector = inspect(db.get_bind())
-    tables = _get_tables_in_range(inspector, start_date, end_date)
-    if not tables:
-        return {"error": _("No data for the selected dates.")}
-
-    all_results = []
-
-    for log_table in tables:
-        date_suffix = log_table.split("_")[1]
-        try:
-            UserModel, LogModel = get_dynamic_models(date_suffix)
-            if UserModel is None or LogModel is None:
-                continue
-
-            # Create query using ORM
-            query = (
-                db.query(
-                    UserModel.username,
-                    UserModel.ip,
-                    LogModel.url,
-                    LogModel.response,
-                    LogModel.data_transmitted,
-                    LogModel.created_at,
-                    func.count(LogModel.id).label("access_count"),
-                    func.sum(LogModel.data_transmitted).label("total_data"),
-                    func.max(LogModel.created_at).label("last_seen"),
-                )
-                .join(LogModel, LogModel.user_id == UserModel.id)
-                .filter(LogModel.response == code)
-            )
-
-            if username:
-                query = query.filter(UserModel.username == username)
-
-            query = query.group_by(
-                UserModel.username,
-                UserModel.ip,
-                LogModel.url,
-                LogModel.response,
-                LogModel.data_transmitted,
-                LogModel.created_at,
-            )
-
-            results = query.all()
-
-            for row in results:
-                all_results.append(
-                    {
-                        "log_date": date_suffix,
-                        "username": row[0],
-                        "ip": row[1],
-                        "url": row[2],
-                        "response": row[3],
-                        "access_count": row.access_count,
-                        "total_data": row.total_data,
-                        "last_seen": row.last_seen,
-                    }
-                )
-
-        except Exception as e:
-            print(f"Error processing table {log_table}: {e}")
-            continue
-
-    # Sort results
-    all_results.sort(
-        key=lambda x: (x["username"], x["log_date"], x["access_count"]), reverse=True
+    return _find_log_rows(
+        db,
+        start_str,
+        end_str,
+        lambda user, log: log.c.response == code,
+        username,
+        with_response=True,
     )
 
-    return {"results": all_results}
-
 
 def get_daily_activity(db: Session, date_str: str, username: str) -> dict[str, Any]:
     try:
@@ -367,7 +224,7 @@ def get_daily_activity(db: Session, date_str: str, username: str) -> dict[str, A
                 func.cast(
                     func.strftime("%H", LogModel.created_at), text("INTEGER")
                 ).label("hour_of_day"),
-                func.count(LogModel.id).label("request_count"),
+                func.sum(LogModel.request_count).label("request_count"),
             )
             .join(UserModel, LogModel.user_id == UserModel.id)
             .filter(UserModel.username == username)
@@ -407,98 +264,73 @@ def get_daily_activity(db: Session, date_str: str, username: str) -> dict[str, A
 
 
 def get_all_usernames(db: Session) -> list[str]:
-    engine = db.get_bind()
-    inspector = inspect(engine)
-    all_tables = inspector.get_table_names()
-    user_tables = [t for t in all_tables if t.startswith("user_") and len(t) == 13]
-    if not user_tables:
-        return []
-
-    all_usernames = set()
-
-    for table_name in user_tables:
-        date_suffix = table_name.split("_")[1]
-        try:
-            UserModel, _ = get_dynamic_models(date_suffix)
-            if UserModel is None:
-                continue
-
-            # Use ORM to get unique usernames
-            usernames = (
-                db.query(UserModel.username)
-                .filter(
-                    UserModel.username.isnot(None),
-                    UserModel.username != "",
-                    UserModel.username != "-",
-                )
-                .distinct()
-                .all()
+    def build(user, log, suffix):
+        return (
+            select(user.c.username)
+            .where(
+                user.c.username.isnot(None),
+                user.c.username != "",
+                user.c.username != "-",
             )
+            .distinct()
+        )
 
-            for username_row in usernames:
-                all_usernames.add(username_row[0])
-
-        except Exception as e:
-            print(f"Error processing table {table_name}: {e}")
-            continue
+    days = select_days(all_days(db), build)
+    if days is None:
+        return []
 
-    return sorted(all_usernames)
+    return sorted(db.execute(select(days.c.username).distinct()).scalars())
 
 
 def get_user_activity_summary(
     db: Session, username: str, start_str: str, end_str: str
 ) -> dict[str, Any]:
-    start_date = datetime.strptime(start_str, "%Y-%m-%d")
-    end_date = datetime.strptime(end_str, "%Y-%m-%d")
-    inspector = inspect(db.get_bind())
-    tables = _get_tables_in_range(inspector, start_date, end_date)
-    if not tables:
+    start_date, end_date = _parse_range(start_str, end_str)
+    suffixes = days_in_range(db, start_date, end_date)
+    if not suffixes:
         return {"error": _("No data for the selected dates.")}
 
+    def build(user, log, suffix):
+        return (
+            select(
+                log.c.url,
+                log.c.response,
+                func.sum(log.c.request_count).label("requests"),
+                func.sum(log.c.data_transmitted).label("data"),
+            )
+            .join_from(log, user, log.c.user_id == user.c.id)
+            .where(user.c.username == username)
+            .group_by(log.c.url, log.c.response)
+        )
+
+    days = select_days(suffixes, build)
+    results = db.execute(
+        select(
+            days.c.url,
+            days.c.response,
+            func.sum(days.c.requests).label("requests"),
+            func.sum(days.c.data).label("data"),
+        ).group_by(days.c.url, days.c.response)
+    )
+
     total_requests = 0
     total_data = 0
     domain_counts = defaultdict(int)
     response_counts = defaultdict(int)
 
-    for log_table in tables:
-        date_suffix = log_table.split("_")[1]
-        try:
-            UserModel, LogModel = get_dynamic_models(date_suffix)
-            if UserModel is None or LogModel is None:
-                continue
-
-            # Usar ORM para obtener datos del usuario
-            results = (
-                db.query(
-                    LogModel.url,
-                    LogModel.data_transmitted,
-                    LogModel.request_count,
-                    LogModel.response,
-                )
-                .join(UserModel, LogModel.user_id == UserModel.id)
-                .filter(UserModel.username == username)
-                .all()
-            )
-
-            for row in results:
-                total_requests += row[2]
-                total_data += row[1]
-
-                # Extraer dominio
-                try:
-                    domain = row[0].split("//")[-1].split("/")[0].split(":")[0]
-                    domain_counts[domain] += row[2]
-                except Exception as e:
-                    logger.error(
-                        f"Error processing row in get_user_activity_summary: {e}"
-                    )
-                    pass
-
-                response_counts[row[3]] += row[2]
+    for url, response, requests, data in results:
+        requests = requests or 0
+        total_requests += requests
+        total_data += data or 0
 
+        # Extraer dominio
+        try:
+            domain = url.split("//")[-1].split("/")[0].split(":")[0]
+            domain_counts[domain] += requests
         except Exception as e:
-            print(f"Error processing table {log_table}: {e}")
-            continue
+            logger.error(f"Error processing row in get_user_activity_summary: {e}")
+
+        response_counts[response] += requests
 
     if total_requests == 0:
         return {
@@ -525,47 +357,81 @@ def get_user_activity_summary(
     }
 
 
-def get_top_users_by_data(
-    db: Session, start_str: str, end_str: str, limit: int = 10
-) -> dict[str, Any]:
-    start_date = datetime.strptime(start_str, "%Y-%m-%d")
-    end_date = datetime.strptime(end_str, "%Y-%m-%d")
-    inspector = inspect(db.get_bind())
-    tables = _get_tables_in_range(inspector, start_date, end_date)
-    if not tables:
-        return {"error": _("No data for the selected dates.")}
+def _top_totals(
+    db: Session,
+    start_str: str,
+    end_str: str,
+    key: str,
+    measure: str,
+    limit: int,
+    named_users_only: bool = False,
+):
+    """Top ``limit`` values of ``key`` by summed ``measure`` over the range.
 
-    user_data = defaultdict(int)
+    Returns None when no day in the range has tables.
+    """
+    start_date, end_date = _parse_range(start_str, end_str)
+    suffixes = days_in_range(db, start_date, end_date)
+    if not suffixes:
+        return None
+
+    def build(user, log, suffix):
+        key_column = log.c[key] if key in log.c else user.c[key]
+        query = select(
+            key_column.label("key"),
+            func.sum(log.c[measure]).label("total"),
+        )
+        if key_column.table is user or named_users_only:
+            query = query.join_from(log, user, log.c.user_id == user.c.id)
+        if named_users_only:
+            query = query.where(user.c.username != "-")
+        return query.group_by(key_column)
+
+    days = select_days(suffixes, build)
+    total = func.sum(days.c.total).label("total")
+    try:
+        return db.execute(
+            select(days.c.key, total)
+            .group_by(days.c.key)
+            .order_by(total.desc())
+            .limit(limit)
+        ).all()
+    except SQLAlchemyError:
+        # Days with diverging schemas cannot share one UNION: aggregate each
+        # day on its own (in parallel) and skip the ones that fail.
+        db.rollback()
+        logger.warning(
+            f"Range query over {len(suffixes)} day(s) failed; querying per day"
+        )
 
-    for log_table in tables:
-        date_suffix = log_table.split("_")[1]
-        try:
-            UserModel, LogModel = get_dynamic_models(date_suffix)
-            if UserModel is None or LogModel is None:
-                continue
-            results = (
-                db.query(
-                    UserModel.username,
-                    func.sum(LogModel.data_transmitted).label("total_data"),
-                )
-                .join(LogModel, LogModel.user_id == UserModel.id)
-                .filter(UserModel.username != "-")
-                .group_by(UserModel.username)
-                .all()
-            )
+    def day_totals(session, suffix):
+        query = build(*daily_tables(suffix), suffix)
+        return Counter({key: value or 0 for key, value in session.execute(query)})
 
-            for row in results:
-                user_data[row[0]] += row.total_data or 0
+    totals = run_days(db, suffixes, day_totals, add_counts, Counter())
+    return totals.most_common(limit)
 
-        except Exception as e:
-            print(f"Error processing table {log_table}: {e}")
-            continue
 
-    # Sort and limit results
-    sorted_users = sorted(user_data.items(), key=lambda x: x[1], reverse=True)[:limit]
+def get_top_users_by_data(
+    db: Session, start_str: str, end_str: str, limit: int = 10
+) -> dict[str, Any]:
+    sorted_users = _top_totals(
+        db,
+        start_str,
+        end_str,
+        "username",
+        "data_transmitted",
+        limit,
+        named_users_only=True,
+    )
+    if sorted_users is None:
+        return {"error": _("No data for the selected dates.")}
 
     top_users_list = [
-        {"username": username, "total_data_gb": float(round(total_data / (1024**3), 2))}
+        {
+            "username": username,
+            "total_data_gb": float(round((total_data or 0) / (1024**3), 2)),
+        }
         for username, total_data in sorted_users
     ]
 
@@ -579,42 +445,28 @@ def get_total_data_consumed(
     Get total data consumed across all users in the date range
     Returns: dict with total_data_gb and total_requests
     """
-    start_date = datetime.strptime(start_str, "%Y-%m-%d")
-    end_date = datetime.strptime(end_str, "%Y-%m-%d")
-    inspector = inspect(db.get_bind())
-    tables = _get_tables_in_range(inspector, start_date, end_date)
-    if not tables:
+    start_date, end_date = _parse_range(start_str, end_str)
+    suffixes = days_in_range(db, start_date, end_date)
+    if not suffixes:
         return {
             "error": f"No data tables found for the selected date range ({start_str} to {end_str})."
         }
 
-    total_data = 0
-    total_requests = 0
-
-    for log_table in tables:
-        date_suffix = log_table.split("_")[1]
-        try:
-            UserModel, LogModel = get_dynamic_models(date_suffix)
-            if UserModel is None or LogModel is None:
-                continue
-
-            # Sum all data transmitted and count all requests
-            result = db.query(
-                func.sum(LogModel.data_transmitted).label("total_data"),
-                func.count(LogModel.id).label("total_requests"),
-            ).first()
-
-            if result:
-                data_sum = result.total_data or 0
-                request_count = result.total_requests or 0
-                total_data += data_sum
-                total_requests += request_count
-            else:
-                print(f"Table {log_table}: No results from query")
-
-        except Exception as e:
-            print(f"Error processing table {log_table}: {e}")
-            continue
+    # Sum all data transmitted and count all requests
+    days = select_days(
+        suffixes,
+        lambda user, log, suffix: select(
+            func.sum(log.c.data_transmitted).label("total_data"),
+            func.sum(log.c.request_count).label("total_requests"),
+        ),
+    )
+    result = db.execute(
+        select(
+            func.coalesce(func.sum(days.c.total_data), 0),
+            func.coalesce(func.sum(days.c.total_requests), 0),
+        )
+    ).one()
+    total_data, total_requests = (int(value) for value in result)
 
     return {
         "total_data_gb": float(round(total_data / (1024**3), 2))
@@ -622,7 +474,7 @@ def get_total_data_consumed(
         else 0.0,
         "total_requests": total_requests,
         "date_range": f"{start_str} to {end_str}",
-        "tables_processed": len(tables),
+        "tables_processed": len(suffixes),
         "total_data_bytes": total_data,
     }
 
@@ -631,41 +483,21 @@ def get_top_users_by_requests(
     db: Session, start_str: str, end_str: str, limit: int = 10
 ) -> dict[str, Any]:
     """Aggregate top users by total request_count across the date range."""
-    start_date = datetime.strptime(start_str, "%Y-%m-%d")
-    end_date = datetime.strptime(end_str, "%Y-%m-%d")
-    inspector = inspect(db.get_bind())
-    tables = _get_tables_in_range(inspector, start_date, end_date)
-    if not tables:
+    sorted_users = _top_totals(
+        db,
+        start_str,
+        end_str,
+        "username",
+        "request_count",
+        limit,
+        named_users_only=True,
+    )
+    if sorted_users is None:
         return {"error": _("No data for the selected dates.")}
 
-    user_reqs: defaultdict[str, int] = defaultdict(int)
-
-    for log_table in tables:
-        date_suffix = log_table.split("_")[1]
-        try:
-            UserModel, LogModel = get_dynamic_models(date_suffix)
-            if UserModel is None or LogModel is None:
-                continue
-            results = (
-                db.query(
-                    UserModel.username,
-                    func.sum(LogModel.request_count).label("total_reqs"),
-                )
-                .join(LogModel, LogModel.user_id == UserModel.id)
-                .filter(UserModel.username != "-")
-                .group_by(UserModel.username)
-                .all()
-            )
-            for row in results:
-                user_reqs[row[0]] += row.total_reqs or 0
-        except Exception as e:
-            print(f"Error processing table {log_table}: {e}")
-            continue
-
-    sorted_users = sorted(user_reqs.items(), key=lambda x: x[1], reverse=True)[:limit]
     return {
         "top_users_requests": [
-            {"username": username, "total_requests": int(total_reqs)}
+            {"username": username, "total_requests": int(total_reqs or 0)}
             for username, total_reqs in sorted_users
         ]
     }
@@ -674,42 +506,12 @@ def get_top_users_by_requests(
 def get_top_urls_by_data(
     db: Session, start_str: str, end_str: str, limit: int = 15
 ) -> dict[str, Any]:
-    start_date = datetime.strptime(start_str, "%Y-%m-%d")
-    end_date = datetime.strptime(end_str, "%Y-%m-%d")
-    inspector = inspect(db.get_bind())
-    tables = _get_tables_in_range(inspector, start_date, end_date)
-    if not tables:
+    sorted_urls = _top_totals(db, start_str, end_str, "url", "data_transmitted", limit)
+    if sorted_urls is None:
         return {"error": _("No data for the selected dates.")}
 
-    url_data = defaultdict(int)
-
-    for log_table in tables:
-        date_suffix = log_table.split("_")[1]
-        try:
-            UserModel, LogModel = get_dynamic_models(date_suffix)
-            if UserModel is None or LogModel is None:
-                continue
-            results = (
-                db.query(
-                    LogModel.url,
-                    func.sum(LogModel.data_transmitted).label("total_data"),
-                )
-                .group_by(LogModel.url)
-                .all()
-            )
-
-            for row in results:
-                url_data[row[0]] += row.total_data or 0
-
-        except Exception as e:
-            print(f"Error processing table {log_table}: {e}")
-            continue
-
-    # Sort and limit results
-    sorted_urls = sorted(url_data.items(), key=lambda x: x[1], reverse=True)[:limit]
-
     top_urls_list = [
-        {"url": url, "total_data_gb": float(round(total_data / (1024**3), 2))}
+        {"url": url, "total_data_gb": float(round((total_data or 0) / (1024**3), 2))}
         for url, total_data in sorted_urls
     ]
 
@@ -720,42 +522,15 @@ def get_top_ips_by_data(
     db: Session, start_str: str, end_str: str, limit: int = 10
 ) -> dict[str, Any]:
     """Aggregate total data transmitted grouped by IP across the date range."""
-    start_date = datetime.strptime(start_str, "%Y-%m-%d")
-    end_date = datetime.strptime(end_str, "%Y-%m-%d")
-    inspector = inspect(db.get_bind())
-    tables = _get_tables_in_range(inspector, start_date, end_date)
-    if not tables:
+    sorted_ips = _top_totals(db, start_str, end_str, "ip", "data_transmitted", limit)
+    if sorted_ips is None:
         return {"error": _("No data for the selected dates.")}
 
-    ip_data: defaultdict[str, int] = defaultdict(int)
-
-    for log_table in tables:
-        date_suffix = log_table.split("_")[1]
-        try:
-            UserModel, LogModel = get_dynamic_models(date_suffix)
-            if UserModel is None or LogModel is None:
-                continue
-            results = (
-                db.query(
-                    UserModel.ip,
-                    func.sum(LogModel.data_transmitted).label("total_data"),
-                )
-                .join(LogModel, LogModel.user_id == UserModel.id)
-                .group_by(UserModel.ip)
-                .all()
-            )
-            for row in results:
-                ip_data[row[0]] += row.total_data or 0
-        except Exception as e:
-            print(f"Error processing table {log_table}: {e}")
-            continue
-
-    sorted_ips = sorted(ip_data.items(), key=lambda x: x[1], reverse=True)[:limit]
     return {
         "top_ips": [
             {
                 "ip": ip,
-                "total_data_gb": float(round(total_data / (1024**3), 2)),
+                "total_data_gb": float(round((total_data or 0) / (1024**3), 2)),
             }
             for ip, total_data in sorted_ips
         ]
@@ -765,64 +540,45 @@ def get_top_ips_by_data(
 def find_denied_access(
     db: Session, start_str: str, end_str: str, username: str = None
 ) -> dict[str, Any]:
-    start_date = datetime.strptime(start_str, "%Y-%m-%d")
-    end_date = datetime.strptime(end_str, "%Y-%m-%d")
-    inspector = inspect(db.get_bind())
-    tables = _get_tables_in_range(inspector, start_date, end_date)
-    if not tables:
+    start_date, end_date = _parse_range(start_str, end_str)
+    suffixes = days_in_range(db, start_date, end_date)
+    if not suffixes:
         return {"error": _("No data for the selected dates.")}
 
-    all_results = []
-
-    for log_table in tables:
-        date_suffix = log_table.split("_")[1]
-        try:
-            UserModel, LogModel = get_dynamic_models(date_suffix)
-            if UserModel is None or LogModel is None:
-                continue
-
-            # Create query using ORM
-            query = (
-                db.query(
-                    UserModel.username,
-                    UserModel.ip,
-                    LogModel.url,
-                    LogModel.response,
-                    LogModel.data_transmitted,
-                    LogModel.created_at,
-                )
-                .join(LogModel, LogModel.user_id == UserModel.id)
-                .filter(LogModel.response == 403)
+    def build(user, log, suffix):
+        query = (
+            select(
+                day_label(suffix),
+                user.c.username,
+                user.c.ip,
+                log.c.url,
+                log.c.response,
+                log.c.data_transmitted,
+                log.c.created_at,
             )
+            .join_from(user, log, log.c.user_id == user.c.id)
+            .where(log.c.response == 403)
+        )
+        if username:
+            query = query.where(user.c.username == username)
+        return query
 
-            if username:
-                query = query.filter(UserModel.username == username)
-
-            query = query.order_by(LogModel.created_at.desc())
-
-            results = query.all()
-
-            for row in results:
-                all_results.append(
-                    {
-                        "log_date": date_suffix,
-                        "username": row[0],
-                        "ip": row[1],
-                        "url": row[2],
-                        "response": row[3],
-                        "data_transmitted": row[4],
-                        "created_at": row[5],
-                    }
-                )
-
-        except Exception as e:
-            print(f"Error processing table {log_table}: {e}")
-            continue
-
-    # Sort results
-    all_results.sort(key=lambda x: (x["log_date"], x["username"]), reverse=True)
+    rows = _day_rows(db, suffixes, build, ("log_date", "username", "created_at"))
 
-    return {"results": all_results}
+    return {
+        "results": [
+            {
+                "log_date": row.log_date,
+                "username": row.username,
+                "ip": row.ip,
+                "url": row.url,
+                "response": row.response,
+                "data_transmitted": row.data_transmitted,
+                "created_at": row.created_at,
+            }
+            for row in rows
+        ]
+    }
 
 
 def find_suspicious_activity(db, threshold=50, hours=1):
@@ -830,48 +586,31 @@ def find_suspicious_activity(db, threshold=50, hours=1):
     Find IPs with suspicious activity (many requests in short time)
     Returns: list of tuples [(ip, count), ...]
     """
-    from datetime import datetime, timedelta
-
     try:
-        since_time = datetime.now() - timedelta(hours=hours)
-
-        # Get all user tables to check across all dates
-        engine = db.get_bind()
-        inspector = inspect(engine)
-        all_tables = inspector.get_table_names()
-        user_tables = [t for t in all_tables if t.startswith("user_") and len(t) == 13]
-
-        ip_counts = defaultdict(int)
-
-        for table_name in user_tables:
-            date_suffix = table_name.split("_")[1]
-            try:
-                UserModel, LogModel = get_dynamic_models(date_suffix)
-                if UserModel is None or LogModel is None:
-                    continue
-
-                # Use ORM to count requests per IP
-                results = (
-                    db.query(
-                        UserModel.ip, func.count(LogModel.id).label("request_count")
-                    )
-                    .join(LogModel, LogModel.user_id == UserModel.id)
-                    .filter(LogModel.created_at >= since_time)
-                    .group_by(UserModel.ip)
-                    .having(func.count(LogModel.id) > threshold)
-                    .all()
-                )
 
-                for row in results:
-                    ip_counts[row[0]] += row.request_count
+        def build(user, log, suffix):
+            return (
+                select(user.c.ip, func.sum(log.c.request_count).label("request_count"))
+                .join_from(user, log, log.c.user_id == user.c.id)
+                .group_by(user.c.ip)
+            )
 
-            except Exception as e:
-                print(f"Error processing table {table_name}: {e}")
-                continue
+        days = select_window(db, *recent_window(hours), build)
+        if days is None:
+            return []
 
         # Sort by count descending and return top 10
-        sorted_ips = sorted(ip_counts.items(), key=lambda x: x[1], reverse=True)[:10]
-        return sorted_ips
+        request_count = func.sum(days.c.request_count)
+        return [
+            tuple(row)
+            for row in db.execute(
+                select(days.c.ip, request_count)
+                .group_by(days.c.ip)
+                .having(request_count > threshold)
+                .order_by(request_count.desc())
+                .limit(10)
+            )
+        ]
 
     except Exception as e:
         print(f"Error finding suspicious activity: {e}")
@@ -883,47 +622,25 @@ def get_active_users_count(db, hours=1):
     Count unique active users in the last N hours
     Returns: number of unique users
     """
-    from datetime import datetime, timedelta
-
     try:
-        since_time = datetime.now() - timedelta(hours=hours)
-
-        # Get all user tables to check across all dates
-        engine = db.get_bind()
-        inspector = inspect(engine)
-        all_tables = inspector.get_table_names()
-        user_tables = [t for t in all_tables if t.startswith("user_") and len(t) == 13]
-
-        active_users = set()
-
-        for table_name in user_tables:
-            date_suffix = table_name.split("_")[1]
-            try:
-                UserModel, LogModel = get_dynamic_models(date_suffix)
-                if UserModel is None or LogModel is None:
-                    continue
-
-                # Use ORM to get distinct usernames with activity in time range
-                usernames = (
-                    db.query(UserModel.username.distinct())
-                    .join(LogModel, LogModel.user_id == UserModel.id)
-                    .filter(
-                        LogModel.created_at >= since_time,
-                        UserModel.username.isnot(None),
-                        UserModel.username != "",
-                        UserModel.username != "-",
-                    )
-                    .all()
-                )
 
-                for username_row in usernames:
-                    active_users.add(username_row[0])
+        def build(user, log, suffix):
+            return (
+                select(user.c.username)
+                .join_from(user, log, log.c.user_id == user.c.id)
+                .where(
+                    user.c.username.isnot(None),
+                    user.c.username != "",
+                    user.c.username != "-",
+                )
+                .distinct()
+            )
 
-            except Exception as e:
-                print(f"Error processing table {table_name}: {e}")
-                continue
+        days = select_window(db, *recent_window(hours), build)
+        if days is None:
+            return 0
 
-        return len(active_users)
+        return db.execute(select(func.count(days.c.username.distinct()))).scalar_one()
 
     except Exception as e:
         print(f"Error counting active users: {e}")
@@ -935,108 +652,69 @@ def get_high_usage_users(db, hours=24, limit=5, threshold_mb=500):
     Get users with high data consumption
     Returns: list of tuples [(username, usage_mb), ...]
     """
-    from datetime import datetime, timedelta
-
     try:
-        since_time = datetime.now() - timedelta(hours=hours)
-
-        # Get all user tables to check across all dates
-        engine = db.get_bind()
-        inspector = inspect(engine)
-        all_tables = inspector.get_table_names()
-        user_tables = [t for t in all_tables if t.startswith("user_") and len(t) == 13]
-
-        user_usage = defaultdict(float)
-
-        for table_name in user_tables:
-            date_suffix = table_name.split("_")[1]
-            try:
-                UserModel, LogModel = get_dynamic_models(date_suffix)
-                if UserModel is None or LogModel is None:
-                    continue
-
-                # Use ORM to sum data usage per user
-                results = (
-                    db.query(
-                        UserModel.username,
-                        func.sum(LogModel.data_transmitted).label("total_bytes"),
-                    )
-                    .join(LogModel, LogModel.user_id == UserModel.id)
-                    .filter(
-                        LogModel.created_at >= since_time,
-                        UserModel.username.isnot(None),
-                        UserModel.username != "",
-                        UserModel.username != "-",
-                    )
-                    .group_by(UserModel.username)
-                    .all()
-                )
 
-                for row in results:
-                    usage_mb = float((row.total_bytes or 0) / (1024 * 1024))
-                    user_usage[row[0]] += usage_mb
+        def build(user, log, suffix):
+            return (
+                select(
+                    user.c.username,
+                    func.sum(log.c.data_transmitted).label("total_bytes"),
+                )
+                .join_from(user, log, log.c.user_id == user.c.id)
+                .where(
+                    user.c.username.isnot(None),
+                    user.c.username != "",
+                    user.c.username != "-",
+                )
+                .group_by(user.c.username)
+            )
 
-            except Exception as e:
-                print(f"Error processing table {table_name}: {e}")
-                continue
+        days = select_window(db, *recent_window(hours), build)
+        if days is None:
+            return []
 
         # Filter by threshold and sort
-        filtered_users = [
-            (username, usage)
-            for username, usage in user_usage.items()
-            if usage > threshold_mb
+        total_bytes = func.sum(days.c.total_bytes)
+        results = db.execute(
+            select(days.c.username, total_bytes)
+            .group_by(days.c.username)
+            .having(total_bytes > threshold_mb * 1024 * 1024)
+            .order_by(total_bytes.desc())
+            .limit(limit)
+        )
+        return [
+            (username, float((usage or 0) / (1024 * 1024)))
+            for username, usage in results
         ]
-        sorted_users = sorted(filtered_users, key=lambda x: x[1], reverse=True)[:limit]
-
-        return sorted_users
 
     except Exception as e:
         print(f"Error getting high usage users: {e}")
         return []
 
 
+def _recent_request_count(db, hours: int, condition) -> int:
+    days = select_window(
+        db,
+        *recent_window(hours),
+        lambda user, log, suffix: select(
+            func.sum(log.c.request_count).label("requests")
+        ).where(condition(log)),
+    )
+    if days is None:
+        return 0
+    return int(db.execute(select(func.sum(days.c.requests))).scalar() or 0)
+
+
 def get_failed_auth_attempts(db, hours=1, threshold=10):
     """
     Get failed authentication attempts
     Returns: number of failed attempts
     """
-    from datetime import datetime, timedelta
-
     try:
-        since_time = datetime.now() - timedelta(hours=hours)
-
-        # Get all user tables to check across all dates
-        engine = db.get_bind()
-        inspector = inspect(engine)
-        all_tables = inspector.get_table_names()
-        user_tables = [t for t in all_tables if t.startswith("user_") and len(t) == 13]
-
-        total_failed = 0
-
-        for table_name in user_tables:
-            date_suffix = table_name.split("_")[1]
-            try:
-                UserModel, LogModel = get_dynamic_models(date_suffix)
-                if UserModel is None or LogModel is None:
-                    continue
-
-                # Use ORM to count failed auth attempts (401, 407, 403 responses)
-                count = (
-                    db.query(func.count(LogModel.id))
-                    .filter(
-                        LogModel.created_at >= since_time,
-                        LogModel.response.in_([401, 407, 403]),
-                    )
-                    .scalar()
-                )
-
-                total_failed += count or 0
-
-            except Exception as e:
-                print(f"Error processing table {table_name}: {e}")
-                continue
-
-        return total_failed
+        # Failed auth attempts: 401, 407, 403 responses
+        return _recent_request_count(
+            db, hours, lambda log: log.c.response.in_([401, 407, 403])
+        )
 
     except Exception as e:
         print(f"Error getting failed auth attempts: {e}")
@@ -1048,40 +726,8 @@ def get_denied_requests(db, hours=1, threshold=5):
     Get denied requests
     Returns: number of denied requests
     """
-    from datetime import datetime, timedelta
-
     try:
-        since_time = datetime.now() - timedelta(hours=hours)
-
-        # Get all user tables to check across all dates
-        engine = db.get_bind()
-        inspector = inspect(engine)
-        all_tables = inspector.get_table_names()
-        user_tables = [t for t in all_tables if t.startswith("user_") and len(t) == 13]
-
-        total_denied = 0
-
-        for table_name in user_tables:
-            date_suffix = table_name.split("_")[1]
-            try:
-                UserModel, LogModel = get_dynamic_models(date_suffix)
-                if UserModel is None or LogModel is None:
-                    continue
-
-                # Use ORM to count denied requests (403 responses)
-                count = (
-                    db.query(func.count(LogModel.id))
-                    .filter(LogModel.created_at >= since_time, LogModel.response == 403)
-                    .scalar()
-                )
-
-                total_denied += count or 0
-
-            except Exception as e:
-                print(f"Error processing table {table_name}: {e}")
-                continue
-
-        return total_denied
+        return _recent_request_count(db, hours, lambda log: log.c.response == 403)
 
     except Exception as e:
         print(f"Error getting denied requests: {e}")
@@ -0,0 +1,335 @@
+"""Persistent per-day summary of the requests to blacklisted sites.
+
+The blacklist page used to rescan every ``log_YYYYMMDD`` table of the history
+each time its five-minute cache expired, and again after every blacklist
+edit.  ``blacklist_daily_hits`` now keeps the blacklisted requests of each
+day per (user, host) and ``blacklist_daily_hit_days`` how far each day has
+been counted:
+
+* a day is counted once; ``refresh_blacklist_summary`` only adds the rows
+  written after its ``last_log_id`` (today's traffic, late lines);
+* ``blacklist_summary_entries`` keeps the blacklist the summary was counted
+  against, so ``sync_blacklist_summary`` can diff it with the active one at
+  any time, including the first edit after a restart;
+* a blacklist edit recounts only the domains it touches
+  (``apply_blacklist_changes``), found through the indexed ``domain`` column
+  of the log rows;
+* days whose tables are gone (retention, manual drops) leave the summary.
+
+Days holding rows imported before log rows carried their host, and every
+day when the keyword entries (which match URLs, not hosts) change, are
+recounted whole, one day per transaction.
+"""
+
+from datetime import date, datetime, timedelta
+
+from loguru import logger
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from database.database import get_dynamic_models
+from database.models.models import BlacklistHit, BlacklistHitDay, BlacklistSummaryEntry
+from database.table_catalog import table_catalog
+from services.security.blacklist_matcher import (
+    BlacklistMatcher,
+    get_blacklist_matcher,
+)
+from utils.url_parsing import host_suffixes, parent_domain, url_host
+
+# Domains recounted per statement after a blacklist edit.
+DOMAIN_CHUNK = 500
+
+
+def blacklisted_rows(db, query, match):
+    """Stream the rows of ``query`` whose ``key`` column is blacklisted.
+
+    ``match`` is ``matcher.match_url`` or ``matcher.match_host``; each
+    distinct key is matched once in Python (see ``blacklist_matcher``), so
+    every active domain is checked, however long the list is.
+    """
+    matches: dict[str, bool] = {}
+    for row in db.execute(query.execution_options(yield_per=5000)):
+        hit = matches.get(row.key)
+        if hit is None:
+            hit = matches[row.key] = match(row.key or "") is not None
+        if hit:
+            yield row
+
+
+def count_day_hits(session, UserModel, LogModel, matcher, *where) -> dict:
+    """Blacklisted requests of the day's rows matching ``where``.
+
+    Returns ``{(username, host): [domain, requests]}``.  Rows tagged at
+    ingestion are grouped by their ``host`` column; rows imported before it
+    existed, and every row while the blacklist holds keyword entries (which
+    need the full URL), are grouped by URL instead.
+    """
+    hits: dict[tuple[str, str], list] = {}
+
+    def add(username, host, domain, total):
+        hit = hits.setdefault((username, host[:255]), [domain[:255], 0])
+        hit[1] += int(total or 1)
+
+    total = func.sum(LogModel.request_count).label("total")
+    by_url = (
+        select(UserModel.username, LogModel.url.label("key"), total)
+        .join_from(LogModel, UserModel, LogModel.user_id == UserModel.id)
+        .where(*where)
+        .group_by(UserModel.username, LogModel.url)
+    )
+    if not matcher.patterns:
+        by_host = (
+            select(
+                UserModel.username, LogModel.host.label("key"), LogModel.domain, total
+            )
+            .join_from(LogModel, UserModel, LogModel.user_id == UserModel.id)
+            .where(LogModel.host.isnot(None), *where)
+            .group_by(UserModel.username, LogModel.host, LogModel.domain)
+        )
+        for row in blacklisted_rows(session, by_host, matcher.match_host):
+            add(row.username, row.key, row.domain or "unknown", row.total)
+        by_url = by_url.where(LogModel.host.is_(None))
+
+    for row in blacklisted_rows(session, by_url, matcher.match_url):
+        host = url_host(row.key)
+        add(row.username, host, parent_domain(host), row.total)
+    return hits
+
+
+def _add_hits(session, day: date, hits: dict) -> None:
+    existing = {
+        (hit.username, hit.host): hit
+        for hit in session.query(BlacklistHit).filter(
+            BlacklistHit.day == day,
+            BlacklistHit.username.in_({username for username, _ in hits}),
+        )
+    }
+    for (username, host), (domain, requests) in hits.items():
+        hit = existing.get((username, host))
+        if hit is None:
+            session.add(
+                BlacklistHit(
+                    day=day,
+                    username=username,
+                    host=host,
+                    domain=domain,
+                    requests=requests,
+                )
+            )
+        else:
+            hit.requests += requests
+
+
+def _forget_days(session, days) -> None:
+    days = list(days)
+    for start in range(0, len(days), DOMAIN_CHUNK):
+        chunk = days[start : start + DOMAIN_CHUNK]
+        session.execute(delete(BlacklistHit).where(BlacklistHit.day.in_(chunk)))
+        session.execute(delete(BlacklistHitDay).where(BlacklistHitDay.day.in_(chunk)))
+
+
+def refresh_day(session, day: date, UserModel, LogModel, matcher, state=None) -> bool:
+    """Count the rows of ``day`` added since ``state``; False if there were none."""
+    max_log_id = int(
+        session.query(func.coalesce(func.max(LogModel.id), 0)).scalar() or 0
+    )
+    first_log_id = state.last_log_id if state is not None else 0
+    if max_log_id <= first_log_id:
+        return False
+
+    in_range = (LogModel.id > first_log_id, LogModel.id <= max_log_id)
+    hits = count_day_hits(session, UserModel, LogModel, matcher, *in_range)
+    untagged = (
+        session.query(LogModel.id)
+        .filter(*in_range, LogModel.host.is_(None))
+        .limit(1)
+        .first()
+        is not None
+    )
+
+    if state is None:
+        # The unique ``day`` makes a concurrent first count fail here.
+        session.add(
+            BlacklistHitDay(
+                day=day,
+                last_log_id=max_log_id,
+                untagged=int(untagged),
+                built_at=datetime.now(),
+            )
+        )
+        session.flush()
+    else:
+        # Claimed only if nobody counted the same rows meanwhile.
+        claimed = session.execute(
+            update(BlacklistHitDay)
+            .where(
+                BlacklistHitDay.id == state.id,
+                BlacklistHitDay.last_log_id == first_log_id,
+            )
+            .values(
+                last_log_id=max_log_id,
+                untagged=max(state.untagged, int(untagged)),
+                built_at=datetime.now(),
+            )
+        )
+        if claimed.rowcount != 1:
+            session.rollback()
+            return False
+
+    _add_hits(session, day, hits)
+    session.commit()
+    return True
+
+
+def refresh_blacklist_summary(
+    session, today: date | None = None, closed_days: bool = False
+) -> list[date]:
+    """Bring the summary up to date with the daily tables.
+
+    Days not counted yet are counted whole; today and yesterday (late lines)
+    get the rows added since their last refresh.  Older days are checked
+    for late rows only with ``closed_days`` (the nightly job).  Returns the
+    days that changed.
+    """
+    today = today or date.today()
+    days = {
+        datetime.strptime(suffix, "%Y%m%d").date(): suffix
+        for suffix in table_catalog.day_suffixes(session.get_bind(), complete=True)
+    }
+    states = {state.day: state for state in session.query(BlacklistHitDay)}
+    matcher = get_blacklist_matcher()
+    if not states:
+        # Nothing counted yet: the summary starts from the active blacklist.
+        _record_entries(session, matcher)
+        session.commit()
+
+    gone = [day for day in states if day not in days]
+    if gone:
+        _forget_days(session, gone)
+        session.commit()
+
+    recent = today - timedelta(days=1)
+    refreshed = []
+    for day, suffix in sorted(days.items()):
+        state = states.get(day)
+        if state is not None and day < recent and not closed_days:
+            continue
+        try:
+            UserModel, LogModel = get_dynamic_models(suffix)
+            if refresh_day(session, day, UserModel, LogModel, matcher, state):
+                refreshed.append(day)
+        except SQLAlchemyError:
+            session.rollback()
+            logger.exception(f"Error counting blacklisted requests of {day}")
+    return refreshed
+
+
+def counted_matcher(session) -> BlacklistMatcher:
+    """Matcher of the entries the summary was counted against."""
+    return BlacklistMatcher(
+        session.execute(
+            select(BlacklistSummaryEntry.entry).execution_options(yield_per=10000)
+        ).scalars()
+    )
+
+
+def _record_entries(session, matcher: BlacklistMatcher) -> None:
+    entries = matcher.entries()
+    stored = set(session.execute(select(BlacklistSummaryEntry.entry)).scalars())
+    removed = sorted(stored - entries)
+    for start in range(0, len(removed), DOMAIN_CHUNK):
+        session.execute(
+            delete(BlacklistSummaryEntry).where(
+                BlacklistSummaryEntry.entry.in_(removed[start : start + DOMAIN_CHUNK])
+            )
+        )
+    added = entries - stored
+    if added:
+        session.execute(
+            insert(BlacklistSummaryEntry), [{"entry": entry} for entry in added]
+        )
+
+
+def apply_blacklist_changes(
+    session, old: BlacklistMatcher, new: BlacklistMatcher
+) -> list[date]:
+    """Recount the days affected by going from ``old`` to ``new``.
+
+    A host is affected when it is, or is under, an added or removed entry;
+    the domains of those hosts are recounted on each day that has them.
+    Days counted from URLs, and every day when the keyword entries change,
+    are recounted whole.  Each day is committed on its own.  Returns the
+    days recounted.
+    """
+    keywords_changed = sorted(old.patterns) != sorted(new.patterns)
+    changed = old.domains ^ new.domains
+    if not changed and not keywords_changed:
+        return []
+    parents = {suffix for entry in changed for suffix in host_suffixes(entry)}
+
+    def affected(domain: str) -> bool:
+        return domain in parents or any(
+            suffix in changed for suffix in host_suffixes(domain)
+        )
+
+    days = set(table_catalog.day_suffixes(session.get_bind(), complete=True))
+    recounted = []
+    for state in session.query(BlacklistHitDay).order_by(BlacklistHitDay.day).all():
+        suffix = state.day.strftime("%Y%m%d")
+        if suffix not in days:
+            continue
+        UserModel, LogModel = get_dynamic_models(suffix)
+        if keywords_changed or state.untagged:
+            session.execute(delete(BlacklistHit).where(BlacklistHit.day == state.day))
+            hits = count_day_hits(
+                session, UserModel, LogModel, new, LogModel.id <= state.last_log_id
+            )
+            _add_hits(session, state.day, hits)
+            session.commit()
+            recounted.append(state.day)
+            continue
+
+        domains = [
+            domain
+            for (domain,) in session.query(LogModel.domain)
+            .filter(LogModel.domain.isnot(None))
+            .distinct()
+            if affected(domain)
+        ]
+        if not domains:
+            continue
+        for start in range(0, len(domains), DOMAIN_CHUNK):
+            chunk = domains[start : start + DOMAIN_CHUNK]
+            session.execute(
+                delete(BlacklistHit).where(
+                    BlacklistHit.day == state.day, BlacklistHit.domain.in_(chunk)
+                )
+            )
+            hits = count_day_hits(
+                session,
+                UserModel,
+                LogModel,
+                new,
+                LogModel.id <= state.last_log_id,
+                LogModel.domain.in_(chunk),
+            )
+            _add_hits(session, state.day, hits)
+        session.commit()
+        recounted.append(state.day)
+    return recounted
+
+
+def sync_blacklist_summary(session) -> list[date]:
+    """Bring the summary in line with the active blacklist.
+
+    Diffs the entries recorded in ``blacklist_summary_entries`` with the
+    active ones, recounts what changed and records the active entries.
+    Returns the days recounted.
+    """
+    new = get_blacklist_matcher()
+    recounted = []
+    if session.query(BlacklistHitDay.id).limit(1).first() is not None:
+        recounted = apply_blacklist_changes(session, counted_matcher(session), new)
+    _record_entries(session, new)
+    session.commit()
+    return recounted
@@ -2,180 +2,118 @@ import threading
 import time
 from datetime import datetime
 from typing import Any
-from urllib.parse import urlparse
 
 from flask_babel import gettext as _
 from loguru import logger
-from sqlalchemy import func, inspect, literal, select
+from sqlalchemy import func, select
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 
-from database.database import get_dynamic_models, get_engine
-from database.models.models import BlacklistDomain
+from database.database import get_dynamic_models, get_session
+from database.models.models import BlacklistDomain, BlacklistHit
+from database.table_catalog import table_catalog
+from services.analytics.blacklist_summary import (
+    blacklisted_rows,
+    refresh_blacklist_summary,
+    sync_blacklist_summary,
+)
+from services.security.blacklist_matcher import (
+    get_blacklist_matcher,
+    invalidate_blacklist_matcher,
+)
 
 # ---------------------------------------------------------------------------
-# Module-level TTL cache
-# Stores the fully aggregated result so paginated requests don't recompute.
+# The page is served from the blacklist_daily_hits summary (see
+# blacklist_summary); it is brought up to date at most once per interval.
+# Blacklist edits are applied to it by a background thread, during which the
+# page serves the summary as it is.
 # ---------------------------------------------------------------------------
-_CACHE_TTL = 300  # seconds (5 minutes)
-_cache_lock = threading.Lock()
-_cache_data: dict | None = None
-_cache_time: float = 0.0
+_REFRESH_INTERVAL = 60  # seconds
+_refresh_lock = threading.Lock()
+_refreshed_at: float | None = None
 
-
-def invalidate_blacklist_cache() -> None:
-    """Force the next request to recompute aggregations (call after blacklist edits)."""
-    global _cache_data, _cache_time
-    with _cache_lock:
-        _cache_data = None
-        _cache_time = 0.0
-
-
-_BLACKLIST_DOMAIN_THRESHOLD = 50  # if more than this, cap the subquery
-_BLACKLIST_DOMAIN_CAP = 25  # number of domains to use when capped
-
-
-def _blacklist_exists(LogModel, domain_ids: list[int] | None = None):
-    """
-    Return a correlated EXISTS subquery that is True when any active blacklist
-    domain appears as a substring in LogModel.url.
-
-    Runs entirely inside the database engine – avoids passing thousands of LIKE
-    parameters from Python and crashing with SQLAlchemy's parameter-limit error.
-
-    When *domain_ids* is provided, only those specific blacklist entries are
-    tested — this is the correct way to cap in SQLite, since LIMIT inside a
-    correlated EXISTS is silently ignored by SQLite.
-    """
-    q = (
-        select(BlacklistDomain.id)
-        .where(
-            BlacklistDomain.active == 1,
-            LogModel.url.like(
-                literal("%").op("||")(BlacklistDomain.domain).op("||")(literal("%"))
-            ),
-        )
-        .correlate(LogModel.__table__)
-    )
-    if domain_ids is not None:
-        q = q.where(BlacklistDomain.id.in_(domain_ids))
-    return q.exists()
+_sync_lock = threading.Lock()
+_sync_thread: threading.Thread | None = None
+_sync_requested = False
+# Whether this process has diffed the summary with the active blacklist.
+_synced = False
 
 
-def _get_parent_domain(url: str) -> str:
-    if not url:
-        return "unknown"
-
-    u = url.strip().lower()
-
-    if not (u.startswith("http://") or u.startswith("https://")):
-        u = f"http://{u}"
-
-    parsed = urlparse(u)
-    host = (parsed.netloc or parsed.path).split("/")[0].split(":")[0].strip()
-    if host.startswith("www."):
-        host = host[4:]
-
-    parts = [p for p in host.split(".") if p]
-    return ".".join(parts[-2:]) if len(parts) >= 2 else host or "unknown"
-
-
-def _compute_full_aggregation(
-    db: Session,
-) -> tuple[dict[str, dict[str, int]], int, bool]:
-    """
-    Scan all daily log tables and return (user_domain_counts, total_requiere mostrar URLs completas couests, domain_capped).
+def invalidate_blacklist_cache() -> None:
+    """Apply a blacklist edit to the summary in the background.
 
-    Key optimisations vs the naive approach:
-    - SQL GROUP BY (username, url) per table  →  far fewer rows transferred to Python.
-    - _get_parent_domain() is called only once per distinct (username, url) pair
-      instead of once per raw log row.
+    Only the domains added or removed since the summary was counted are
+    recounted (see ``sync_blacklist_summary``).
     """
-    engine = get_engine()
-    inspector = inspect(engine)
-    user_domain_counts: dict[str, dict[str, int]] = {}
-    total_requests: int = 0
-
-    all_tables = inspector.get_table_names()
-    log_tables = sorted(
-        [
-            t
-            for t in all_tables
-            if t.startswith("log_") and len(t) == 12 and t[4:].isdigit()
-        ],
-        reverse=True,
-    )
-
-    # Cap the EXISTS subquery when the blacklist is very large.
-    # NOTE: LIMIT inside a correlated EXISTS is silently ignored by SQLite,
-    # so we pre-fetch the capped IDs in Python and use id.in_() instead.
-    domain_count = (
-        db.query(func.count(BlacklistDomain.id))
-        .filter(BlacklistDomain.active == 1)
-        .scalar()
-        or 0
-    )
-    domain_capped = domain_count > _BLACKLIST_DOMAIN_THRESHOLD
-    if domain_capped:
-        domain_ids: list[int] | None = [
-            row[0]
-            for row in (
-                db.query(BlacklistDomain.id)
-                .filter(BlacklistDomain.active == 1)
-                .order_by(BlacklistDomain.id)
-                .limit(_BLACKLIST_DOMAIN_CAP)
-                .all()
-            )
-        ]
-        logger.debug(
-            f"Blacklist has {domain_count} entries — capping EXISTS subquery to {len(domain_ids)} domain IDs"
-        )
-    else:
-        domain_ids = None
-
-    for log_table in log_tables:  # noqa: E501 (loop continues below)
-        date_str = log_table[4:]  # "log_YYYYMMDD" → "YYYYMMDD"
-        try:
-            UserModel, LogModel = get_dynamic_models(date_str)
-        except Exception as exc:
-            logger.warning(f"Skipping {log_table}: {exc}")
-            continue
-
-        blacklist_exists = _blacklist_exists(LogModel, domain_ids=domain_ids)
-
-        # Aggregate at the DB level: one row per distinct (username, url) pair.
-        rows = (
-            db.query(
-                UserModel.username,
-                LogModel.url,
-                func.sum(LogModel.request_count).label("total"),
+    global _refreshed_at
+    invalidate_blacklist_matcher()
+    _refreshed_at = None
+    _start_sync()
+
+
+def wait_for_blacklist_sync(timeout: float | None = None) -> None:
+    """Wait until the pending blacklist edits are applied to the summary."""
+    thread = _sync_thread
+    if thread is not None:
+        thread.join(timeout)
+
+
+def _start_sync() -> None:
+    global _sync_thread, _sync_requested
+    with _sync_lock:
+        _sync_requested = True
+        if _sync_thread is None:
+            _sync_thread = threading.Thread(
+                target=_sync_loop, daemon=True, name="blacklist-summary-sync"
             )
-            .join(UserModel, LogModel.user_id == UserModel.id)
-            .filter(blacklist_exists)
-            .group_by(UserModel.username, LogModel.url)
-            .all()
-        )
-
-        for username, url, total in rows:
-            domain = _get_parent_domain(url)
-            count = int(total or 1)
-            ud = user_domain_counts.setdefault(username, {})
-            ud[domain] = ud.get(domain, 0) + count
-            total_requests += count
-
-    return user_domain_counts, total_requests, domain_capped
+            _sync_thread.start()
+
+
+def _sync_loop() -> None:
+    global _sync_thread, _sync_requested, _synced
+    while True:
+        with _sync_lock:
+            if not _sync_requested:
+                _sync_thread = None
+                return
+            _sync_requested = False
+
+        with _refresh_lock:
+            session = get_session()
+            try:
+                sync_blacklist_summary(session)
+                _synced = True
+            except SQLAlchemyError:
+                session.rollback()
+                logger.exception("Error recounting the blacklist summary")
+            finally:
+                session.close()
+
+
+def _refresh_summary(db: Session) -> None:
+    global _refreshed_at
+    if not _refresh_lock.acquire(blocking=False):
+        # A blacklist edit is being applied: serve the summary as it is.
+        return
+    try:
+        if not _synced:
+            # Edits made before a restart may not have been applied yet.
+            _start_sync()
+        now = time.monotonic()
+        if _refreshed_at is not None and now - _refreshed_at < _REFRESH_INTERVAL:
+            return
+        refresh_blacklist_summary(db)
+        _refreshed_at = time.monotonic()
+    finally:
+        _refresh_lock.release()
 
 
 def find_blacklisted_sites(
     db: Session, page: int = 1, per_page: int = 10
 ) -> dict[str, Any]:
-    global _cache_data, _cache_time
-
     # Early-exit: no active blacklist entries at all.
     _EMPTY_RESULT = {
         "results": [],
-        "domain_capped": False,
-        "domain_cap": _BLACKLIST_DOMAIN_CAP,
         "pagination": {
             "total": 0,
             "total_requests": 0,
@@ -201,59 +139,58 @@ def find_blacklisted_sites(
     if not has_active:
         return _EMPTY_RESULT
 
-    # --- Cache read ---
-    now = time.monotonic()
-    with _cache_lock:
-        if _cache_data is not None and (now - _cache_time) < _CACHE_TTL:
-            sorted_users = _cache_data["sorted_users"]
-            total_requests = _cache_data["total_requests"]
-            domain_capped = _cache_data["domain_capped"]
-        else:
-            sorted_users = None
-
-    # --- Cache miss: (re)compute ---
-    if sorted_users is None:
-        try:
-            user_domain_counts, total_requests, domain_capped = (
-                _compute_full_aggregation(db)
+    try:
+        _refresh_summary(db)
+
+        # Users ranked by their blacklisted requests, paginated in SQL.
+        per_user = (
+            select(
+                BlacklistHit.username,
+                func.sum(BlacklistHit.requests).label("total"),
             )
-        except SQLAlchemyError:
-            logger.exception("Database error while searching blacklisted sites")
-            return {"error": _("Error interno del servidor")}
-
-        sorted_users = sorted(
-            user_domain_counts.items(),
-            key=lambda x: sum(x[1].values()),
-            reverse=True,
+            .group_by(BlacklistHit.username)
+            .subquery()
         )
-
-        with _cache_lock:
-            _cache_data = {
-                "sorted_users": sorted_users,
-                "total_requests": total_requests,
-                "domain_capped": domain_capped,
-            }
-            _cache_time = time.monotonic()
-
-    # --- Paginate in-memory (O(per_page)) ---
-    total_users = len(sorted_users)
-    start = (page - 1) * per_page
-    paginated_users = sorted_users[start : start + per_page]
+        total_users, total_requests = db.execute(
+            select(func.count(), func.coalesce(func.sum(per_user.c.total), 0))
+        ).one()
+        page_users = (
+            db.execute(
+                select(per_user.c.username)
+                .order_by(per_user.c.total.desc(), per_user.c.username)
+                .limit(per_page)
+                .offset((page - 1) * per_page)
+            )
+            .scalars()
+            .all()
+        )
+        domain_counts = {username: [] for username in page_users}
+        if page_users:
+            for username, domain, count in db.execute(
+                select(
+                    BlacklistHit.username,
+                    BlacklistHit.domain,
+                    func.sum(BlacklistHit.requests).label("count"),
+                )
+                .where(BlacklistHit.username.in_(page_users))
+                .group_by(BlacklistHit.username, BlacklistHit.domain)
+            ):
+                domain_counts[username].append((domain, int(count)))
+    except SQLAlchemyError:
+        db.rollback()
+        logger.exception("Database error while searching blacklisted sites")
+        return {"error": _("Error interno del servidor")}
 
     results = []
-    for username, domain_counts in paginated_users:
-        for domain, count in sorted(
-            domain_counts.items(), key=lambda x: x[1], reverse=True
-        ):
+    for username, counts in domain_counts.items():
+        for domain, count in sorted(counts, key=lambda x: x[1], reverse=True):
             results.append({"usuario": username, "domain": domain, "count": count})
 
     return {
         "results": results,
-        "domain_capped": domain_capped,
-        "domain_cap": _BLACKLIST_DOMAIN_CAP,
         "pagination": {
             "total": total_users,
-            "total_requests": total_requests,
+            "total_requests": int(total_requests),
             "page": page,
             "per_page": per_page,
             "total_pages": (total_users + per_page - 1) // per_page,
@@ -269,8 +206,10 @@ def find_blacklisted_sites_by_date(db: Session, specific_date: datetime.date):
         user_table = f"user_{date_suffix}"
         log_table = f"log_{date_suffix}"
 
-        inspector = inspect(db.get_bind())
-        if not inspector.has_table(user_table) or not inspector.has_table(log_table):
+        engine = db.get_bind()
+        if not table_catalog.has_table(engine, user_table) or not (
+            table_catalog.has_table(engine, log_table)
+        ):
             return []
 
         try:
@@ -278,19 +217,15 @@ def find_blacklisted_sites_by_date(db: Session, specific_date: datetime.date):
         except Exception:
             return []
 
-        blacklist_exists = _blacklist_exists(LogModel)
-
-        query_results = (
-            db.query(UserModel.username, LogModel.url)
-            .join(UserModel, LogModel.user_id == UserModel.id)
-            .filter(blacklist_exists)
-            .all()
+        query = select(UserModel.username, LogModel.url.label("key")).join_from(
+            LogModel, UserModel, LogModel.user_id == UserModel.id
         )
 
         formatted_date = specific_date.strftime("%Y-%m-%d")
-        for row in query_results:
+        matcher = get_blacklist_matcher()
+        for row in blacklisted_rows(db, query, matcher.match_url):
             results.append(
-                {"fecha": formatted_date, "usuario": row.username, "url": row.url}
+                {"fecha": formatted_date, "usuario": row.username, "url": row.key}
             )
 
     except SQLAlchemyError as e:
@@ -0,0 +1,140 @@
+"""Per-day report work fanned out over a bounded pool of DB connections.
+
+Range reports that cannot be answered by one statement (``range_query``)
+aggregate each day on its own.  ``run_days`` runs those per-day partial
+aggregations on a small thread pool, each worker with its own session and
+therefore its own pooled connection, and folds the partials together with
+an associative reducer as they complete::
+
+    totals = run_days(db, suffixes, count_day, add_counts, Counter())
+
+The whole fan-out is bounded by a deadline and can be cancelled through a
+``threading.Event``: days not yet started are dropped, days already running
+finish and hand their connection back to the pool.  WSGI gives no signal
+when a client disconnects, so for HTTP requests the deadline is what stops
+an abandoned report.
+"""
+
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from loguru import logger
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+from config import Config
+
+# How often (seconds) the caller re-checks the deadline and cancel event.
+POLL_SECONDS = 0.25
+
+
+class DayQueryCancelled(Exception):
+    """A per-day report was stopped by its deadline or a cancel request."""
+
+
+def add_counts(total, partial):
+    """Reducer for ``Counter`` partials (keeps zero and negative totals)."""
+    total.update(partial)
+    return total
+
+
+def _is_memory_sqlite(engine) -> bool:
+    # Every connection to an in-memory SQLite database sees its own database.
+    return engine.url.get_backend_name() == "sqlite" and engine.url.database in (
+        None,
+        "",
+        ":memory:",
+    )
+
+
+def day_workers(engine, days: int) -> int:
+    """Workers for ``days`` days: configured, one per day at most, pool-bound."""
+    if _is_memory_sqlite(engine):
+        return 1
+    workers = min(Config.REPORT_DAY_WORKERS, days)
+    if isinstance(engine.pool, QueuePool):
+        # Leave the overflow connections to the rest of the application.
+        workers = min(workers, engine.pool.size())
+    return max(workers, 1)
+
+
+def _run_day(session, work, suffix):
+    try:
+        return work(session, suffix)
+    except Exception:
+        session.rollback()
+        logger.exception(f"Error processing date {suffix}")
+        return None
+
+
+def run_days(
+    db,
+    suffixes: list[str],
+    work,
+    reduce,
+    initial,
+    timeout: float | None = None,
+    cancel: threading.Event | None = None,
+):
+    """Fold ``work(session, suffix)`` over ``suffixes`` with ``reduce``.
+
+    ``reduce(total, partial)`` must be associative: partials are merged in
+    completion order.  A day whose work raises is logged and skipped.
+    ``timeout`` defaults to ``Config.REPORT_DAY_TIMEOUT`` (0 = no limit).
+
+    Raises DayQueryCancelled when the deadline passes or ``cancel`` is set.
+    """
+    timeout = Config.REPORT_DAY_TIMEOUT if timeout is None else timeout
+    deadline = time.monotonic() + timeout if timeout else None
+    cancel = cancel or threading.Event()
+
+    def check():
+        if deadline is not None and time.monotonic() >= deadline:
+            cancel.set()
+        if cancel.is_set():
+            raise DayQueryCancelled(
+                f"Per-day report cancelled after {len(suffixes)} day(s) were queued"
+            )
+
+    engine = db.get_bind()
+    workers = day_workers(engine, len(suffixes))
+    total = initial
+
+    if workers <= 1:
+        for suffix in suffixes:
+            check()
+            partial = _run_day(db, work, suffix)
+            if partial is not None:
+                total = reduce(total, partial)
+        return total
+
+    Session = sessionmaker(bind=engine)
+    stop = threading.Event()
+
+    def run(suffix):
+        if stop.is_set() or cancel.is_set():
+            return None
+        session = Session()
+        try:
+            return _run_day(session, work, suffix)
+        finally:
+            session.close()
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report-day")
+    try:
+        pending = {executor.submit(run, suffix) for suffix in suffixes}
+        while pending:
+            check()
+            wait_for = POLL_SECONDS
+            if deadline is not None:
+                wait_for = max(min(wait_for, deadline - time.monotonic()), 0)
+            done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                partial = future.result()
+                if partial is not None:
+                    total = reduce(total, partial)
+    finally:
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+    return total
@@ -3,11 +3,17 @@ from datetime import date, datetime
 from typing import Any
 
 from loguru import logger
-from sqlalchemy import func, inspect
-from sqlalchemy.ext.automap import automap_base
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
-from database.database import get_concat_function, get_dynamic_models, get_session
+from database.database import (
+    get_concat_function,
+    get_dynamic_models,
+    get_dynamic_table_names,
+    get_session,
+)
+from database.table_catalog import table_catalog
+from services.analytics.rollups import load_daily_rollup
 
 # Patrones de validación para nombres de tabla y fechas
 TABLE_NAME_PATTERN = re.compile(r"^[a-z_]{3,20}$")
@@ -36,20 +42,17 @@ def get_dynamic_model(db: Session, table_name: str, date_suffix: str):
         logger.error(f"Invalid date suffix: {date_suffix}")
         return None
 
-    full_table_name = f"{table_name}_{date_suffix}"
-
-    # Check if the table exists
+    # Check that the day's tables exist (get_dynamic_models would create them)
     try:
-        inspector = inspect(db.get_bind())
-        if not inspector.has_table(full_table_name):
-            logger.warning(f"Table {full_table_name} not found")
-            return None
-
-        # Create dynamic model using automap
-        Base = automap_base()
-        Base.prepare(autoload_with=db.get_bind())
-
-        return getattr(Base.classes, full_table_name, None)
+        engine = db.get_bind()
+        for day_table in get_dynamic_table_names(date_suffix):
+            if not table_catalog.has_table(engine, day_table):
+                logger.warning(f"Table {day_table} not found")
+                return None
+
+        # Only this day's classes, mapped once and kept in the model registry
+        UserModel, LogModel = get_dynamic_models(date_suffix)
+        return {"user": UserModel, "log": LogModel}.get(table_name)
     except Exception as e:
         logger.error(f"Error getting dynamic model: {str(e)}", exc_info=True)
         return None
@@ -171,6 +174,56 @@ def get_users_with_logs_by_date(db: Session, date_suffix: str) -> list[dict[str,
     return get_users_logs(db, date_suffix)
 
 
+def _response_chart(http_codes) -> dict[str, list]:
+    code_labels = [str(code) for code, _ in http_codes]
+    code_data = [count for _, count in http_codes]
+    code_colors = [
+        "#3B82F6"
+        if 200 <= int(code) < 300
+        else "#F59E0B"
+        if 300 <= int(code) < 400
+        else "#EF4444"
+        if 400 <= int(code) < 500
+        else "#8B5CF6"
+        if 500 <= int(code) < 600
+        else "#10B981"
+        for code in code_labels
+    ]
+    return {"labels": code_labels, "data": code_data, "colors": code_colors}
+
+
+def _metrics_for_date_from_rollup(rollup: dict) -> dict[str, Any]:
+    return {
+        "total_stats": rollup["totals"],
+        "top_users_by_activity": [
+            {"username": username, "total_visits": total}
+            for username, total in rollup["top_users_by_requests"]
+        ],
+        "top_users_by_data_transferred": [
+            {"username": username, "total_data_bytes": total}
+            for username, total in rollup["top_users_by_data"]
+        ],
+        "http_response_distribution_chart": _response_chart(
+            sorted(rollup["responses"])
+        ),
+        "top_pages": [
+            {
+                "url": url,
+                "total_requests": total_requests,
+                "unique_visits": unique_visits,
+                "total_data_bytes": total_data,
+            }
+            for url, total_requests, unique_visits, total_data in rollup[
+                "top_urls_by_requests"
+            ]
+        ],
+        "users_per_ip": [
+            {"ip": ip, "user_count": user_count, "usernames": usernames}
+            for ip, user_count, usernames in rollup["shared_ips"]
+        ],
+    }
+
+
 def get_metrics_for_date(selected_date: date):
     session = get_session()
     date_suffix = selected_date.strftime("%Y%m%d")
@@ -196,6 +249,11 @@ def get_metrics_for_date(selected_date: date):
             "users_per_ip": [],
         }
 
+    # Días cerrados: servir desde las tablas resumen nocturnas
+    rollup = load_daily_rollup(session, User, Log)
+    if rollup is not None:
+        return _metrics_for_date_from_rollup(rollup)
+
     # Total stats
     total_users = session.query(func.count(User.id)).scalar() or 0
     total_log_entries = session.query(func.count(Log.id)).scalar() or 0
@@ -238,22 +296,11 @@ def get_metrics_for_date(selected_date: date):
 
     # HTTP response distribution
     http_codes = (
-        session.query(Log.response, func.count(Log.id)).group_by(Log.response).all()
+        session.query(Log.response, func.sum(Log.request_count))
+        .group_by(Log.response)
+        .all()
     )
-    code_labels = [str(code) for code, _ in http_codes]
-    code_data = [count for _, count in http_codes]
-    code_colors = [
-        "#3B82F6"
-        if 200 <= int(code) < 300
-        else "#F59E0B"
-        if 300 <= int(code) < 400
-        else "#EF4444"
-        if 400 <= int(code) < 500
-        else "#8B5CF6"
-        if 500 <= int(code) < 600
-        else "#10B981"
-        for code in code_labels
-    ]
+    http_response_distribution_chart = _response_chart(http_codes)
 
     # Top 20 pages
     top_pages = (
@@ -303,11 +350,7 @@ def get_metrics_for_date(selected_date: date):
         },
         "top_users_by_activity": top_users_by_activity,
         "top_users_by_data_transferred": top_users_by_data_transferred,
-        "http_response_distribution_chart": {
-            "labels": code_labels,
-            "data": code_data,
-            "colors": code_colors,
-        },
+        "http_response_distribution_chart": http_response_distribution_chart,
         "top_pages": top_pages,
         "users_per_ip": users_per_ip,
     }
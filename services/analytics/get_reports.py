@@ -1,58 +1,133 @@
 import datetime
+import time
 from collections import Counter
-from datetime import timedelta
-from urllib.parse import urlparse
 
 from loguru import logger
-from sqlalchemy import Column, Integer, String, desc, func, inspect
+from sqlalchemy import Column, Integer, String, desc, func, select
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session, relationship
 
-from database.database import get_concat_function, get_dynamic_models
+from config import Config
+from database.database import get_concat_function
+from database.table_catalog import table_catalog
+from services.analytics.day_executor import DayQueryCancelled, run_days
+from services.analytics.range_query import daily_tables, days_in_range, select_days
+from services.analytics.rollups import load_daily_rollup
+from utils.url_parsing import host_info, url_host
+
+TOTAL_STATS = (
+    "total_users",
+    "total_log_entries",
+    "total_data_transmitted",
+    "total_requests",
+)
 
 
 def _extract_country_from_url(url: str) -> str:
-    try:
-        parsed = urlparse(url)
-        hostname = parsed.hostname
-        if not hostname and url and "://" not in url:
-            hostname = urlparse("http://" + url).hostname
-        hostname = hostname or ""
-        labels = hostname.lower().split(".")
-        if len(labels) < 2:
-            return "Otros"
-
-        if labels[-1] == "uk" and labels[-2] in {
-            "co",
-            "me",
-            "org",
-            "net",
-            "sch",
-            "gov",
-            "ac",
-            "ltd",
-            "plc",
-            "police",
-            "mod",
-        }:
-            return "UK"
-
-        tld = labels[-1]
-        if len(tld) == 2:
-            return tld.upper()
-
-        return "Global"
-    except Exception:
+    return _country_from_hostname(url_host(url))
+
+
+def _country_from_hostname(hostname: str) -> str:
+    return _country_from_tld(host_info(hostname).tld)
+
+
+def _country_from_tld(tld: str | None) -> str:
+    """Country estimated from a TLD ("Global" for generic TLDs)."""
+    if not tld:
         return "Otros"
+    return tld.upper() if len(tld) == 2 else "Global"
+
+
+def _country_counts(db: Session, LogModel) -> Counter:
+    """Requests per country of a day, from its per-TLD totals.
+
+    Rows tagged at ingestion are summed by their ``tld`` column in the
+    database, so only one row per TLD is read.  Rows imported before it
+    existed are bucketed by URL, streamed instead of loaded at once.
+    """
+    country_counts = Counter()
+    by_tld = (
+        db.query(LogModel.tld, func.sum(LogModel.request_count))
+        .filter(LogModel.tld.isnot(None))
+        .group_by(LogModel.tld)
+    )
+    for tld, total_requests in by_tld:
+        country_counts[_country_from_tld(tld)] += total_requests or 0
+
+    untagged = (
+        db.query(LogModel.url, func.sum(LogModel.request_count))
+        .filter(LogModel.tld.is_(None))
+        .group_by(LogModel.url)
+        .yield_per(5000)
+    )
+    for url, total_requests in untagged:
+        country_counts[_extract_country_from_url(url)] += total_requests or 0
+    return country_counts
+
+
+def _metrics_from_rollup(rollup: dict) -> dict:
+    country_counts = Counter()
+    for tld, total_requests in rollup["tlds"]:
+        country_counts[_country_from_tld(tld)] += total_requests or 0
+    for domain, total_requests in rollup["domains"]:
+        country_counts[_country_from_hostname(domain)] += total_requests or 0
+
+    return {
+        "top_users_by_activity": [
+            {"username": username, "total_visits": total}
+            for username, total in rollup["top_users_by_requests"]
+        ],
+        "top_users_by_data_transferred": [
+            {"username": username, "total_data_bytes": total}
+            for username, total in rollup["top_users_by_data"]
+        ],
+        "top_pages": [
+            {
+                "url": url,
+                "total_requests": total_requests,
+                "unique_visits": unique_visits,
+                "total_data_bytes": total_data,
+            }
+            for url, total_requests, unique_visits, total_data in rollup[
+                "top_urls_by_requests"
+            ]
+        ],
+        "top_pages_by_data": [
+            {"url": url, "total_data_bytes": total_data}
+            for url, total_data in rollup["top_urls_by_data"]
+        ],
+        "top_countries_by_visits": [
+            {"country": country, "total_requests": count}
+            for country, count in country_counts.most_common(10)
+        ],
+        "http_response_distribution": [
+            {"response_code": code, "count": count}
+            for code, count in rollup["responses"]
+        ],
+        "users_per_ip": [
+            {"ip": ip, "user_count": user_count, "usernames": usernames}
+            for ip, user_count, usernames in rollup["shared_ips"]
+        ],
+        "total_stats": rollup["totals"],
+    }
 
 
 def get_important_metrics(db: Session, UserModel, LogModel):
     results = {}
 
     try:
+        # Días cerrados: servir desde las tablas resumen nocturnas
+        rollup = load_daily_rollup(db, UserModel, LogModel)
+        if rollup is not None:
+            return _metrics_from_rollup(rollup)
+
         # 1. Usuarios más activos (por número de visitas)
         # Formato corregido: Paréntesis para continuar la consulta
         top_users_by_activity = (
-            db.query(UserModel.username, func.count(LogModel.id).label("total_visits"))
+            db.query(
+                UserModel.username,
+                func.sum(LogModel.request_count).label("total_visits"),
+            )
             .join(LogModel, UserModel.id == LogModel.user_id)  # JOIN explícito
             .group_by(UserModel.username)
             .order_by(desc("total_visits"))
@@ -88,7 +163,7 @@ def get_important_metrics(db: Session, UserModel, LogModel):
             db.query(
                 LogModel.url,
                 func.sum(LogModel.request_count).label("total_requests"),
-                func.count(LogModel.id).label("unique_visits"),
+                func.count(func.distinct(LogModel.user_id)).label("unique_visits"),
                 func.sum(LogModel.data_transmitted).label("total_data"),
             )
             .group_by(LogModel.url)
@@ -123,19 +198,7 @@ def get_important_metrics(db: Session, UserModel, LogModel):
         ]
 
         # 5. Países más visitados (estimado por TLD del dominio)
-        country_counts = Counter()
-        urls_by_requests = (
-            db.query(
-                LogModel.url, func.sum(LogModel.request_count).label("total_requests")
-            )
-            .group_by(LogModel.url)
-            .order_by(desc("total_requests"))
-            .all()
-        )
-        for url, total_requests in urls_by_requests:
-            country = _extract_country_from_url(url)
-            country_counts[country] += total_requests or 0
-
+        country_counts = _country_counts(db, LogModel)
         results["top_countries_by_visits"] = [
             {"country": country, "total_requests": count}
             for country, count in country_counts.most_common(10)
@@ -143,7 +206,7 @@ def get_important_metrics(db: Session, UserModel, LogModel):
 
         # 6. Distribución de códigos HTTP
         response_distribution = (
-            db.query(LogModel.response, func.count(LogModel.id).label("count"))
+            db.query(LogModel.response, func.sum(LogModel.request_count).label("count"))
             .group_by(LogModel.response)
             .order_by(desc("count"))
             .all()
@@ -195,84 +258,275 @@ def get_important_metrics(db: Session, UserModel, LogModel):
         return {}
 
 
-def get_metrics_by_date_range(start_date: str, end_date: str, db: Session):
+def _user_totals(user, log, suffix):
+    return (
+        select(
+            user.c.username,
+            func.sum(log.c.request_count).label("requests"),
+            func.sum(log.c.data_transmitted).label("data"),
+        )
+        .join_from(log, user, log.c.user_id == user.c.id)
+        .group_by(user.c.username)
+    )
+
+
+def _page_visitors(user, log, suffix):
+    # User ids are per day: visitors are told apart across days by username.
+    return (
+        select(
+            log.c.url,
+            user.c.username,
+            func.sum(log.c.request_count).label("requests"),
+            func.sum(log.c.data_transmitted).label("data"),
+        )
+        .join_from(log, user, log.c.user_id == user.c.id, isouter=True)
+        .group_by(log.c.url, user.c.username)
+    )
+
+
+def _tld_totals(user, log, suffix):
+    return (
+        select(log.c.tld, func.sum(log.c.request_count).label("requests"))
+        .where(log.c.tld.isnot(None))
+        .group_by(log.c.tld)
+    )
+
+
+def _untagged_url_totals(user, log, suffix):
+    return (
+        select(log.c.url, func.sum(log.c.request_count).label("requests"))
+        .where(log.c.tld.is_(None))
+        .group_by(log.c.url)
+    )
+
+
+def _response_totals(user, log, suffix):
+    return select(
+        log.c.response, func.sum(log.c.request_count).label("requests")
+    ).group_by(log.c.response)
+
+
+def _ip_users(user, log, suffix):
+    return select(user.c.ip, user.c.username).distinct()
+
+
+def _log_totals(user, log, suffix):
+    return select(
+        func.count(log.c.id).label("entries"),
+        func.sum(log.c.request_count).label("requests"),
+        func.sum(log.c.data_transmitted).label("data"),
+    )
+
+
+RANGE_SECTIONS = (
+    _user_totals,
+    _page_visitors,
+    _tld_totals,
+    _untagged_url_totals,
+    _response_totals,
+    _ip_users,
+    _log_totals,
+)
+
+
+def _range_metrics(db: Session, suffixes: list[str], limit: int, check) -> dict:
+    """The range report, one ``UNION ALL`` statement per section.
+
+    Every day contributes its complete groups and the rankings are cut to
+    ``limit`` only over the merged totals.
+    """
+    users = select_days(suffixes, _user_totals)
+    pages = select_days(suffixes, _page_visitors)
+
+    def top_users(measure):
+        check()
+        total = func.sum(users.c[measure]).label("total")
+        return db.execute(
+            select(users.c.username, total)
+            .group_by(users.c.username)
+            .order_by(total.desc())
+            .limit(limit)
+        ).all()
+
+    check()
+    page_requests = func.sum(pages.c.requests).label("total_requests")
+    top_pages = db.execute(
+        select(
+            pages.c.url,
+            page_requests,
+            func.count(func.distinct(pages.c.username)).label("unique_visits"),
+            func.sum(pages.c.data).label("total_data_bytes"),
+        )
+        .group_by(pages.c.url)
+        .order_by(page_requests.desc())
+        .limit(limit)
+    ).all()
+    check()
+    page_data = func.sum(pages.c.data).label("total_data_bytes")
+    top_pages_by_data = db.execute(
+        select(pages.c.url, page_data)
+        .group_by(pages.c.url)
+        .order_by(page_data.desc())
+        .limit(limit)
+    ).all()
+
+    check()
+    country_counts = Counter()
+    tlds = select_days(suffixes, _tld_totals)
+    for tld, total_requests in db.execute(
+        select(tlds.c.tld, func.sum(tlds.c.requests)).group_by(tlds.c.tld)
+    ):
+        country_counts[_country_from_tld(tld)] += total_requests or 0
+    check()
+    untagged = select_days(suffixes, _untagged_url_totals)
+    for url, total_requests in db.execute(
+        select(untagged.c.url, func.sum(untagged.c.requests))
+        .group_by(untagged.c.url)
+        .execution_options(yield_per=5000)
+    ):
+        country_counts[_extract_country_from_url(url)] += total_requests or 0
+
+    check()
+    responses = select_days(suffixes, _response_totals)
+    response_count = func.sum(responses.c.requests).label("count")
+    response_distribution = db.execute(
+        select(responses.c.response, response_count)
+        .group_by(responses.c.response)
+        .order_by(response_count.desc())
+    ).all()
+
+    check()
+    ip_users = select_days(suffixes, _ip_users)
+    users_by_ip = {}
+    for ip, username in db.execute(
+        select(ip_users.c.ip, ip_users.c.username).distinct()
+    ):
+        users_by_ip.setdefault(ip, set()).add(username)
+    shared_ips = sorted(
+        (
+            (ip, sorted(usernames))
+            for ip, usernames in users_by_ip.items()
+            if len(usernames) > 1
+        ),
+        key=lambda item: len(item[1]),
+        reverse=True,
+    )
+
+    check()
+    logs = select_days(suffixes, _log_totals)
+    entries, requests, data = db.execute(
+        select(
+            func.sum(logs.c.entries), func.sum(logs.c.requests), func.sum(logs.c.data)
+        )
+    ).one()
+
+    return {
+        "top_users_by_activity": [
+            {"username": username, "total_visits": total}
+            for username, total in top_users("requests")
+        ],
+        "top_users_by_data_transferred": [
+            {"username": username, "total_data_bytes": total}
+            for username, total in top_users("data")
+        ],
+        "top_pages": [dict(page._mapping) for page in top_pages],
+        "top_pages_by_data": [dict(page._mapping) for page in top_pages_by_data],
+        "top_countries_by_visits": [
+            {"country": country, "total_requests": total}
+            for country, total in country_counts.most_common(10)
+        ],
+        "http_response_distribution": [
+            {"response_code": code, "count": count}
+            for code, count in response_distribution
+        ],
+        "users_per_ip": [
+            {"ip": ip, "user_count": len(usernames), "usernames": ",".join(usernames)}
+            for ip, usernames in shared_ips
+        ],
+        "total_stats": {
+            # A user is a (username, IP) pair, as in the daily report.
+            "total_users": sum(len(usernames) for usernames in users_by_ip.values()),
+            "total_log_entries": entries or 0,
+            "total_data_transmitted": data or 0,
+            "total_requests": requests or 0,
+        },
+    }
+
+
+def _queryable_days(db: Session, suffixes: list[str], cancel=None) -> list[str]:
+    """The days whose tables answer every section of the range report."""
+
+    def probe(session, suffix):
+        for build in RANGE_SECTIONS:
+            session.execute(build(*daily_tables(suffix), suffix).limit(0))
+        return [suffix]
+
+    def extend(total, partial):
+        total.extend(partial)
+        return total
+
+    return sorted(run_days(db, suffixes, probe, extend, [], cancel=cancel))
+
+
+def get_metrics_by_date_range(
+    start_date: str, end_date: str, db: Session, limit: int = 20, cancel=None
+):
+    """``get_important_metrics`` over every day from start to end.
+
+    Each section is one ``UNION ALL`` statement over the days' complete
+    groups (see ``range_query``), so rankings are exact and ``unique_visits``
+    counts distinct users over the whole range.  When a day's schema breaks
+    the union, the days are checked one by one and the broken ones skipped.
+    Raises DayQueryCancelled past ``REPORT_DAY_TIMEOUT`` or once ``cancel``
+    is set, checked between statements.
+    """
     try:
         # Convert string to datetime objects
-        start_dt = datetime.strptime(start_date, "%Y%m%d")
-        end_dt = datetime.strptime(end_date, "%Y%m%d")
+        start_dt = datetime.datetime.strptime(start_date, "%Y%m%d")
+        end_dt = datetime.datetime.strptime(end_date, "%Y%m%d")
     except ValueError:
         raise ValueError("Dates must be in YYYYMMDD format")
 
     if end_dt < start_dt:
         raise ValueError("End date cannot be earlier than start date")
 
-    # Preparar contenedores para resultados consolidados
-    consolidated_results = {
-        "top_users_by_activity": {},
-        "top_users_by_data_transferred": {},
-        "top_pages": {},
-        "top_pages_by_data": {},
-        "http_response_distribution": {},
-        "users_per_ip": {},
-        "total_stats": {
-            "total_users": 0,
-            "total_log_entries": 0,
-            "total_data_transmitted": 0,
-            "total_requests": 0,
-        },
-    }
+    suffixes = days_in_range(db, start_dt.date(), end_dt.date())
+    timeout = Config.REPORT_DAY_TIMEOUT
+    deadline = time.monotonic() + timeout if timeout else None
+
+    def check():
+        if deadline is not None and time.monotonic() >= deadline:
+            raise DayQueryCancelled(f"Range report timed out after {timeout}s")
+        if cancel is not None and cancel.is_set():
+            raise DayQueryCancelled("Range report cancelled")
 
-    # Iterar por cada día en el rango
-    current_dt = start_dt
-    while current_dt <= end_dt:
-        date_suffix = current_dt.strftime("%Y%m%d")
+    if suffixes:
         try:
-            # Obtener modelos dinámicos para esta fecha
-            UserModel, LogModel = get_dynamic_models(date_suffix)
-
-            # Verificar existencia de tablas
-            if not has_table(db, UserModel.__tablename__) or not has_table(
-                db, LogModel.__tablename__
-            ):
-                print(f"Tables not found for {date_suffix}, skipping...")
-                current_dt += timedelta(days=1)
-                continue
-
-            # Obtener métricas para esta fecha
-            daily_metrics = get_important_metrics(db, UserModel, LogModel)
-
-            # Consolidar estadísticas totales
-            if "total_stats" in daily_metrics:
-                stats = daily_metrics["total_stats"]
-                consolidated_results["total_stats"]["total_users"] += stats.get(
-                    "total_users", 0
-                )
-                consolidated_results["total_stats"]["total_log_entries"] += stats.get(
-                    "total_log_entries", 0
-                )
-                consolidated_results["total_stats"]["total_data_transmitted"] += (
-                    stats.get("total_data_transmitted", 0)
-                )
-                consolidated_results["total_stats"]["total_requests"] += stats.get(
-                    "total_requests", 0
-                )
-
-            # Lógica de consolidación para otras métricas iría aquí
-            # ...
-
-            current_dt += timedelta(days=1)
-        except Exception:
-            logger.exception(f"Error processing date {date_suffix}")
-            current_dt += timedelta(days=1)
-
-    return consolidated_results
+            return _range_metrics(db, suffixes, limit, check)
+        except SQLAlchemyError:
+            db.rollback()
+            logger.warning(
+                f"Range query over {len(suffixes)} day(s) failed; checking each day"
+            )
+        suffixes = _queryable_days(db, suffixes, cancel)
+    if not suffixes:
+        return {
+            "top_users_by_activity": [],
+            "top_users_by_data_transferred": [],
+            "top_pages": [],
+            "top_pages_by_data": [],
+            "top_countries_by_visits": [],
+            "http_response_distribution": [],
+            "users_per_ip": [],
+            "total_stats": dict.fromkeys(TOTAL_STATS, 0),
+        }
+    return _range_metrics(db, suffixes, limit, check)
 
 
 def has_table(db: Session, table_name: str) -> bool:
     try:
-        # Usar el inspector para verificar existencia de tabla
-        inspector = inspect(db.get_bind())
-        return inspector.has_table(table_name)
+        # Catálogo de tablas en caché en lugar de inspeccionar la base cada vez
+        return table_catalog.has_table(db.get_bind(), table_name)
     except Exception:
         logger.exception(f"Error checking table {table_name}")
         return False
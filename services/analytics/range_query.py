@@ -0,0 +1,160 @@
+"""Single-statement queries over a range of daily user/log tables.
+
+Each day lives in its own ``user_YYYYMMDD`` / ``log_YYYYMMDD`` pair, so a
+90-day audit used to run one query per day and merge the results in Python.
+``select_days`` instead combines one SELECT per day into a ``UNION ALL``
+subquery; callers aggregate, sort and limit over that subquery, so the
+database does the work in a single round-trip::
+
+    suffixes = days_in_range(db, start, end)
+    days = select_days(suffixes, lambda user, log, day: select(...))
+    rows = db.execute(select(days.c.username, ...).group_by(...).limit(10))
+
+Per-day SELECTs may aggregate themselves (pre-aggregating before the union
+keeps it small); the outer query then aggregates the partial results.
+
+Questions about the last N hours go through ``select_window``, which only
+touches the tables of the days the window overlaps and filters
+``created_at`` only in the first and last of them.
+"""
+
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import (
+    BigInteger,
+    DateTime,
+    Integer,
+    String,
+    Text,
+    column,
+    literal_column,
+    select,
+    table,
+    union_all,
+)
+
+from database.table_catalog import table_catalog
+
+# SQLite refuses compound SELECTs of more than 500 terms; longer ranges are
+# unioned in nested chunks, which is still one statement.
+UNION_CHUNK_SIZE = 200
+
+
+def daily_tables(date_suffix: str):
+    """Lightweight ``(user, log)`` table constructs for one day.
+
+    Unlike ``get_dynamic_models`` these need no inspection and never create
+    tables, so building a query over hundreds of days stays cheap.
+    """
+    user = table(
+        f"user_{date_suffix}",
+        column("id", Integer),
+        column("username", String),
+        column("ip", String),
+        column("created_at", DateTime),
+    )
+    log = table(
+        f"log_{date_suffix}",
+        column("id", Integer),
+        column("user_id", Integer),
+        column("url", Text),
+        column("response", Integer),
+        column("request_count", Integer),
+        column("data_transmitted", BigInteger),
+        column("created_at", DateTime),
+        column("host", String),
+        column("domain", String),
+        column("tld", String),
+    )
+    return user, log
+
+
+def day_label(date_suffix: str):
+    """The day of a per-day SELECT as a ``log_date`` column (``YYYYMMDD``)."""
+    return literal_column(f"'{date_suffix}'", String).label("log_date")
+
+
+def days_in_range(db, start: date, end: date) -> list[str]:
+    """Suffixes of the days between ``start`` and ``end`` with both tables."""
+    first, last = start.strftime("%Y%m%d"), end.strftime("%Y%m%d")
+    return [
+        suffix
+        for suffix in table_catalog.day_suffixes(db.get_bind(), complete=True)
+        if first <= suffix <= last
+    ]
+
+
+def all_days(db) -> list[str]:
+    """Suffixes of every day with both a daily user and log table."""
+    return list(table_catalog.day_suffixes(db.get_bind(), complete=True))
+
+
+def days_in_window(db, since: datetime, until: datetime | None = None) -> list[str]:
+    """Suffixes of the days whose tables can hold rows of ``[since, until)``.
+
+    A row is stored in the table of the day of its ``created_at`` (the log
+    timestamp), so only the days from ``since`` to ``until`` (now by
+    default) qualify.
+    """
+    until = until or datetime.now()
+    if until <= since:
+        return []
+    # A window ending exactly at midnight holds nothing of that day.
+    last = (until - timedelta(microseconds=1)).date()
+    return days_in_range(db, since.date(), last)
+
+
+def window_filter(log, date_suffix: str, since: datetime, until=None) -> list:
+    """``created_at`` bounds needed in one day's table for ``[since, until)``.
+
+    Days that lie wholly inside the window need no filter at all.
+    """
+    conditions = []
+    if date_suffix == since.strftime("%Y%m%d"):
+        conditions.append(log.c.created_at >= since)
+    if until is not None and date_suffix == until.strftime("%Y%m%d"):
+        conditions.append(log.c.created_at < until)
+    return conditions
+
+
+def recent_window(hours: float) -> tuple[datetime, datetime]:
+    """``(since, until)`` of the last ``hours`` hours."""
+    until = datetime.now()
+    return until - timedelta(hours=hours), until
+
+
+def union_days(selects: list, name: str = "days"):
+    """``UNION ALL`` of per-day SELECTs (same columns) as a subquery."""
+    if len(selects) == 1:
+        return selects[0].subquery(name)
+    while len(selects) > UNION_CHUNK_SIZE:
+        selects = [
+            select(union_all(*selects[index : index + UNION_CHUNK_SIZE]).subquery())
+            for index in range(0, len(selects), UNION_CHUNK_SIZE)
+        ]
+    return union_all(*selects).subquery(name)
+
+
+def select_days(suffixes: list[str], build, name: str = "days"):
+    """Union ``build(user, log, suffix)`` over ``suffixes``; None if empty."""
+    if not suffixes:
+        return None
+    return union_days(
+        [build(*daily_tables(suffix), suffix) for suffix in suffixes], name
+    )
+
+
+def select_window(db, since: datetime, build, until=None, name: str = "days"):
+    """``select_days`` over ``[since, until)``; None if no table overlaps it.
+
+    ``build(user, log, suffix)`` returns the day's SELECT without any time
+    filter; the window bounds are added to it where they are needed.
+    """
+    until = until or datetime.now()
+    return select_days(
+        days_in_window(db, since, until),
+        lambda user, log, suffix: build(user, log, suffix).where(
+            *window_filter(log, suffix, since, until)
+        ),
+        name,
+    )
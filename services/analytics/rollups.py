@@ -0,0 +1,349 @@
+"""Nightly rollups of the per-day report aggregates.
+
+Reports over a past day (``/reports/date/<date>``, the PDF export, the
+dashboard) used to recompute every GROUP BY over the raw ``log_YYYYMMDD``
+rows on each request, although a closed day never changes.  Once a day has
+closed, ``build_daily_rollup`` stores its totals and its per-user,
+per-domain, per-TLD, per-response-code and per-IP aggregates (plus the
+busiest URLs)
+in the ``rollup_daily_*`` tables and ``load_daily_rollup`` serves reports
+from them.  Today is always computed live.
+
+A rollup remembers the highest user and log ids of the tables it was built
+from.  Rows added to the day later (lines flushed after midnight, a
+historical import) make it stale: the day is served live again until the
+next ``rollup_closed_days`` run rebuilds it.
+"""
+
+import heapq
+from datetime import date, datetime
+
+from loguru import logger
+from sqlalchemy import func
+
+from config import Config
+from database.database import (
+    get_dynamic_models,
+    get_dynamic_table_names,
+    get_dynamic_table_suffixes,
+    get_engine,
+    get_session,
+    table_exists,
+)
+from database.models.models import (
+    RollupDay,
+    RollupDomain,
+    RollupIp,
+    RollupResponse,
+    RollupTld,
+    RollupUrl,
+    RollupUser,
+)
+from utils.url_parsing import host_info, url_host
+
+REPORT_LIMIT = 20
+TOP_URLS = max(REPORT_LIMIT, Config.REPORT_ROLLUP_TOP_URLS)
+DETAIL_MODELS = (
+    RollupUser,
+    RollupDomain,
+    RollupTld,
+    RollupUrl,
+    RollupResponse,
+    RollupIp,
+)
+
+
+def table_day(table_name: str) -> date | None:
+    """Date of a ``user_YYYYMMDD`` / ``log_YYYYMMDD`` table, if it is one."""
+    _, _, suffix = table_name.rpartition("_")
+    try:
+        return datetime.strptime(suffix, "%Y%m%d").date()
+    except ValueError:
+        return None
+
+
+def _source_ids(session, UserModel, LogModel) -> tuple[int, int]:
+    max_user_id = session.query(func.coalesce(func.max(UserModel.id), 0)).scalar()
+    max_log_id = session.query(func.coalesce(func.max(LogModel.id), 0)).scalar()
+    return int(max_user_id), int(max_log_id)
+
+
+def _push_top(heap: list, item: tuple, size: int) -> None:
+    if len(heap) < size:
+        heapq.heappush(heap, item)
+    elif item > heap[0]:
+        heapq.heapreplace(heap, item)
+
+
+def build_daily_rollup(session, day: date) -> bool:
+    """(Re)build the rollup of ``day``; False when the day has no tables."""
+    user_table_name, log_table_name = get_dynamic_table_names(day.strftime("%Y%m%d"))
+    engine = session.get_bind()
+    if not table_exists(engine, user_table_name) or not table_exists(
+        engine, log_table_name
+    ):
+        return False
+    UserModel, LogModel = get_dynamic_models(day.strftime("%Y%m%d"))
+
+    # Taken first: rows committed while the rollup is built only make it
+    # look stale, never fresh with data missing.
+    max_user_id, max_log_id = _source_ids(session, UserModel, LogModel)
+    in_source = (UserModel.id <= max_user_id, LogModel.id <= max_log_id)
+
+    total_log_entries, total_requests, total_data = (
+        session.query(
+            func.count(LogModel.id),
+            func.coalesce(func.sum(LogModel.request_count), 0),
+            func.coalesce(func.sum(LogModel.data_transmitted), 0),
+        )
+        .filter(in_source[1])
+        .one()
+    )
+    total_users = session.query(func.count(UserModel.id)).filter(in_source[0]).scalar()
+
+    users = [
+        RollupUser(
+            day=day,
+            username=username,
+            requests=requests or 0,
+            data_transmitted=data or 0,
+        )
+        for username, requests, data in session.query(
+            UserModel.username,
+            func.sum(LogModel.request_count),
+            func.sum(LogModel.data_transmitted),
+        )
+        .join(LogModel, LogModel.user_id == UserModel.id)
+        .filter(*in_source)
+        .group_by(UserModel.username)
+    ]
+
+    responses = [
+        RollupResponse(day=day, response=response, requests=requests or 0)
+        for response, requests in session.query(
+            LogModel.response, func.sum(LogModel.request_count)
+        )
+        .filter(in_source[1])
+        .group_by(LogModel.response)
+    ]
+
+    ips = {}
+    for ip, username in (
+        session.query(UserModel.ip, UserModel.username)
+        .filter(in_source[0])
+        .order_by(UserModel.id)
+    ):
+        ips.setdefault(ip, RollupIp(day=day, ip=ip, user_count=0, usernames=[]))
+        ips[ip].user_count += 1
+        ips[ip].usernames.append(username)
+    for ip, requests, data in (
+        session.query(
+            UserModel.ip,
+            func.sum(LogModel.request_count),
+            func.sum(LogModel.data_transmitted),
+        )
+        .join(LogModel, LogModel.user_id == UserModel.id)
+        .filter(*in_source)
+        .group_by(UserModel.ip)
+    ):
+        ips[ip].requests = requests or 0
+        ips[ip].data_transmitted = data or 0
+    for rollup_ip in ips.values():
+        rollup_ip.usernames = ", ".join(rollup_ip.usernames)
+
+    # One pass over the day's URLs feeds the per-domain and per-TLD totals
+    # and both "top pages" lists; only the busiest URLs are stored.
+    domains = {}
+    tlds = {}
+    top_by_requests = []
+    top_by_data = []
+    url_rows = (
+        session.query(
+            LogModel.url,
+            func.sum(LogModel.request_count),
+            func.count(func.distinct(LogModel.user_id)),
+            func.sum(LogModel.data_transmitted),
+        )
+        .filter(in_source[1])
+        .group_by(LogModel.url)
+        .yield_per(5000)
+    )
+    for url, requests, unique_users, data in url_rows:
+        requests = requests or 0
+        data = data or 0
+        domain = url_host(url)[:255]
+        domain_totals = domains.setdefault(domain, [0, 0])
+        domain_totals[0] += requests
+        domain_totals[1] += data
+        tld = host_info(domain).tld
+        tlds[tld] = tlds.get(tld, 0) + requests
+        row = (url, requests, unique_users, data)
+        _push_top(top_by_requests, (requests, row), TOP_URLS)
+        _push_top(top_by_data, (data, row), TOP_URLS)
+
+    top_urls = {row[0]: row for _, row in top_by_requests + top_by_data}
+    urls = [
+        RollupUrl(
+            day=day,
+            url=url,
+            requests=requests,
+            unique_users=unique_users,
+            data_transmitted=data,
+        )
+        for url, requests, unique_users, data in top_urls.values()
+    ]
+
+    # The totals row is updated in place; detail rows are replaced.
+    totals = session.query(RollupDay).filter(RollupDay.day == day).one_or_none()
+    if totals is None:
+        totals = RollupDay(day=day)
+        session.add(totals)
+    totals.total_users = total_users
+    totals.total_log_entries = total_log_entries
+    totals.total_requests = total_requests
+    totals.total_data_transmitted = total_data
+    totals.source_max_user_id = max_user_id
+    totals.source_max_log_id = max_log_id
+    totals.built_at = datetime.now()
+    for model in DETAIL_MODELS:
+        session.query(model).filter(model.day == day).delete(synchronize_session=False)
+    session.add_all(users)
+    session.add_all(responses)
+    session.add_all(ips.values())
+    session.add_all(urls)
+    session.add_all(
+        RollupDomain(day=day, domain=domain, requests=requests, data_transmitted=data)
+        for domain, (requests, data) in domains.items()
+    )
+    session.add_all(
+        RollupTld(day=day, tld=tld, requests=requests) for tld, requests in tlds.items()
+    )
+    session.commit()
+    return True
+
+
+def is_rollup_fresh(session, rollup: RollupDay, UserModel, LogModel) -> bool:
+    return (
+        rollup.source_max_user_id,
+        rollup.source_max_log_id,
+    ) == _source_ids(session, UserModel, LogModel)
+
+
+def rollup_closed_days(today: date | None = None) -> list[date]:
+    """Build missing or stale rollups for every closed day with tables.
+
+    Returns the days that were (re)built.  Run nightly; the first run after
+    an upgrade backfills the whole history.
+    """
+    today = today or date.today()
+    session = get_session()
+    built = []
+    try:
+        rollups = {rollup.day: rollup for rollup in session.query(RollupDay)}
+        for suffix in get_dynamic_table_suffixes(get_engine()):
+            day = datetime.strptime(suffix, "%Y%m%d").date()
+            if day >= today:
+                continue
+            rollup = rollups.get(day)
+            if rollup is not None:
+                UserModel, LogModel = get_dynamic_models(suffix)
+                if UserModel is None or is_rollup_fresh(
+                    session, rollup, UserModel, LogModel
+                ):
+                    continue
+            try:
+                if build_daily_rollup(session, day):
+                    built.append(day)
+            except Exception:
+                session.rollback()
+                logger.exception(f"Error building report rollup for {day}")
+    finally:
+        session.close()
+
+    if built:
+        logger.info(
+            f"Report rollups built for {len(built)} day(s): "
+            f"{built[0].isoformat()} .. {built[-1].isoformat()}"
+        )
+    return built
+
+
+def load_daily_rollup(session, UserModel, LogModel, limit: int = REPORT_LIMIT):
+    """Report aggregates of a closed day from its rollup, or None.
+
+    None means the report has to be computed live: rollups are disabled, the
+    day is today, or its rollup is missing or stale.
+    """
+    if not Config.REPORT_ROLLUPS_ENABLED or LogModel is None:
+        return None
+    day = table_day(LogModel.__tablename__)
+    if day is None or day >= date.today():
+        return None
+    rollup = session.query(RollupDay).filter(RollupDay.day == day).one_or_none()
+    if rollup is None or not is_rollup_fresh(session, rollup, UserModel, LogModel):
+        return None
+
+    def rows(model, *columns, order_by=None, where=None):
+        query = session.query(*columns).filter(model.day == day)
+        if where is not None:
+            query = query.filter(where)
+        if order_by is not None:
+            query = query.order_by(order_by.desc()).limit(limit)
+        return [tuple(row) for row in query]
+
+    tlds = rows(RollupTld, RollupTld.tld, RollupTld.requests)
+    return {
+        "totals": {
+            "total_users": rollup.total_users,
+            "total_log_entries": rollup.total_log_entries,
+            "total_data_transmitted": rollup.total_data_transmitted,
+            "total_requests": rollup.total_requests,
+        },
+        "top_users_by_requests": rows(
+            RollupUser,
+            RollupUser.username,
+            RollupUser.requests,
+            order_by=RollupUser.requests,
+        ),
+        "top_users_by_data": rows(
+            RollupUser,
+            RollupUser.username,
+            RollupUser.data_transmitted,
+            order_by=RollupUser.data_transmitted,
+        ),
+        "top_urls_by_requests": rows(
+            RollupUrl,
+            RollupUrl.url,
+            RollupUrl.requests,
+            RollupUrl.unique_users,
+            RollupUrl.data_transmitted,
+            order_by=RollupUrl.requests,
+        ),
+        "top_urls_by_data": rows(
+            RollupUrl,
+            RollupUrl.url,
+            RollupUrl.data_transmitted,
+            order_by=RollupUrl.data_transmitted,
+        ),
+        "responses": sorted(
+            rows(RollupResponse, RollupResponse.response, RollupResponse.requests),
+            key=lambda row: row[1],
+            reverse=True,
+        ),
+        "shared_ips": sorted(
+            rows(
+                RollupIp,
+                RollupIp.ip,
+                RollupIp.user_count,
+                RollupIp.usernames,
+                where=RollupIp.user_count > 1,
+            ),
+            key=lambda row: row[1],
+            reverse=True,
+        ),
+        "tlds": tlds,
+        # Rollups built before per-TLD totals: the chart falls back to hosts.
+        "domains": []
+        if tlds
+        else rows(RollupDomain, RollupDomain.domain, RollupDomain.requests),
+    }
@@ -5,6 +5,7 @@ from loguru import logger
 from sqlalchemy import MetaData, Table, inspect
 
 from database.database import get_engine
+from parsers.log_writer import daily_user_ids
 
 
 def delete_table_data(table_name: str):
@@ -39,6 +40,9 @@ def delete_table_data(table_name: str):
         with engine.connect() as conn:
             conn.execute(table.delete())
             conn.commit()
+        if table_name.startswith("user_"):
+            # Cached ids of this day's users no longer exist.
+            daily_user_ids.discard(table_name.removeprefix("user_"))
 
         return {
             "status": "success",
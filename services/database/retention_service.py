@@ -0,0 +1,310 @@
+"""
+Retention of old data.
+
+Each kind of data has its own days-to-keep setting (0 keeps it forever):
+
+  - RETENTION_LOG_DAYS         daily user_/log_YYYYMMDD tables, dropped whole
+  - RETENTION_ROLLUP_DAYS      report rollups (rollup_daily_*)
+  - RETENTION_DENIED_LOG_DAYS  denied_logs rows
+  - RETENTION_METRICS_DAYS     system_metrics rows
+
+Expiring a day is a DROP TABLE (a partition drop with the partitioned
+backend), never a row-by-row DELETE.  With RETENTION_ARCHIVE_DIR set, the
+day's requests are first written to ``squidstats_YYYYMMDD.csv.gz``.  Rows
+of the shared tables are deleted in primary-key ranges, one short
+statement and commit per RETENTION_DELETE_CHUNK ids.
+
+Every pass is recorded in ``retention_runs`` for the database admin page.
+"""
+
+import csv
+import gzip
+import json
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from loguru import logger
+from sqlalchemy import delete, func, select, true
+
+from config import Config
+from database.database import drop_daily_tables, get_dynamic_table_names, get_session
+from database.models.models import (
+    DeniedLog,
+    RetentionRun,
+    RollupDay,
+    RollupDomain,
+    RollupIp,
+    RollupResponse,
+    RollupTld,
+    RollupUrl,
+    RollupUser,
+    SystemMetrics,
+)
+from database.table_catalog import table_catalog
+from parsers.log_writer import daily_user_ids
+from services.analytics.range_query import daily_tables
+from services.database.admin_helpers import get_table_size
+
+ROLLUP_MODELS = (
+    RollupUser,
+    RollupDomain,
+    RollupTld,
+    RollupUrl,
+    RollupResponse,
+    RollupIp,
+)
+ARCHIVE_COLUMNS = (
+    "username",
+    "ip",
+    "url",
+    "response",
+    "request_count",
+    "data_transmitted",
+    "created_at",
+)
+
+
+def cutoff_date(days: int, today: date | None = None) -> date | None:
+    """First day kept when keeping ``days`` days; None keeps everything."""
+    if days <= 0:
+        return None
+    return (today or date.today()) - timedelta(days=days - 1)
+
+
+def _table_bytes(session, *table_names: str) -> int:
+    total = 0
+    for table_name in table_names:
+        try:
+            total += int(get_table_size(session, Config.DATABASE_TYPE, table_name))
+        except Exception:
+            # dbstat is optional on SQLite; sizes are then reported as 0.
+            session.rollback()
+    return total
+
+
+def delete_in_chunks(session, model, condition, chunk: int | None = None) -> int:
+    """Delete the rows of ``model`` matching ``condition`` by id ranges.
+
+    Every statement covers ``chunk`` consecutive ids of the primary key and
+    is committed on its own, so locks are short and the database never has
+    to materialize the full set of ids.  Returns the rows deleted.
+    """
+    chunk = chunk or Config.RETENTION_DELETE_CHUNK
+    low, high = session.execute(
+        select(func.min(model.id), func.max(model.id)).where(condition)
+    ).one()
+    if low is None:
+        return 0
+
+    deleted = 0
+    while low <= high:
+        result = session.execute(
+            delete(model).where(model.id >= low, model.id < low + chunk, condition)
+        )
+        session.commit()
+        deleted += result.rowcount or 0
+        low += chunk
+    return deleted
+
+
+def delete_oldest_denied_logs(session, rows: int, chunk: int | None = None) -> int:
+    """Delete the ``rows`` denied_logs rows with the oldest ``created_at``.
+
+    Archives loaded by import-logs get ids above newer live rows, so the age
+    boundary is read from ``created_at`` rather than the id order; the rows
+    older than it are then deleted in id ranges.  Returns the rows deleted.
+    """
+    boundary = session.execute(
+        select(DeniedLog.created_at)
+        .where(DeniedLog.created_at.isnot(None))
+        .order_by(DeniedLog.created_at)
+        .offset(rows)
+        .limit(1)
+    ).scalar()
+    condition = DeniedLog.created_at < boundary if boundary is not None else true()
+    return delete_in_chunks(session, DeniedLog, condition, chunk)
+
+
+def archive_day(session, date_suffix: str, directory) -> Path:
+    """Write one day's requests to ``squidstats_YYYYMMDD.csv.gz``."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"squidstats_{date_suffix}.csv.gz"
+    partial = path.with_name(path.name + ".part")
+
+    user, log = daily_tables(date_suffix)
+    query = (
+        select(*(user.c[name] for name in ARCHIVE_COLUMNS[:2]))
+        .add_columns(*(log.c[name] for name in ARCHIVE_COLUMNS[2:]))
+        .join_from(log, user, log.c.user_id == user.c.id)
+        .order_by(log.c.id)
+        .execution_options(yield_per=5000)
+    )
+    with gzip.open(partial, "wt", newline="", encoding="utf-8") as archive:
+        writer = csv.writer(archive)
+        writer.writerow(ARCHIVE_COLUMNS)
+        writer.writerows(session.execute(query))
+    partial.replace(path)
+    return path
+
+
+def expire_daily_tables(session, before: date, archive_dir=None) -> dict:
+    """Drop (and optionally archive) every daily table pair older than ``before``."""
+    engine = session.get_bind()
+    cutoff = before.strftime("%Y%m%d")
+    complete = set(table_catalog.day_suffixes(engine, complete=True))
+    result = {"days": [], "bytes": 0, "archived": 0}
+
+    for date_suffix in table_catalog.day_suffixes(engine):
+        if date_suffix >= cutoff:
+            break
+        size = _table_bytes(session, *get_dynamic_table_names(date_suffix))
+        if archive_dir and date_suffix in complete:
+            archive_day(session, date_suffix, archive_dir)
+            result["archived"] += 1
+        session.commit()
+
+        drop_daily_tables(engine, date_suffix)
+        daily_user_ids.discard(date_suffix)
+        result["days"].append(date_suffix)
+        result["bytes"] += size
+    return result
+
+
+def expire_rollups(session, before: date) -> int:
+    deleted = 0
+    for model in (*ROLLUP_MODELS, RollupDay):
+        deleted += (
+            session.query(model)
+            .filter(model.day < before)
+            .delete(synchronize_session=False)
+        )
+    session.commit()
+    return deleted
+
+
+def expire_rows(session, model, time_column, before: datetime) -> tuple[int, int]:
+    """Chunk-delete rows older than ``before``; returns (rows, bytes freed)."""
+    table_name = model.__tablename__
+    size = _table_bytes(session, table_name)
+    rows = delete_in_chunks(session, model, time_column < before)
+    if not rows:
+        return 0, 0
+    return rows, max(size - _table_bytes(session, table_name), 0)
+
+
+def run_retention(today: date | None = None) -> dict:
+    """Apply every retention setting once and record the run."""
+    today = today or date.today()
+    session = get_session()
+    run = RetentionRun(
+        started_at=datetime.now(),
+        days_dropped=0,
+        rows_deleted=0,
+        bytes_reclaimed=0,
+        archived_files=0,
+    )
+    details = {}
+    try:
+        log_cutoff = cutoff_date(Config.RETENTION_LOG_DAYS, today)
+        if log_cutoff:
+            expired = expire_daily_tables(
+                session, log_cutoff, Config.RETENTION_ARCHIVE_DIR or None
+            )
+            run.days_dropped = len(expired["days"])
+            run.bytes_reclaimed = expired["bytes"]
+            run.archived_files = expired["archived"]
+            if expired["days"]:
+                details["daily_tables"] = {
+                    "from": expired["days"][0],
+                    "to": expired["days"][-1],
+                    "bytes": expired["bytes"],
+                }
+
+        rollup_cutoff = cutoff_date(Config.RETENTION_ROLLUP_DAYS, today)
+        if rollup_cutoff:
+            rows = expire_rollups(session, rollup_cutoff)
+            run.rows_deleted += rows
+            if rows:
+                details["rollups"] = {"rows": rows}
+
+        for key, model, column, days in (
+            (
+                "denied_logs",
+                DeniedLog,
+                DeniedLog.created_at,
+                Config.RETENTION_DENIED_LOG_DAYS,
+            ),
+            (
+                "system_metrics",
+                SystemMetrics,
+                SystemMetrics.timestamp,
+                Config.RETENTION_METRICS_DAYS,
+            ),
+        ):
+            cutoff = cutoff_date(days, today)
+            if cutoff is None:
+                continue
+            before = datetime.combine(cutoff, datetime.min.time())
+            rows, freed = expire_rows(session, model, column, before)
+            run.rows_deleted += rows
+            run.bytes_reclaimed += freed
+            if rows:
+                details[key] = {"rows": rows, "bytes": freed}
+
+        run.details = json.dumps(details)
+        run.finished_at = datetime.now()
+        session.add(run)
+        session.commit()
+        summary = run_summary(run)
+    finally:
+        session.close()
+
+    if run.days_dropped or run.rows_deleted:
+        logger.info(
+            f"Retention dropped {run.days_dropped} day(s), deleted "
+            f"{run.rows_deleted:,} row(s), reclaimed {run.bytes_reclaimed:,} B"
+        )
+    return summary
+
+
+def run_summary(run: RetentionRun) -> dict:
+    return {
+        "started_at": run.started_at.isoformat(timespec="seconds"),
+        "finished_at": run.finished_at.isoformat(timespec="seconds")
+        if run.finished_at
+        else None,
+        "days_dropped": run.days_dropped,
+        "rows_deleted": run.rows_deleted,
+        "bytes_reclaimed": run.bytes_reclaimed,
+        "archived_files": run.archived_files,
+        "details": json.loads(run.details or "{}"),
+    }
+
+
+def get_retention_overview(limit: int = 10) -> dict:
+    """Settings, recent runs and total reclaimed space for the admin page."""
+    session = get_session()
+    try:
+        runs = (
+            session.query(RetentionRun)
+            .order_by(RetentionRun.started_at.desc())
+            .limit(limit)
+            .all()
+        )
+        total = session.query(
+            func.coalesce(func.sum(RetentionRun.bytes_reclaimed), 0)
+        ).scalar()
+        return {
+            "settings": {
+                "log_days": Config.RETENTION_LOG_DAYS,
+                "rollup_days": Config.RETENTION_ROLLUP_DAYS,
+                "denied_log_days": Config.RETENTION_DENIED_LOG_DAYS,
+                "metrics_days": Config.RETENTION_METRICS_DAYS,
+                "archive_dir": Config.RETENTION_ARCHIVE_DIR,
+            },
+            "runs": [run_summary(run) for run in runs],
+            "total_bytes_reclaimed": int(total or 0),
+        }
+    finally:
+        session.close()
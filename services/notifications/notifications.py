@@ -70,7 +70,11 @@ def set_socketio_instance(sio):
 
 @contextmanager
 def get_db_session():
-    """Context manager for database sessions"""
+    """Context manager for database sessions.
+
+    Each use is its own unit of work: a notification added while a check
+    holds another session is committed on its own.
+    """
     db = get_session()
     try:
         yield db
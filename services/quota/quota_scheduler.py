@@ -6,10 +6,10 @@ from types import SimpleNamespace
 
 from loguru import logger
 from sqlalchemy import func
-from sqlalchemy import inspect as sqlalchemy_inspect
 
 from database.database import get_dynamic_models, get_session
 from database.models.models import QuotaEvent, QuotaGroup, QuotaUser
+from database.table_catalog import table_catalog
 from services.quota.quota_service import (
     _BLOCKED_USERS_PATH,
     _read_blocked_usernames,
@@ -104,19 +104,11 @@ def register_quota_scheduler_tasks(scheduler):
             quota_usernames = [u.username for u in regular_users]
             usage_by_username = {}
 
-            inspector = sqlalchemy_inspect(session.get_bind())
-            all_tables = inspector.get_table_names()
             current_month_prefix = datetime.now().strftime("%Y%m")
 
-            for table_name in all_tables:
-                if not table_name.startswith("user_"):
-                    continue
-                suffix = table_name.split("_", 1)[1]
+            for suffix in table_catalog.day_suffixes(session.get_bind(), complete=True):
                 if not suffix.startswith(current_month_prefix):
                     continue
-                log_table_name = f"log_{suffix}"
-                if log_table_name not in all_tables:
-                    continue
                 UserModel, LogModel = get_dynamic_models(suffix)
                 if not UserModel or not LogModel:
                     continue
@@ -6,7 +6,14 @@ from sqlalchemy import text
 from config import Config
 from database.database import get_session
 from parsers.log import process_logs
+from parsers.log_tailer import ensure_log_tailer
+from services.analytics.blacklist_summary import refresh_blacklist_summary
+from services.analytics.rollups import rollup_closed_days
 from services.database import backup_service
+from services.database.retention_service import (
+    delete_oldest_denied_logs,
+    run_retention,
+)
 from services.notifications.notifications import (
     has_remote_commits_with_messages,
     set_commit_notifications,
@@ -46,6 +53,11 @@ def register_scheduler_tasks(scheduler):
             logger.error(f"Log file not found: {log_file}")
             return
 
+        # The tailer ingests continuously; this job only (re)starts it.
+        if Config.LOG_TAILER_ENABLED:
+            ensure_log_tailer(log_file)
+            return
+
         process_logs(log_file)
 
     @scheduler.task("interval", id="cleanup_metrics", hours=1, misfire_grace_time=3600)
@@ -59,6 +71,53 @@ def register_scheduler_tasks(scheduler):
         except Exception as e:
             logger.error(f"Error in metrics cleanup task: {e}")
 
+    @scheduler.task(
+        "cron", id="report_rollups", hour=0, minute=30, misfire_grace_time=3600
+    )
+    def report_rollups_task():
+        """Summarize closed days for the reports at 00:30.
+
+        Runs after midnight so yesterday's last buffered lines are in; any
+        day that changed since its rollup was built is rebuilt as well.
+        """
+        if not Config.REPORT_ROLLUPS_ENABLED:
+            return
+        try:
+            rollup_closed_days()
+        except Exception:
+            logger.exception("Error building report rollups")
+
+    @scheduler.task(
+        "cron", id="blacklist_summary", hour=0, minute=45, misfire_grace_time=3600
+    )
+    def blacklist_summary_task():
+        """Count late lines of closed days into the blacklist summary at 00:45.
+
+        The blacklist page keeps today and yesterday current by itself; this
+        pass picks up rows added later to older days (historical imports).
+        """
+        session = get_session()
+        try:
+            refresh_blacklist_summary(session, closed_days=True)
+        except Exception:
+            logger.exception("Error refreshing the blacklist summary")
+        finally:
+            session.close()
+
+    @scheduler.task(
+        "cron", id="data_retention", hour=1, minute=0, misfire_grace_time=3600
+    )
+    def data_retention_task():
+        """Expire data past its RETENTION_* days at 01:00.
+
+        Runs after the 00:30 rollups, so a day is summarized before its raw
+        tables can be dropped.
+        """
+        try:
+            run_retention()
+        except Exception:
+            logger.exception("Error applying data retention")
+
     @scheduler.task("cron", id="auto_backup", hour=2, minute=0, misfire_grace_time=3600)
     def auto_backup_task():
         """Daily automatic backup at 02:00. Respects per-period quota."""
@@ -82,9 +141,9 @@ def register_scheduler_tasks(scheduler):
     def trim_denied_logs_task():
         """Keep denied_logs under 1 GB.
 
-        When the table exceeds the limit, oldest rows are deleted until it
-        sits at 650 MB (35% headroom), using a single DELETE with a subquery
-        so no Python-level row iteration is needed.
+        When the table exceeds the limit, the oldest rows by ``created_at``
+        are deleted until it sits at 650 MB (35% headroom), in short id-range
+        DELETEs (see ``retention_service.delete_oldest_denied_logs``).
         """
 
         session = None
@@ -145,21 +204,11 @@ def register_scheduler_tasks(scheduler):
             bytes_to_free = size - _DENIED_LOGS_TARGET_BYTES
             rows_to_delete = max(1, int(bytes_to_free / bytes_per_row))
 
-            # ── Delete oldest rows via subquery (works on all engines) ────
-            session.execute(
-                text(
-                    "DELETE FROM denied_logs WHERE id IN ("
-                    "  SELECT id FROM denied_logs"
-                    "  ORDER BY created_at ASC"
-                    "  LIMIT :n"
-                    ")"
-                ),
-                {"n": rows_to_delete},
-            )
-            session.commit()
+            # ── Delete the oldest rows, by created_at, in id ranges ──────
+            deleted = delete_oldest_denied_logs(session, rows_to_delete)
 
             logger.info(
-                f"Trimmed {rows_to_delete:,} row(s) from denied_logs"
+                f"Trimmed {deleted:,} row(s) from denied_logs"
                 f" (was {size:,} B, target {_DENIED_LOGS_TARGET_BYTES:,} B)"
             )
 
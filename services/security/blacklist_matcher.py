@@ -0,0 +1,104 @@
+"""In-process matching of URLs against the active blacklist.
+
+Blacklist entries are Squid ``dstdomain`` style domains: ``example.com``
+blocks ``example.com`` and every subdomain of it.  They are kept in a hashed
+set, so checking a host costs one set lookup per label of the host whatever
+the size of the list; hundreds of thousands of imported domains are matched
+as fast as ten.
+
+Entries that are not domain names (keywords or paths added to the custom
+list) keep the former substring semantics and are searched in the URL.
+
+The matcher is built once from ``blacklist_domains`` and shared by the
+process; ``invalidate_blacklist_matcher`` (called by
+``invalidate_blacklist_cache`` after every blacklist edit) makes the next
+caller rebuild it.
+"""
+
+import re
+import threading
+
+from loguru import logger
+from sqlalchemy import select
+
+from database.database import get_session
+from database.models.models import BlacklistDomain
+from utils.url_parsing import host_suffixes, url_host
+
+_DOMAIN_RE = re.compile(r"^[a-z0-9_-]+(\.[a-z0-9_-]+)+$")
+
+
+class BlacklistMatcher:
+    def __init__(self, entries=()):
+        self.domains: set[str] = set()
+        self.patterns: list[str] = []
+        for entry in entries:
+            entry = (entry or "").strip().lower()
+            domain = entry.lstrip("*").strip(".")
+            if _DOMAIN_RE.match(domain):
+                self.domains.add(domain)
+            elif entry:
+                self.patterns.append(entry)
+
+    def __len__(self) -> int:
+        return len(self.domains) + len(self.patterns)
+
+    def entries(self) -> set[str]:
+        """Normalized entries; ``BlacklistMatcher(entries)`` matches the same."""
+        return self.domains | set(self.patterns)
+
+    def match_host(self, host: str) -> str | None:
+        """The blacklisted domain covering ``host``, or None."""
+        if not host:
+            return None
+        for suffix in host_suffixes(host):
+            if suffix in self.domains:
+                return suffix
+        return None
+
+    def match_url(self, url: str) -> str | None:
+        """The blacklist entry matching ``url``, or None."""
+        hit = self.match_host(url_host(url))
+        if hit is None and self.patterns:
+            lowered = url.lower()
+            hit = next(
+                (pattern for pattern in self.patterns if pattern in lowered), None
+            )
+        return hit
+
+    @classmethod
+    def from_session(cls, session) -> "BlacklistMatcher":
+        """Matcher of the active ``blacklist_domains`` entries."""
+        return cls(
+            session.execute(
+                select(BlacklistDomain.domain)
+                .where(BlacklistDomain.active == 1)
+                .execution_options(yield_per=10000)
+            ).scalars()
+        )
+
+
+_matcher_lock = threading.Lock()
+_matcher: BlacklistMatcher | None = None
+
+
+def get_blacklist_matcher() -> BlacklistMatcher:
+    """The shared matcher, built on first use after start or invalidation."""
+    global _matcher
+    with _matcher_lock:
+        if _matcher is None:
+            session = get_session()
+            try:
+                _matcher = BlacklistMatcher.from_session(session)
+            finally:
+                session.close()
+            logger.debug(f"Blacklist matcher built with {len(_matcher)} entries")
+        return _matcher
+
+
+def invalidate_blacklist_matcher() -> BlacklistMatcher | None:
+    """Drop the shared matcher; returns it (None if it was not built)."""
+    global _matcher
+    with _matcher_lock:
+        previous, _matcher = _matcher, None
+    return previous
@@ -5,7 +5,9 @@ from loguru import logger
 from sqlalchemy import desc
 from sqlalchemy.exc import OperationalError
 
-from database.database import SystemMetrics, get_session
+from config import Config
+from database.database import SystemMetrics, get_session, session_scope
+from services.database.retention_service import delete_in_chunks
 
 _LOCK_RETRIES = 5
 _LOCK_RETRY_DELAY = 1.0  # seconds
@@ -20,36 +22,29 @@ class MetricsService:
         net_sent_bytes_sec: int,
         net_recv_bytes_sec: int,
     ) -> bool:
-        session = None
         for attempt in range(1, _LOCK_RETRIES + 1):
             try:
-                session = get_session()
-
-                local_tz = datetime.now().astimezone().tzinfo
-                metric = SystemMetrics(
-                    timestamp=datetime.now(local_tz),
-                    cpu_usage=cpu_usage,
-                    ram_usage_bytes=ram_usage_bytes,
-                    swap_usage_bytes=swap_usage_bytes,
-                    net_sent_bytes_sec=net_sent_bytes_sec,
-                    net_recv_bytes_sec=net_recv_bytes_sec,
-                )
+                with session_scope() as session:
+                    local_tz = datetime.now().astimezone().tzinfo
+                    metric = SystemMetrics(
+                        timestamp=datetime.now(local_tz),
+                        cpu_usage=cpu_usage,
+                        ram_usage_bytes=ram_usage_bytes,
+                        swap_usage_bytes=swap_usage_bytes,
+                        net_sent_bytes_sec=net_sent_bytes_sec,
+                        net_recv_bytes_sec=net_recv_bytes_sec,
+                    )
 
-                session.add(metric)
-                session.commit()
-                session.close()
+                    session.add(metric)
 
-                # Limpiar métricas antiguas (más de 24 horas)
+                # Limpiar métricas fuera de RETENTION_METRICS_DAYS en su propia
+                # sesión: un fallo de la limpieza no afecta a la métrica guardada
                 MetricsService.cleanup_old_metrics()
 
                 logger.info("System metrics saved successfully")
                 return True
 
             except OperationalError as e:
-                if session:
-                    session.rollback()
-                    session.close()
-                    session = None
                 if "database is locked" in str(e).lower() and attempt < _LOCK_RETRIES:
                     import time
 
@@ -63,9 +58,6 @@ class MetricsService:
 
             except Exception as e:
                 logger.error(f"Error saving system metrics: {e}")
-                if session:
-                    session.rollback()
-                    session.close()
                 return False
 
         return False
@@ -174,22 +166,22 @@ class MetricsService:
 
     @staticmethod
     def cleanup_old_metrics() -> bool:
-        try:
-            session = get_session()
-
-            # Calcular timestamp de 24 horas atrás con zona horaria local
-            local_tz = datetime.now().astimezone().tzinfo
-            twenty_four_hours_ago = datetime.now(local_tz) - timedelta(hours=24)
+        # RETENTION_METRICS_DAYS = 0 conserva las métricas indefinidamente
+        if Config.RETENTION_METRICS_DAYS <= 0:
+            return True
 
-            # Eliminar métricas antiguas
-            deleted_count = (
-                session.query(SystemMetrics)
-                .filter(SystemMetrics.timestamp < twenty_four_hours_ago)
-                .delete()
-            )
+        try:
+            with session_scope() as session:
+                # Ventana móvil de RETENTION_METRICS_DAYS con zona horaria local
+                local_tz = datetime.now().astimezone().tzinfo
+                cutoff = datetime.now(local_tz) - timedelta(
+                    days=Config.RETENTION_METRICS_DAYS
+                )
 
-            session.commit()
-            session.close()
+                # Eliminar métricas antiguas por rangos de id
+                deleted_count = delete_in_chunks(
+                    session, SystemMetrics, SystemMetrics.timestamp < cutoff
+                )
 
             if deleted_count > 0:
                 logger.info(f"Deleted {deleted_count} old metrics")
@@ -198,9 +190,6 @@ class MetricsService:
 
         except Exception as e:
             logger.error(f"Error cleaning old metrics: {e}")
-            if session:
-                session.rollback()
-                session.close()
             return False
 
     @staticmethod
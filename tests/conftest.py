@@ -26,6 +26,7 @@ os.environ.setdefault("SQUID_PORT", "3128")
 
 import database.database as db_module  # noqa: E402
 from database.base import Base  # noqa: E402
+from parsers.log_writer import daily_user_ids  # noqa: E402
 
 
 @pytest.fixture()
@@ -57,12 +58,14 @@ def patched_db(in_memory_engine, db_session):
     db_module._engine = in_memory_engine
     db_module._Session = sessionmaker(bind=in_memory_engine)
     db_module.dynamic_model_cache.clear()
+    daily_user_ids.clear()
 
     yield db_session
 
     db_module._engine = old_engine
     db_module._Session = old_session
     db_module.dynamic_model_cache = old_cache
+    daily_user_ids.clear()
 
 
 @pytest.fixture()
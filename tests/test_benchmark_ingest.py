@@ -0,0 +1,45 @@
+"""
+Tests for the synthetic log generator of tools/benchmark_ingest.py.
+"""
+
+from collections import Counter
+
+import pytest
+
+from parsers.log import get_log_datetime, parse_log_line
+from tools.benchmark_ingest import FORMATS, LogGenerator, _newline_cuts
+
+
+@pytest.mark.parametrize("log_format", FORMATS)
+def test_generated_lines_parse(log_format):
+    generator = LogGenerator(users=10, urls=50, denied_ratio=0.25, days=2)
+    lines = list(generator.lines(log_format, 400))
+
+    records = [parse_log_line(line) for line in lines]
+
+    assert all(record is not None for record in records)
+    denied = sum(record["is_denied"] for record in records)
+    assert 60 <= denied <= 140
+    days = Counter(get_log_datetime(line).date() for line in lines)
+    assert len(days) == 2
+    assert {record["username"] for record in records} <= {
+        username for username, _ in generator.users
+    }
+
+
+def test_generator_is_deterministic():
+    first = list(LogGenerator(seed=7).lines("default", 50))
+    second = list(LogGenerator(seed=7).lines("default", 50))
+
+    assert first == second
+    assert first != list(LogGenerator(seed=8).lines("default", 50))
+
+
+def test_newline_cuts_split_on_line_boundaries():
+    data = b"".join(f"line {index}\n".encode() for index in range(25))
+
+    cuts = _newline_cuts(data, 4)
+
+    assert cuts[-1] == len(data)
+    assert all(data[cut - 1 : cut] == b"\n" for cut in cuts)
+    assert cuts == sorted(set(cuts))
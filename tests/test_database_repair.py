@@ -15,6 +15,7 @@ from database.database import (
     _is_transient_sqlite_error,
     _verify_sqlite_access,
     create_dynamic_models,
+    ensure_dynamic_table_indexes,
     repair_database_schema,
 )
 from database.models.models import AdminUser, QuotaUser
@@ -54,6 +55,105 @@ def test_repair_recreates_missing_tables_and_preserves_existing_rows():
     engine.dispose()
 
 
+def _index_names(engine, table_name):
+    return {index["name"] for index in inspect(engine).get_indexes(table_name)}
+
+
+def _create_legacy_daily_tables(engine):
+    with engine.begin() as connection:
+        # Daily tables as created before the models declared any index.
+        connection.execute(
+            text(
+                "CREATE TABLE user_20240105 (id INTEGER PRIMARY KEY, "
+                "username VARCHAR(255) NOT NULL, ip VARCHAR(255) NOT NULL, "
+                "created_at DATETIME)"
+            )
+        )
+        connection.execute(
+            text(
+                "CREATE TABLE log_20240105 (id INTEGER PRIMARY KEY, "
+                "user_id INTEGER NOT NULL, url TEXT NOT NULL, "
+                "response INTEGER NOT NULL, request_count INTEGER, "
+                "data_transmitted BIGINT, created_at DATETIME)"
+            )
+        )
+        connection.execute(
+            text(
+                "INSERT INTO log_20240105 (user_id, url, response) "
+                "VALUES (1, 'http://example.com/', 200)"
+            )
+        )
+
+
+def test_repair_adds_missing_indexes_to_yesterdays_tables():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    _create_legacy_daily_tables(engine)
+
+    created = repair_database_schema(engine, date_suffix="20240106")
+
+    assert "log_20240105" not in created
+    assert _index_names(engine, "user_20240105") == {
+        "ux_user_20240105_username_ip",
+        "ix_user_20240105_ip",
+    }
+    assert _index_names(engine, "log_20240105") == {
+        "ix_log_20240105_user_id",
+        "ix_log_20240105_created_at",
+        "ix_log_20240105_response",
+        "ix_log_20240105_host",
+        "ix_log_20240105_domain",
+    }
+    assert {"host", "domain", "tld"} <= {
+        column["name"] for column in inspect(engine).get_columns("log_20240105")
+    }
+    with engine.connect() as connection:
+        assert (
+            connection.execute(text("SELECT count(*) FROM log_20240105")).scalar_one()
+            == 1
+        )
+    assert ensure_dynamic_table_indexes(engine) == {}
+    engine.dispose()
+
+
+def test_repair_leaves_older_days_to_index_tables():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    _create_legacy_daily_tables(engine)
+
+    repair_database_schema(engine, date_suffix="20990101")
+
+    assert _index_names(engine, "log_20240105") == set()
+    added = ensure_dynamic_table_indexes(engine)
+    assert "ix_log_20240105_host" in added["20240105"]
+    assert "host" in {
+        column["name"] for column in inspect(engine).get_columns("log_20240105")
+    }
+    engine.dispose()
+
+
+def test_get_dynamic_models_runs_no_schema_repair(patched_db, in_memory_engine):
+    _create_legacy_daily_tables(in_memory_engine)
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement.lstrip().upper())
+
+    event.listen(in_memory_engine, "before_cursor_execute", record)
+    try:
+        UserModel, LogModel = db_module.get_dynamic_models("20240105")
+    finally:
+        event.remove(in_memory_engine, "before_cursor_execute", record)
+
+    assert LogModel.__tablename__ == "log_20240105"
+    assert not [
+        statement
+        for statement in statements
+        if statement.startswith(("ALTER", "CREATE"))
+    ]
+    assert _index_names(in_memory_engine, "log_20240105") == set()
+
+
 def test_ensure_admin_user_creates_it_once(monkeypatch):
     engine = create_engine("sqlite:///:memory:")
     Base.metadata.create_all(engine)
@@ -135,3 +235,32 @@ def test_migrate_database_retries_transient_errors(monkeypatch):
 
     assert attempts == [1, 2, 3]
     assert delays == [1.0, 2.0]
+
+
+def test_table_catalog_caches_listing_until_ttl_or_table_creation():
+    from database.database import create_dynamic_tables
+    from database.table_catalog import TableCatalog, table_catalog
+
+    engine = create_engine("sqlite:///:memory:")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE user_20990101 (id INTEGER PRIMARY KEY)"))
+        conn.execute(text("CREATE TABLE log_20990101 (id INTEGER PRIMARY KEY)"))
+        conn.execute(text("CREATE TABLE user_20990102 (id INTEGER PRIMARY KEY)"))
+
+    catalog = TableCatalog(ttl=3600)
+    assert catalog.day_suffixes(engine) == ("20990101", "20990102")
+    assert catalog.day_suffixes(engine, complete=True) == ("20990101",)
+
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE log_20990102 (id INTEGER PRIMARY KEY)"))
+    assert not catalog.has_table(engine, "log_20990102")
+    catalog.invalidate(engine)
+    assert catalog.has_table(engine, "log_20990102")
+
+    assert TableCatalog(ttl=0).has_table(engine, "log_20990102")
+
+    # Tables created through create_dynamic_tables are recorded right away.
+    assert not table_catalog.has_table(engine, "user_20990103")
+    create_dynamic_tables(engine, date_suffix="20990103")
+    assert table_catalog.day_suffixes(engine, complete=True)[-1] == "20990103"
+    engine.dispose()
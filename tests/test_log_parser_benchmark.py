@@ -0,0 +1,133 @@
+"""
+Microbenchmark for the compiled access-log parser (parsers/log.py).
+
+Wall-clock ratios are unreliable on shared runners, so the benchmark only
+runs with ``SQUIDSTATS_BENCHMARKS=1``; the equivalence tests in
+test_parsers_log.py are the correctness gate.
+
+Both paths do the per-line work the importer needs: a record for the writer
+and the suffix of the daily table it goes to.  The legacy path is the one the
+importer used before: per-line format detection in ``parse_log_line``, a
+separate ``get_log_datetime`` call, ``strftime`` and ``compact_log_row``.
+"""
+
+import gc
+import os
+import time
+from datetime import datetime
+
+import pytest
+
+from parsers.log import (
+    FORMAT_DEFAULT,
+    STRATEGY_PIPE,
+    STRATEGY_QUOTED,
+    STRATEGY_SPACE,
+    _date_suffix,
+    compile_log_parser,
+    get_log_datetime,
+    parse_log_line,
+)
+from parsers.log_writer import compact_log_row
+
+LINE_COUNT = 2000
+ROUNDS = 15
+# A shared CI machine can slow one path for a whole measurement; measure again
+# before failing.
+ATTEMPTS = 3
+MIN_SPEEDUP = 3.0
+
+LINE_TEMPLATES = {
+    FORMAT_DEFAULT: (
+        "{timestamp:.3f} {index} 10.0.{subnet}.{host} TCP_MISS/200 {size} GET "
+        "http://site{site}.example/path/{index} user{user} "
+        "HIER_DIRECT/10.0.0.1 text/html\n"
+    ),
+    STRATEGY_PIPE: (
+        "{timestamp:.3f}|10.0.{subnet}.{host}|-|user{user}|-|GET|"
+        "http://site{site}.example/path/{index}|HTTP/1.1|200|{size}|-|-|"
+        "text/html|TCP_MISS/200\n"
+    ),
+    STRATEGY_QUOTED: (
+        "{timestamp:.3f} 10.0.{subnet}.{host} - user{user} "
+        "[16/Aug/2026:12:00:00 +0000] "
+        '"GET http://site{site}.example/path/{index} HTTP/1.1" 200 {size} '
+        "TCP_MISS:HIER_DIRECT\n"
+    ),
+    STRATEGY_SPACE: (
+        "{timestamp:.3f} 10.0.{subnet}.{host} - user{user} TCP_MISS/200 GET "
+        "http://site{site}.example/path/{index} HTTP/1.1 HIER_DIRECT 200 "
+        "{size} text/html\n"
+    ),
+}
+
+
+def _sample_lines(strategy: str) -> list[str]:
+    start = datetime(2026, 8, 16, 12, 0, 0).timestamp()
+    return [
+        LINE_TEMPLATES[strategy].format(
+            timestamp=start + index * 0.37,
+            index=index,
+            subnet=index % 7,
+            host=index % 250,
+            site=index % 40,
+            user=index % 30,
+            size=index * 13,
+        )
+        for index in range(LINE_COUNT)
+    ]
+
+
+def _legacy_parse(lines):
+    for line in lines:
+        log_data = parse_log_line(line)
+        log_datetime = get_log_datetime(line)
+        if log_data and log_datetime is not None:
+            log_datetime.strftime("%Y%m%d")
+            (log_datetime, *compact_log_row(log_data))
+
+
+def _best_time(function, *args) -> float:
+    # Like timeit, keep collections triggered by earlier tests out of the timing.
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        function(*args)
+        return time.perf_counter() - started
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+@pytest.mark.skipif(
+    not os.getenv("SQUIDSTATS_BENCHMARKS"),
+    reason="set SQUIDSTATS_BENCHMARKS=1 to run timing benchmarks",
+)
+@pytest.mark.parametrize("strategy", list(LINE_TEMPLATES))
+def test_compiled_parser_is_at_least_3x_faster(strategy):
+    lines = _sample_lines(strategy)
+    parse_record = compile_log_parser(strategy)
+    assert all(parse_record(line) for line in lines)
+
+    def compiled_parse(lines):
+        suffixes = {}
+        for line in lines:
+            record = parse_record(line)
+            if record is not None:
+                _date_suffix(record[0], suffixes)
+
+    # Interleave both paths and keep the best round of each, so a noisy
+    # neighbour slows both rather than skewing the ratio.
+    for _ in range(ATTEMPTS):
+        legacy = compiled = float("inf")
+        for _ in range(ROUNDS):
+            legacy = min(legacy, _best_time(_legacy_parse, lines))
+            compiled = min(compiled, _best_time(compiled_parse, lines))
+        if legacy / compiled >= MIN_SPEEDUP:
+            break
+
+    assert legacy / compiled >= MIN_SPEEDUP, (
+        f"{strategy}: legacy {legacy * 1e6 / LINE_COUNT:.2f}us/line, "
+        f"compiled {compiled * 1e6 / LINE_COUNT:.2f}us/line"
+    )
@@ -0,0 +1,80 @@
+"""Tests for the bounded ingestion pipeline (parsers/log_pipeline.py)."""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from parsers.log_pipeline import IngestPipeline
+
+
+def _slow_square(value):
+    # Later jobs often finish first.
+    time.sleep((value * 7 % 5) / 2000)
+    return value * value
+
+
+def test_results_keep_job_order_with_a_parser_pool():
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        pipeline = IngestPipeline(executor, _slow_square, depth=3)
+        results = list(pipeline.results((value,) for value in range(50)))
+
+    assert results == [value * value for value in range(50)]
+    assert pipeline.stats["jobs"] == 50
+    assert 1 <= pipeline.stats["max_queue_depth"] <= 3
+
+
+def test_slow_writer_applies_backpressure_to_the_reader():
+    submitted = 0
+    lock = threading.Lock()
+
+    def jobs():
+        nonlocal submitted
+        for value in range(30):
+            with lock:
+                submitted += 1
+            yield (value,)
+
+    ahead = []
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        pipeline = IngestPipeline(executor, lambda value: value, depth=4)
+        for consumed, _ in enumerate(pipeline.results(jobs()), start=1):
+            time.sleep(0.005)
+            with lock:
+                ahead.append(submitted - consumed)
+
+    # The queue holds at most 4 jobs and the reader one more it is submitting.
+    assert max(ahead) <= 5
+    assert pipeline.stats["reader_blocked_seconds"] > 0
+    assert pipeline.stats["max_ready"] >= 1
+
+
+def test_reader_errors_reach_the_writer():
+    def jobs():
+        yield (1,)
+        raise OSError("disk gone")
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pipeline = IngestPipeline(executor, lambda value: value, depth=2)
+        with pytest.raises(OSError, match="disk gone"):
+            list(pipeline.results(jobs()))
+
+
+def test_writer_failure_stops_the_reader():
+    def jobs():
+        value = 0
+        while True:
+            value += 1
+            yield (value,)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pipeline = IngestPipeline(executor, lambda value: value, depth=2)
+        with pytest.raises(RuntimeError):
+            for result in pipeline.results(jobs()):
+                if result == 5:
+                    raise RuntimeError("database down")
+
+    assert not any(
+        thread.name == "LogPipelineReader" for thread in threading.enumerate()
+    )
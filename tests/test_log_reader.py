@@ -0,0 +1,103 @@
+"""Tests for the binary access-log line reader."""
+
+import gzip
+import io
+
+from parsers.log_reader import decode_log_line, iter_log_blocks, iter_log_lines
+
+LINES = [
+    b"first line\n",
+    b"bad \xff\xfe bytes\n",
+    "usuario ñandú ✓\n".encode(),
+    b"\n",
+    b"partial",
+]
+DATA = b"".join(LINES)
+
+
+def _collect(file, **kwargs):
+    return [(bytes(line), end) for line, end in iter_log_lines(file, **kwargs)]
+
+
+def _expected(start_index=0, complete_only=False):
+    offset = sum(len(line) for line in LINES[:start_index])
+    result = []
+    for line in LINES[start_index:]:
+        if complete_only and not line.endswith(b"\n"):
+            break
+        offset += len(line)
+        result.append((line, offset))
+    return result
+
+
+def test_offsets_are_exact_byte_positions(tmp_path):
+    log_file = tmp_path / "access.log"
+    log_file.write_bytes(DATA)
+
+    with open(log_file, "rb") as file:
+        assert _collect(file) == _expected()
+
+
+def test_incomplete_last_line_is_left_for_next_read(tmp_path):
+    log_file = tmp_path / "access.log"
+    log_file.write_bytes(DATA)
+
+    with open(log_file, "rb") as file:
+        lines = _collect(file, complete_only=True)
+
+    assert lines == _expected(complete_only=True)
+    assert lines[-1][1] == len(DATA) - len(b"partial")
+
+
+def test_mmap_and_block_readers_agree(tmp_path):
+    log_file = tmp_path / "access.log"
+    log_file.write_bytes(DATA)
+    start = len(LINES[0])
+
+    for complete_only in (False, True):
+        with open(log_file, "rb") as file:
+            mapped = _collect(
+                file, start=start, complete_only=complete_only, use_mmap=True
+            )
+        with open(log_file, "rb") as file:
+            blocks = _collect(
+                file, start=start, complete_only=complete_only, use_mmap=False
+            )
+        assert mapped == blocks == _expected(1, complete_only)
+
+
+def test_end_limits_range_and_streams_skip_to_start(tmp_path):
+    log_file = tmp_path / "access.log.gz"
+    with gzip.open(log_file, "wb") as file:
+        file.write(DATA)
+    start = len(LINES[0])
+    end = start + len(LINES[1])
+
+    with gzip.open(log_file, "rb") as file:
+        assert _collect(file, start=start, end=end) == [(LINES[1], end)]
+    assert _collect(io.BytesIO(DATA), end=1) == [(LINES[0], len(LINES[0]))]
+
+
+def test_blocks_hold_whole_lines_with_end_offsets():
+    for block_size in (1, 5, 16, 1024):
+        for complete_only in (False, True):
+            expected = _expected(1, complete_only=complete_only)
+            blocks = list(
+                iter_log_blocks(
+                    io.BytesIO(DATA),
+                    start=len(LINES[0]),
+                    complete_only=complete_only,
+                    block_size=block_size,
+                )
+            )
+
+            assert b"".join(block for block, _ in blocks) == b"".join(
+                line for line, _ in expected
+            )
+            assert blocks[-1][1] == expected[-1][1]
+            assert all(block.endswith(b"\n") for block, _ in blocks[: len(blocks) - 1])
+            assert {end for _, end in blocks} <= {end for _, end in expected}
+
+
+def test_decode_replaces_invalid_utf8():
+    assert decode_log_line(memoryview(LINES[1])) == "bad �� bytes\n"
@@ -0,0 +1,196 @@
+"""
+Tests for the live access-log tailer (parsers/log_tailer.py).
+"""
+
+import os
+import time
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import database.database as db_module
+from database.database import Base, LogMetadata, get_dynamic_models
+from parsers.log_tailer import LogTailer
+from parsers.log_writer import daily_user_ids
+
+DAY = datetime(2026, 8, 20, 9, 0, 0)
+
+
+def _line(index: int, user: str = "user1") -> str:
+    return (
+        f"{DAY.timestamp() + index} 1 10.0.0.1 TCP_MISS/200 10 GET "
+        f"http://example.com/{index} {user} HIER_DIRECT/- -\n"
+    )
+
+
+def _urls(session) -> list[str]:
+    session.expire_all()
+    _, LogModel = get_dynamic_models("20260820")
+    return [row.url for row in session.query(LogModel).order_by(LogModel.id)]
+
+
+def _cursor(session):
+    session.expire_all()
+    metadata = session.query(LogMetadata).one()
+    return metadata.last_inode, metadata.last_position
+
+
+@pytest.fixture()
+def file_db(tmp_path):
+    """File-backed SQLite so the tailer thread and the test share data."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'tailer.db'}")
+    Base.metadata.create_all(engine)
+    old_engine = db_module._engine
+    old_session = db_module._Session
+    old_cache = db_module.dynamic_model_cache.copy()
+    db_module._engine = engine
+    db_module._Session = sessionmaker(bind=engine)
+    db_module.dynamic_model_cache.clear()
+    daily_user_ids.clear()
+    session = db_module._Session()
+    yield session
+    session.close()
+    db_module._engine = old_engine
+    db_module._Session = old_session
+    db_module.dynamic_model_cache = old_cache
+    daily_user_ids.clear()
+    engine.dispose()
+
+
+class TestLogTailerPoll:
+    def test_live_file_is_never_mapped(self, tmp_path, patched_db, monkeypatch):
+        import parsers.log_reader as log_reader
+
+        def fail(*args, **kwargs):
+            raise AssertionError("the live access.log must not be mmapped")
+
+        monkeypatch.setattr(log_reader, "MMAP_MIN_BYTES", 1)
+        monkeypatch.setattr(log_reader.mmap, "mmap", fail)
+        log_file = tmp_path / "access.log"
+        log_file.write_text(_line(0) + _line(1), encoding="utf-8")
+
+        LogTailer(str(log_file), flush_seconds=0).poll()
+        assert _urls(patched_db) == ["http://example.com/0", "http://example.com/1"]
+
+        # The one-shot tail of the live log streams it as well.
+        from parsers.log import process_logs
+
+        with open(log_file, "a", encoding="utf-8") as handle:
+            handle.write(_line(2))
+        process_logs(str(log_file))
+        assert _urls(patched_db)[-1] == "http://example.com/2"
+
+    def test_commits_rows_with_cursor_and_waits_for_partial_line(
+        self, tmp_path, patched_db
+    ):
+        log_file = tmp_path / "access.log"
+        partial = _line(2)
+        log_file.write_text(_line(0) + _line(1) + partial[:20], encoding="utf-8")
+        tailer = LogTailer(str(log_file), flush_seconds=0)
+
+        tailer.poll()
+
+        complete_bytes = len(_line(0)) + len(_line(1))
+        assert _urls(patched_db) == ["http://example.com/0", "http://example.com/1"]
+        assert _cursor(patched_db) == (os.stat(log_file).st_ino, complete_bytes)
+
+        with open(log_file, "a", encoding="utf-8") as handle:
+            handle.write(partial[20:] + _line(3))
+        tailer.poll()
+
+        assert _urls(patched_db)[2:] == ["http://example.com/2", "http://example.com/3"]
+        assert _cursor(patched_db)[1] == os.path.getsize(log_file)
+        snapshot = tailer.snapshot()
+        assert snapshot["rows_committed"] == 4
+        assert snapshot["backlog_bytes"] == 0
+        assert snapshot["lag_seconds"] is not None
+
+    def test_buffers_until_flush_interval(self, tmp_path, patched_db):
+        log_file = tmp_path / "access.log"
+        log_file.write_text(_line(0), encoding="utf-8")
+        tailer = LogTailer(str(log_file), flush_seconds=3600)
+
+        tailer.poll()
+        assert tailer.snapshot()["buffered_rows"] == 1
+        assert patched_db.query(LogMetadata).count() == 0
+
+        tailer._pending_since -= 3600
+        tailer.poll()
+        assert _urls(patched_db) == ["http://example.com/0"]
+
+    def test_full_batch_is_committed_with_its_cursor(self, tmp_path, patched_db):
+        log_file = tmp_path / "access.log"
+        log_file.write_text(_line(0) + _line(1) + _line(2), encoding="utf-8")
+        tailer = LogTailer(str(log_file), batch_size=3, flush_seconds=3600)
+
+        tailer.poll()
+
+        # 2 entries + 1 new user fill the batch before the third line.
+        assert _urls(patched_db) == ["http://example.com/0", "http://example.com/1"]
+        assert _cursor(patched_db)[1] == len(_line(0)) + len(_line(1))
+
+    def test_resumes_from_committed_cursor(self, tmp_path, patched_db):
+        log_file = tmp_path / "access.log"
+        log_file.write_text(_line(0), encoding="utf-8")
+        LogTailer(str(log_file), flush_seconds=0).poll()
+
+        with open(log_file, "a", encoding="utf-8") as handle:
+            handle.write(_line(1))
+        LogTailer(str(log_file), flush_seconds=0).poll()
+        assert _urls(patched_db) == ["http://example.com/0", "http://example.com/1"]
+
+        # The one-shot tail of the live log streams it as well.
+        from parsers.log import process_logs
+
+        with open(log_file, "a", encoding="utf-8") as handle:
+            handle.write(_line(2))
+        process_logs(str(log_file))
+        assert _urls(patched_db)[-1] == "http://example.com/2"
+
+    def test_follows_rotation_by_inode(self, tmp_path, patched_db):
+        log_file = tmp_path / "access.log"
+        log_file.write_text(_line(0), encoding="utf-8")
+        tailer = LogTailer(str(log_file), flush_seconds=0)
+        tailer.poll()
+
+        # Squid finishes its last line after the rename, then reopens the log.
+        rotated = tmp_path / "access.log.1"
+        os.rename(log_file, rotated)
+        with open(rotated, "a", encoding="utf-8") as handle:
+            handle.write(_line(1))
+        log_file.write_text(_line(2), encoding="utf-8")
+        tailer.poll()
+
+        assert _urls(patched_db) == [
+            f"http://example.com/{index}" for index in range(3)
+        ]
+        assert _cursor(patched_db) == (
+            os.stat(log_file).st_ino,
+            os.path.getsize(log_file),
+        )
+        assert tailer.snapshot()["rotations"] == 1
+
+
+def test_tailer_thread_ingests_appended_lines(tmp_path, file_db):
+    log_file = tmp_path / "access.log"
+    log_file.write_text(_line(0), encoding="utf-8")
+    # Create the day's tables up front so the test's own queries do not race
+    # the tailer thread creating them.
+    get_dynamic_models("20260820")
+    tailer = LogTailer(str(log_file), flush_seconds=0.05, poll_seconds=0.05)
+    tailer.start()
+    try:
+        with open(log_file, "a", encoding="utf-8") as handle:
+            handle.write(_line(1))
+
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline and len(_urls(file_db)) < 2:
+            time.sleep(0.05)
+
+        assert _urls(file_db) == ["http://example.com/0", "http://example.com/1"]
+        assert tailer.snapshot()["mode"] in ("inotify", "polling")
+    finally:
+        tailer.stop()
+    assert not tailer.is_alive()
@@ -104,6 +104,31 @@ class TestDynamicModels:
         assert result.ip == "192.168.1.1"
         session.close()
 
+    def test_model_registry_evicts_least_recently_used_day(self):
+        from database.model_registry import ModelRegistry
+
+        registry = ModelRegistry(maxsize=2)
+        registry["user_log_20260901"] = "first"
+        registry["user_log_20260902"] = "second"
+        assert registry["user_log_20260901"] == "first"
+
+        registry["user_log_20260903"] = "third"
+
+        assert list(registry) == ["user_log_20260901", "user_log_20260903"]
+        assert registry.get("user_log_20260902") is None
+        assert registry.copy().maxsize == 2
+
+    def test_logs_page_models_come_from_the_registry(self, patched_db):
+        from database.database import dynamic_model_cache, get_dynamic_models
+        from services.analytics.fetch_data_logs import get_dynamic_model
+
+        UserModel, LogModel = get_dynamic_models("20260901")
+
+        assert get_dynamic_model(patched_db, "user", "20260901") is UserModel
+        assert get_dynamic_model(patched_db, "log", "20260901") is LogModel
+        assert get_dynamic_model(patched_db, "log", "20260902") is None
+        assert "user_log_20260902" not in dynamic_model_cache
+
 
 class TestModelCRUD:
     """Test basic CRUD on static models."""
@@ -209,3 +234,50 @@ class TestModelCRUD:
 
         result = db_session.query(QuotaEvent).first()
         assert result.event_type == "user_quota_exceeded"
+
+
+class TestDayPartitions:
+    """DDL of the PostgreSQL day-partition storage backend."""
+
+    def test_parents_are_range_partitioned_by_created_at(self):
+        from sqlalchemy.dialects import postgresql
+        from sqlalchemy.schema import CreateTable
+
+        from database.partitions import access_log, access_user
+
+        for parent in (access_user, access_log):
+            ddl = str(CreateTable(parent).compile(dialect=postgresql.dialect()))
+            assert "PARTITION BY RANGE (created_at)" in ddl
+            assert f"nextval('{parent.name}_id_seq')" in ddl
+            assert "PRIMARY KEY" not in ddl
+
+    def test_partition_columns_match_daily_tables(self, in_memory_engine):
+        from database.partitions import access_log, access_user
+
+        DynamicUser, DynamicLog = create_dynamic_models(
+            in_memory_engine, "user_20260901", "log_20260901"
+        )
+        assert set(access_user.c.keys()) == set(DynamicUser.__table__.c.keys())
+        assert set(access_log.c.keys()) == set(DynamicLog.__table__.c.keys())
+
+    def test_partition_ddl_covers_one_day(self):
+        from database.partitions import partition_ddl
+
+        assert partition_ddl("log_20261231") == (
+            'CREATE TABLE IF NOT EXISTS "log_20261231" PARTITION OF access_log '
+            "(id DEFAULT nextval('access_log_id_seq'), PRIMARY KEY (id)) "
+            "FOR VALUES FROM ('2026-12-31') TO ('2027-01-01')"
+        )
+
+    def test_backend_is_postgresql_only(self, in_memory_engine, monkeypatch):
+        from sqlalchemy import create_engine
+
+        from config import Config
+        from database.partitions import partitioned_storage
+
+        postgres = create_engine("postgresql+psycopg2://squid@localhost/squidstats")
+        assert not partitioned_storage(postgres)
+
+        monkeypatch.setattr(Config, "DAILY_TABLE_BACKEND", "partitions")
+        assert partitioned_storage(postgres)
+        assert not partitioned_storage(in_memory_engine)
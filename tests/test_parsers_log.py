@@ -2,22 +2,49 @@
 Tests for log line parsers (parsers/log.py).
 """
 
+import bz2
+import gzip
+import os
 from datetime import datetime
 
+import pytest
+from sqlalchemy import inspect, text
+
+import parsers.log as parsers_log
+import parsers.log_writer as parsers_log_writer
 from database.database import get_dynamic_models
-from database.models.models import DeniedLog
+from database.models.models import (
+    DeniedLog,
+    create_dynamic_models,
+    ensure_dynamic_indexes,
+)
 from parsers.log import (
     FORMAT_AUTO,
     FORMAT_DEFAULT,
     FORMAT_DETAILED,
+    STRATEGY_PIPE,
+    STRATEGY_QUOTED,
+    STRATEGY_SPACE,
+    _ingest_log_file,
+    compile_log_parser,
+    detect_compression,
     detect_log_format,
+    detect_log_strategy,
     get_log_datetime,
+    get_log_parser,
+    import_log_directory,
     import_logs,
     parse_log_line,
     parse_log_line_default,
     parse_log_line_pipe_format,
     parse_log_line_space_format,
 )
+from parsers.log_writer import (
+    DailyUserIds,
+    LogBatchWriter,
+    compact_log_row,
+    daily_user_ids,
+)
 
 
 class TestParseLogLineDetailed:
@@ -183,6 +210,89 @@ class TestAutomaticFormatDetection:
         assert detect_log_format(log_file) == FORMAT_AUTO
 
 
+class TestCompiledParser:
+    LINES = {
+        FORMAT_DEFAULT: (
+            "1790000000.123 321 10.0.1.5 TCP_MISS/200 1234 GET "
+            "http://example.com/a user1 HIER_DIRECT/1.2.3.4 text/html\n"
+        ),
+        STRATEGY_PIPE: (
+            "1790000000.5|10.0.0.1|-|user1|-|post|http://example.com/b|"
+            "HTTP/1.1|403|55|-|-|text/html|TCP_DENIED/403\n"
+        ),
+        STRATEGY_QUOTED: (
+            "1790000000.2 10.1.1.1 ident - [17/Oct/2026:10:00:00 +0000] "
+            '"GET http://example.com/c HTTP/1.1" 200 99 TCP_MISS:HIER_DIRECT\n'
+        ),
+        STRATEGY_SPACE: (
+            "1790000000 10.2.2.1 - carol TCP_MISS/200 GET http://example.com/d "
+            "HTTP/1.1 HIER_DIRECT 200 10 text/html\n"
+        ),
+    }
+    REJECTED = (
+        "",
+        "garbage line\n",
+        "1790000000 1 10.0.0.1 TCP_MISS/200 1 GET cache_object://localhost/info "
+        "user1 HIER_NONE/- -\n",
+        "-5 1 10.0.0.1 TCP_MISS/200 1 GET http://example.com user1 HIER_NONE/- -\n",
+        "1790000000.5|10.0.0.1|-|-|-|GET|http://example.com/|HTTP/1.1|200|55|-|-|"
+        "-|TCP_MISS/200\n",
+    )
+
+    @staticmethod
+    def _legacy_record(line):
+        log_data = parse_log_line(line)
+        log_datetime = get_log_datetime(line)
+        if not log_data or log_datetime is None:
+            return None
+        return (log_datetime, *compact_log_row(log_data))
+
+    @pytest.mark.parametrize("strategy", list(LINES))
+    def test_records_match_legacy_parser(self, strategy):
+        line = self.LINES[strategy]
+
+        for compiled in (strategy, FORMAT_AUTO):
+            parse_record = compile_log_parser(compiled)
+            assert parse_record(line) == self._legacy_record(line)
+            for rejected in self.REJECTED:
+                assert parse_record(rejected) is None
+                assert self._legacy_record(rejected) is None
+
+    def test_record_fields(self):
+        record = compile_log_parser(STRATEGY_PIPE)(self.LINES[STRATEGY_PIPE])
+
+        assert record[1:] == (
+            "user1",
+            "10.0.0.1",
+            "http://example.com/b",
+            403,
+            55,
+            "POST",
+            "TCP_DENIED/403",
+            True,
+        )
+
+    def test_detailed_layout_is_detected(self, tmp_path):
+        log_file = tmp_path / "access.log"
+        log_file.write_text(self.LINES[STRATEGY_QUOTED] * 3, encoding="utf-8")
+
+        assert detect_log_strategy(log_file) == STRATEGY_QUOTED
+        assert detect_log_format(log_file) == FORMAT_DETAILED
+
+    def test_parser_is_reused_only_when_resuming(self, tmp_path):
+        log_file = tmp_path / "access.log"
+        log_file.write_text(self.LINES[FORMAT_DEFAULT], encoding="utf-8")
+        strategy, parse_record = get_log_parser(str(log_file))
+        assert strategy == FORMAT_DEFAULT
+
+        with open(log_file, "a", encoding="utf-8") as file:
+            file.write(self.LINES[STRATEGY_SPACE] * 5)
+        assert get_log_parser(str(log_file), start_position=10)[1] is parse_record
+
+        log_file.write_text(self.LINES[STRATEGY_SPACE], encoding="utf-8")
+        assert get_log_parser(str(log_file))[0] == STRATEGY_SPACE
+
+
 class TestLogImport:
     def test_log_datetime_comes_from_first_field(self):
         line = (
@@ -228,3 +338,314 @@ class TestLogImport:
             assert log.created_at.date().strftime("%Y%m%d") == suffix
 
         assert patched_db.query(DeniedLog).count() == 0
+
+    def test_small_batches_reuse_committed_user_ids(self, tmp_path, patched_db):
+        timestamp = datetime(2026, 8, 18, 9, 0, 0).timestamp()
+        lines = []
+        for index in range(7):
+            status = "TCP_DENIED/403" if index == 3 else "TCP_MISS/200"
+            lines.append(
+                f"{timestamp + index} 1 192.168.1.100 {status} 10 "
+                f"GET http://example.com/{index} user1 HIER_DIRECT/- text/html\n"
+            )
+        log_file = tmp_path / "access.log"
+        log_file.write_text("".join(lines), encoding="utf-8")
+
+        summary, position = _ingest_log_file(str(log_file), patched_db, batch_size=2)
+
+        assert position == log_file.stat().st_size
+        assert summary["inserted_logs"] == 6
+        assert summary["inserted_users"] == 1
+        assert summary["inserted_denied"] == 1
+        UserModel, LogModel = get_dynamic_models("20260818")
+        user = patched_db.query(UserModel).one()
+        logs = patched_db.query(LogModel).order_by(LogModel.id).all()
+        assert [log.user_id for log in logs] == [user.id] * 6
+        assert [log.url for log in logs][:3] == [
+            "http://example.com/0",
+            "http://example.com/1",
+            "http://example.com/2",
+        ]
+        assert logs[0].created_at == datetime(2026, 8, 18, 9, 0, 0)
+        assert patched_db.query(DeniedLog).one().response == 403
+
+    def test_import_tags_host_domain_and_blacklist(self, tmp_path, patched_db):
+        from database.models.models import BlacklistDomain
+        from services.analytics import blacklist_users
+
+        get_dynamic_models("20260819")
+        patched_db.add(BlacklistDomain(domain="ads.example.com", active=1))
+        patched_db.commit()
+        blacklist_users.invalidate_blacklist_cache()
+        blacklist_users.wait_for_blacklist_sync()
+        timestamp = datetime(2026, 8, 19, 9, 0, 0).timestamp()
+        log_file = tmp_path / "access.log"
+        log_file.write_text(
+            "".join(
+                f"{timestamp} 1 192.168.1.100 TCP_MISS/200 10 GET {url} user1 "
+                "HIER_DIRECT/- text/html\n"
+                for url in (
+                    "http://www.Example.com/a",
+                    "https://cdn.ads.example.com:8443/b.js",
+                    "ads.example.com:443",
+                )
+            ),
+            encoding="utf-8",
+        )
+
+        try:
+            _ingest_log_file(str(log_file), patched_db)
+            UserModel, LogModel = get_dynamic_models("20260819")
+            rows = patched_db.query(LogModel).order_by(LogModel.id).all()
+            assert [(r.host, r.domain, r.tld) for r in rows] == [
+                ("www.example.com", "example.com", "com"),
+                ("cdn.ads.example.com", "example.com", "com"),
+                ("ads.example.com", "example.com", "com"),
+            ]
+            result = blacklist_users.find_blacklisted_sites(patched_db)
+            assert result["pagination"]["total_requests"] == 2
+        finally:
+            blacklist_users.invalidate_blacklist_cache()
+            blacklist_users.wait_for_blacklist_sync()
+
+    def test_cursor_counts_raw_bytes_and_skips_partial_line(self, tmp_path, patched_db):
+        timestamp = datetime(2026, 8, 18, 10, 0, 0).timestamp()
+        complete = (
+            f"{timestamp} 1 192.168.1.100 TCP_MISS/200 10 GET ".encode()
+            + b"http://example.com/\xff\xfe\xc3\xb1 user1 HIER_DIRECT/- -\n"
+        )
+        partial = f"{timestamp + 1} 1 192.168.1.100 TCP_MISS/200 10 GET".encode()
+        log_file = tmp_path / "access.log"
+        log_file.write_bytes(complete + partial)
+
+        summary, position = _ingest_log_file(
+            str(log_file), patched_db, complete_lines_only=True
+        )
+
+        assert position == len(complete)
+        assert summary["processed_lines"] == 1
+        _, LogModel = get_dynamic_models("20260818")
+        assert (
+            patched_db.query(LogModel).one().url == "http://example.com/\ufffd\ufffdñ"
+        )
+
+    def test_parallel_import_matches_serial_user_order(
+        self, tmp_path, patched_db, monkeypatch
+    ):
+        monkeypatch.setattr(parsers_log, "PARALLEL_IMPORT_MIN_BYTES", 0)
+        monkeypatch.setattr(parsers_log, "PARALLEL_IMPORT_CHUNK_BYTES", 256)
+        timestamp = datetime(2026, 8, 19, 23, 59, 50).timestamp()
+        lines = [
+            f"{timestamp + index} 1 10.0.0.{index % 5} TCP_MISS/200 10 "
+            f"GET http://example.com/{index} user{index % 5} HIER_DIRECT/- -\n"
+            for index in range(40)
+        ]
+        log_file = tmp_path / "access.log.1"
+        log_file.write_text("".join(lines), encoding="utf-8")
+
+        summary = import_logs(str(log_file), workers=2)
+
+        assert summary["processed_lines"] == 40
+        assert summary["inserted_logs"] == 40
+        assert [item["date"] for item in summary["dates"]] == ["20260819", "20260820"]
+        assert sum(worker["lines"] for worker in summary["workers"]) == 40
+        for suffix in ("20260819", "20260820"):
+            UserModel, LogModel = get_dynamic_models(suffix)
+            users = patched_db.query(UserModel).order_by(UserModel.id).all()
+            logs = patched_db.query(LogModel).order_by(LogModel.id).all()
+            by_id = {user.id: user.username for user in users}
+            assert [by_id[log.user_id] for log in logs] == [
+                f"user{int(log.url.rsplit('/', 1)[1]) % 5}" for log in logs
+            ]
+            first_seen = list(dict.fromkeys(by_id[log.user_id] for log in logs))
+            assert [user.username for user in users] == first_seen
+
+    def test_aggregation_merges_hits_per_time_bucket(
+        self, tmp_path, patched_db, monkeypatch
+    ):
+        start = datetime(2026, 8, 22, 10, 0, 0).timestamp()
+        hits = [
+            (0, "http://a.example/", "TCP_MISS/200", 100),
+            (20.5, "http://a.example/", "TCP_MISS/200", 50),
+            (30, "http://a.example/", "TCP_MISS/304", 5),
+            (59.9, "http://a.example/", "TCP_MISS/200", 10),
+            (61, "http://a.example/", "TCP_MISS/200", 1),
+        ]
+        log_file = tmp_path / "access.log"
+        log_file.write_text(
+            "".join(
+                f"{start + offset} 1 10.0.0.1 {status} {size} GET {url} user1 "
+                "HIER_DIRECT/- -\n"
+                for offset, url, status, size in hits
+            ),
+            encoding="utf-8",
+        )
+        monkeypatch.setattr(parsers_log_writer, "AGGREGATION_BUCKET_SECONDS", 60)
+
+        summary, _ = _ingest_log_file(str(log_file), patched_db)
+
+        assert summary["parsed_lines"] == 5
+        assert summary["inserted_logs"] == 3
+        _, LogModel = get_dynamic_models("20260822")
+        rows = [
+            (log.response, log.request_count, log.data_transmitted, log.created_at)
+            for log in patched_db.query(LogModel).order_by(LogModel.id)
+        ]
+        assert rows == [
+            (200, 3, 160, datetime(2026, 8, 22, 10, 0, 0)),
+            (304, 1, 5, datetime(2026, 8, 22, 10, 0, 0)),
+            (200, 1, 1, datetime(2026, 8, 22, 10, 1, 0)),
+        ]
+
+
+class TestDailyUserIds:
+    def test_user_ids_survive_between_imports(self, tmp_path, patched_db):
+        timestamp = datetime(2026, 8, 21, 9, 0, 0).timestamp()
+        for index in range(2):
+            log_file = tmp_path / f"access.{index}.log"
+            log_file.write_text(
+                f"{timestamp + index} 1 10.0.0.1 TCP_MISS/200 10 "
+                f"GET http://example.com/{index} user1 HIER_DIRECT/- -\n",
+                encoding="utf-8",
+            )
+            summary, _ = _ingest_log_file(str(log_file), patched_db)
+            assert summary["inserted_users"] == (1 if index == 0 else 0)
+
+        UserModel, LogModel = get_dynamic_models("20260821")
+        user = patched_db.query(UserModel).one()
+        assert daily_user_ids.day(patched_db, "20260821", UserModel.__table__) == {
+            ("user1", "10.0.0.1"): user.id
+        }
+        assert {log.user_id for log in patched_db.query(LogModel)} == {user.id}
+
+    def test_conflicting_insert_reloads_the_day(self, patched_db):
+        UserModel, LogModel = get_dynamic_models("20260821")
+        writer = LogBatchWriter(patched_db)
+        # Cache the (empty) day, then let another writer commit the user.
+        assert writer.user_ids.day(patched_db, "20260821", UserModel.__table__) == {}
+        patched_db.add(UserModel(username="user1", ip="10.0.0.1"))
+        patched_db.commit()
+        user_id = patched_db.query(UserModel).one().id
+
+        writer.add_row(
+            "20260821",
+            datetime(2026, 8, 21, 9, 0, 0),
+            *compact_log_row(
+                {"username": "user1", "ip": "10.0.0.1", "url": "u", "response": 200}
+            ),
+        )
+        writer.flush()
+
+        assert patched_db.query(UserModel).count() == 1
+        assert patched_db.query(LogModel).one().user_id == user_id
+
+    def test_least_recently_used_day_is_evicted(self, patched_db):
+        user_ids = DailyUserIds(max_days=2)
+        tables = {
+            suffix: get_dynamic_models(suffix)[0].__table__
+            for suffix in ("20260821", "20260822", "20260823")
+        }
+        for suffix in ("20260821", "20260822", "20260821", "20260823"):
+            user_ids.day(patched_db, suffix, tables[suffix])
+
+        assert sorted(user_ids._days) == ["20260821", "20260823"]
+
+    def test_unique_index_is_added_to_existing_tables(self, in_memory_engine):
+        with in_memory_engine.begin() as connection:
+            connection.execute(
+                text(
+                    "CREATE TABLE user_20260101 (id INTEGER PRIMARY KEY, "
+                    "username VARCHAR(255) NOT NULL, ip VARCHAR(255) NOT NULL, "
+                    "created_at DATETIME)"
+                )
+            )
+        UserModel, _ = create_dynamic_models(
+            in_memory_engine, "user_20260101", "log_20260101"
+        )
+
+        indexes = inspect(in_memory_engine).get_indexes("user_20260101")
+        assert (["username", "ip"], 1) in [
+            (item["column_names"], item["unique"]) for item in indexes
+        ]
+
+    def test_duplicate_users_keep_the_table_without_index(self, in_memory_engine):
+        engine = in_memory_engine
+        with engine.begin() as connection:
+            connection.execute(
+                text(
+                    "CREATE TABLE user_20260102 (id INTEGER PRIMARY KEY, "
+                    "username VARCHAR(255) NOT NULL, ip VARCHAR(255) NOT NULL, "
+                    "created_at DATETIME)"
+                )
+            )
+            connection.execute(
+                text(
+                    "INSERT INTO user_20260102 (username, ip) "
+                    "VALUES ('u', '10.0.0.1'), ('u', '10.0.0.1')"
+                )
+            )
+        UserModel, _ = create_dynamic_models(
+            engine, "user_20260102", "log_20260102", ensure_indexes=False
+        )
+
+        assert ensure_dynamic_indexes(engine, UserModel.__table__) == [
+            "ix_user_20260102_ip"
+        ]
+        assert [
+            index["name"] for index in inspect(engine).get_indexes("user_20260102")
+        ] == ["ix_user_20260102_ip"]
+
+
+class TestCompressedLogs:
+    LINE = (
+        "{timestamp} 1 192.168.1.100 TCP_MISS/200 1234 "
+        "GET http://{host}/ user1 HIER_DIRECT/- text/html\n"
+    )
+
+    def _write(self, path, opener, day, host):
+        timestamp = datetime(2026, 8, day, 12, 0, 0).timestamp()
+        with opener(path, "wt", encoding="utf-8") as file:
+            file.write(self.LINE.format(timestamp=timestamp, host=host))
+
+    def test_compression_is_detected_from_magic_bytes(self, tmp_path):
+        gzip_file = tmp_path / "access.log.2"
+        bzip2_file = tmp_path / "access.log.3.gz"
+        plain_file = tmp_path / "access.log.gz"
+        self._write(gzip_file, gzip.open, 16, "gzip.example")
+        self._write(bzip2_file, bz2.open, 16, "bzip2.example")
+        self._write(plain_file, open, 16, "plain.example")
+
+        assert detect_compression(gzip_file) == "gzip"
+        assert detect_compression(bzip2_file) == "bzip2"
+        assert detect_compression(plain_file) is None
+        assert detect_log_format(gzip_file) == FORMAT_DEFAULT
+
+    def test_import_streams_gzip_archive(self, tmp_path, patched_db):
+        log_file = tmp_path / "access.log.1.gz"
+        self._write(log_file, gzip.open, 16, "first.example")
+
+        summary = import_logs(str(log_file))
+
+        assert summary["inserted_logs"] == 1
+        _, LogModel = get_dynamic_models("20260816")
+        assert patched_db.query(LogModel).one().url == "http://first.example/"
+
+    def test_directory_import_is_chronological(self, tmp_path, patched_db):
+        self._write(tmp_path / "access.log.2.gz", gzip.open, 16, "oldest.example")
+        self._write(tmp_path / "access.log.1", open, 17, "older.example")
+        self._write(tmp_path / "access.log", open, 18, "live.example")
+        (tmp_path / "cache.log").write_text("ignored\n", encoding="utf-8")
+
+        summary = import_log_directory(str(tmp_path))
+
+        assert [os.path.basename(item["file"]) for item in summary["files"]] == [
+            "access.log.2.gz",
+            "access.log.1",
+            "access.log",
+        ]
+        assert summary["inserted_logs"] == 3
+        assert [item["date"] for item in summary["dates"]] == [
+            "20260816",
+            "20260817",
+            "20260818",
+        ]
@@ -136,3 +136,939 @@ class TestLogsService:
         result = read_logs(["/no/such/file.log"], max_lines=10, debug=True)
         assert "/no/such/file.log" not in result  # key is basename
         assert result.get("file.log") == ["Log file not found"]
+
+
+class TestReportCounts:
+    """Reports count hits via request_count, so aggregated rows stay exact."""
+
+    def test_important_metrics_sum_request_counts(self, patched_db):
+        from database.database import get_dynamic_models
+        from services.analytics.get_reports import get_important_metrics
+
+        UserModel, LogModel = get_dynamic_models("20260822")
+        user = UserModel(username="user1", ip="10.0.0.1")
+        patched_db.add(user)
+        patched_db.flush()
+        patched_db.add_all(
+            [
+                LogModel(
+                    user_id=user.id, url="http://a/", response=200, request_count=3
+                ),
+                LogModel(
+                    user_id=user.id, url="http://a/", response=304, request_count=1
+                ),
+            ]
+        )
+        patched_db.commit()
+
+        metrics = get_important_metrics(patched_db, UserModel, LogModel)
+
+        assert metrics["top_users_by_activity"] == [
+            {"username": "user1", "total_visits": 4}
+        ]
+        assert metrics["top_pages"][0]["total_requests"] == 4
+        assert metrics["top_pages"][0]["unique_visits"] == 1
+        assert {
+            item["response_code"]: item["count"]
+            for item in metrics["http_response_distribution"]
+        } == {200: 3, 304: 1}
+
+    def test_country_chart_sums_tld_column(self, patched_db):
+        from database.database import get_dynamic_models
+        from services.analytics.get_reports import get_important_metrics
+
+        UserModel, LogModel = get_dynamic_models("20260824")
+        user = UserModel(username="user1", ip="10.0.0.1")
+        patched_db.add(user)
+        patched_db.flush()
+        patched_db.add_all(
+            LogModel(
+                user_id=user.id, url=url, tld=tld, response=200, request_count=count
+            )
+            for url, tld, count in [
+                ("https://news.example.cu/", "cu", 5),
+                ("http://x.bbc.co.uk/", "uk", 2),
+                # Imported before the tld column: bucketed by URL.
+                ("http://example.org/", None, 4),
+                ("10.0.0.5:443", None, 1),
+            ]
+        )
+        patched_db.commit()
+
+        metrics = get_important_metrics(patched_db, UserModel, LogModel)
+
+        assert {
+            item["country"]: item["total_requests"]
+            for item in metrics["top_countries_by_visits"]
+        } == {"CU": 5, "UK": 2, "Global": 4, "Otros": 1}
+
+
+class TestReportRollups:
+    """Closed days are served from the rollup tables while they are current."""
+
+    DAY = "20260823"
+
+    def _fill(self, session):
+        from database.database import get_dynamic_models
+
+        UserModel, LogModel = get_dynamic_models(self.DAY)
+        users = [
+            UserModel(username="ana", ip="10.0.0.1"),
+            UserModel(username="luis", ip="10.0.0.1"),
+            UserModel(username="eva", ip="10.0.0.2"),
+        ]
+        session.add_all(users)
+        session.flush()
+        ana, luis, eva = (user.id for user in users)
+        session.add_all(
+            LogModel(
+                user_id=user_id,
+                url=url,
+                response=response,
+                request_count=count,
+                data_transmitted=size,
+            )
+            for user_id, url, response, count, size in [
+                (ana, "https://news.example.cu/a", 200, 5, 100),
+                (ana, "https://news.example.cu/b", 200, 2, 7000),
+                (luis, "https://news.example.cu/a", 304, 1, 10),
+                (luis, "shop.example.com:443", 200, 3, 900),
+                (eva, "http://example.org/", 403, 4, 50),
+            ]
+        )
+        session.commit()
+        return UserModel, LogModel
+
+    def test_rollup_matches_live_metrics(self, patched_db, monkeypatch):
+        from datetime import date
+
+        from config import Config
+        from services.analytics.fetch_data_logs import get_metrics_for_date
+        from services.analytics.get_reports import get_important_metrics
+        from services.analytics.rollups import build_daily_rollup
+
+        UserModel, LogModel = self._fill(patched_db)
+        monkeypatch.setattr(Config, "REPORT_ROLLUPS_ENABLED", False)
+        live = get_important_metrics(patched_db, UserModel, LogModel)
+        live_dashboard = get_metrics_for_date(date(2026, 8, 23))
+
+        assert build_daily_rollup(patched_db, date(2026, 8, 23))
+        monkeypatch.setattr(Config, "REPORT_ROLLUPS_ENABLED", True)
+        rolled = get_important_metrics(patched_db, UserModel, LogModel)
+        rolled_dashboard = get_metrics_for_date(date(2026, 8, 23))
+
+        for key in (
+            "total_stats",
+            "top_users_by_activity",
+            "top_users_by_data_transferred",
+            "top_pages",
+            "top_pages_by_data",
+            "top_countries_by_visits",
+            "http_response_distribution",
+        ):
+            assert rolled[key] == live[key], key
+        assert [
+            (item["ip"], item["user_count"]) for item in rolled["users_per_ip"]
+        ] == [("10.0.0.1", 2)]
+        # GROUP_CONCAT separators differ between databases.
+        for metrics in (rolled_dashboard, live_dashboard):
+            for item in metrics["users_per_ip"]:
+                item["usernames"] = item["usernames"].replace(" ", "")
+        assert rolled_dashboard == live_dashboard
+
+    def test_stale_or_current_day_is_computed_live(self, patched_db):
+        from datetime import date
+
+        from database.models.models import RollupDay
+        from services.analytics.rollups import (
+            build_daily_rollup,
+            load_daily_rollup,
+            rollup_closed_days,
+        )
+
+        UserModel, LogModel = self._fill(patched_db)
+        day = date(2026, 8, 23)
+        assert build_daily_rollup(patched_db, day)
+        assert (
+            load_daily_rollup(patched_db, UserModel, LogModel)["totals"][
+                "total_requests"
+            ]
+            == 15
+        )
+
+        patched_db.add(LogModel(user_id=1, url="http://late/", response=200))
+        patched_db.commit()
+        assert load_daily_rollup(patched_db, UserModel, LogModel) is None
+
+        assert rollup_closed_days(today=date(2026, 8, 24)) == [day]
+        assert rollup_closed_days(today=date(2026, 8, 24)) == []
+        patched_db.expire_all()
+        assert patched_db.query(RollupDay).one().total_requests == 16
+
+        # The day is still open: never served from its rollup.
+        assert load_daily_rollup(patched_db, UserModel, LogModel) is not None
+        rollup_closed_days(today=day)
+        with patch("services.analytics.rollups.date") as fake_date:
+            fake_date.today.return_value = day
+            assert load_daily_rollup(patched_db, UserModel, LogModel) is None
+
+
+class TestAuditRangeQueries:
+    """Multi-day audits run as one UNION ALL query over the daily tables."""
+
+    DAYS = ("20260901", "20260902", "20260903")
+
+    def _fill(self, session):
+        from database.database import get_dynamic_models
+
+        # Create every day's tables before inserting: the DDL would otherwise
+        # end the session's open transaction on the shared in-memory DB.
+        models = [get_dynamic_models(day) for day in self.DAYS]
+        for index, (UserModel, LogModel) in enumerate(models, start=1):
+            users = [
+                UserModel(username="ana", ip="10.0.0.1"),
+                UserModel(username="luis", ip="10.0.0.2"),
+                UserModel(username="-", ip="10.0.0.3"),
+            ]
+            session.add_all(users)
+            session.flush()
+            ana, luis, anonymous = (user.id for user in users)
+            session.add_all(
+                LogModel(
+                    user_id=user_id,
+                    url=url,
+                    response=response,
+                    request_count=count,
+                    data_transmitted=size,
+                )
+                for user_id, url, response, count, size in [
+                    (ana, "https://news.example.cu/a", 200, index, 1000 * index),
+                    (luis, "https://video.example.com/v", 200, 1, 5000),
+                    (luis, "http://blocked.example.org/", 403, 2, 10),
+                    (anonymous, "https://news.example.cu/a", 200, 9, 99999),
+                ]
+            )
+        session.commit()
+
+    def test_top_n_spans_every_day(self, patched_db):
+        from services.analytics import auditoria_service as audit
+
+        self._fill(patched_db)
+
+        by_requests = audit.get_top_users_by_requests(
+            patched_db, "2026-09-01", "2026-09-03"
+        )
+        assert by_requests["top_users_requests"] == [
+            {"username": "luis", "total_requests": 9},
+            {"username": "ana", "total_requests": 6},
+        ]
+
+        top_ips = audit.get_top_ips_by_data(patched_db, "2026-09-01", "2026-09-02", 1)
+        assert [row["ip"] for row in top_ips["top_ips"]] == ["10.0.0.3"]
+
+        totals = audit.get_total_data_consumed(patched_db, "2026-08-30", "2026-09-03")
+        assert totals["tables_processed"] == 3
+        assert totals["total_requests"] == 6 + 3 + 6 + 27
+        assert totals["total_data_bytes"] == 6000 + 15000 + 30 + 299997
+
+        assert audit.get_all_usernames(patched_db) == ["ana", "luis"]
+
+    def test_find_results_keep_per_day_rows(self, patched_db):
+        from services.analytics import auditoria_service as audit
+
+        self._fill(patched_db)
+
+        found = audit.find_by_keyword(
+            patched_db, "2026-09-01", "2026-09-03", "news", username="ana"
+        )["results"]
+        assert [(row["log_date"], row["access_count"]) for row in found] == [
+            ("20260903", 3),
+            ("20260902", 2),
+            ("20260901", 1),
+        ]
+
+        denied = audit.find_denied_access(patched_db, "2026-09-02", "2026-09-03")
+        assert [row["log_date"] for row in denied["results"]] == [
+            "20260903",
+            "20260902",
+        ]
+
+        summary = audit.get_user_activity_summary(
+            patched_db, "luis", "2026-09-01", "2026-09-03"
+        )
+        assert summary["total_requests"] == 9
+        assert summary["top_domains"][0] == {
+            "domain": "blocked.example.org",
+            "count": 6,
+        }
+
+    def test_searches_skip_a_day_with_a_broken_schema(self, patched_db):
+        from sqlalchemy import text
+
+        from database.table_catalog import table_catalog
+        from services.analytics import auditoria_service as audit
+
+        self._fill(patched_db)
+        # A day left behind by an old release, without request_count.
+        patched_db.execute(
+            text(
+                "CREATE TABLE user_20260904 (id INTEGER PRIMARY KEY, "
+                "username VARCHAR(255), ip VARCHAR(255), created_at DATETIME)"
+            )
+        )
+        patched_db.execute(
+            text(
+                "CREATE TABLE log_20260904 (id INTEGER PRIMARY KEY, user_id INTEGER, "
+                "url TEXT, response INTEGER, data_transmitted BIGINT, "
+                "created_at DATETIME)"
+            )
+        )
+        patched_db.commit()
+        table_catalog.invalidate()
+
+        found = audit.find_by_keyword(
+            patched_db, "2026-09-01", "2026-09-04", "news", username="ana"
+        )["results"]
+        assert [row["log_date"] for row in found] == [
+            "20260903",
+            "20260902",
+            "20260901",
+        ]
+        denied = audit.find_denied_access(patched_db, "2026-09-01", "2026-09-04")
+        assert len(denied["results"]) == 3
+
+    def test_social_media_matches_tagged_and_untagged_rows(self, patched_db):
+        from database.database import get_dynamic_models
+        from services.analytics import auditoria_service as audit
+
+        UserModel, LogModel = get_dynamic_models("20260904")
+        user = UserModel(username="eva", ip="10.0.0.4")
+        patched_db.add(user)
+        patched_db.flush()
+        patched_db.add_all(
+            LogModel(user_id=user.id, url=url, response=200, host=host, domain=domain)
+            for url, host, domain in [
+                ("https://m.youtube.com/watch", "m.youtube.com", "youtube.com"),
+                ("https://yt3.ggpht.com/a.jpg", "yt3.ggpht.com", "ggpht.com"),
+                ("https://lh3.ggpht.com/b.jpg", "lh3.ggpht.com", "ggpht.com"),
+                ("https://notyoutube.com/", "notyoutube.com", "notyoutube.com"),
+                # Imported before log rows carried their host.
+                ("https://www.youtube.com/old", None, None),
+            ]
+        )
+        patched_db.commit()
+
+        found = audit.find_social_media_activity(
+            patched_db, "2026-09-04", "2026-09-04", ["YouTube"]
+        )["results"]
+        assert sorted(row["url"] for row in found) == [
+            "https://m.youtube.com/watch",
+            "https://www.youtube.com/old",
+            "https://yt3.ggpht.com/a.jpg",
+        ]
+
+    def test_long_ranges_are_chunked(self, patched_db, monkeypatch):
+        from services.analytics import auditoria_service as audit
+        from services.analytics import range_query
+
+        self._fill(patched_db)
+        monkeypatch.setattr(range_query, "UNION_CHUNK_SIZE", 2)
+
+        top = audit.get_top_urls_by_data(patched_db, "2026-09-01", "2026-09-03", 1)
+        assert top["top_urls"][0]["url"] == "https://news.example.cu/a"
+        assert audit.get_all_usernames(patched_db) == ["ana", "luis"]
+
+
+class TestDayExecutor:
+    """Per-day partials run on a bounded pool and merge associatively."""
+
+    def _file_session(self, tmp_path):
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+
+        engine = create_engine(f"sqlite:///{tmp_path / 'days.db'}")
+        return sessionmaker(bind=engine)()
+
+    def test_days_run_on_worker_sessions(self, tmp_path, monkeypatch):
+        import threading
+        from collections import Counter
+
+        from sqlalchemy import text
+
+        from config import Config
+        from services.analytics.day_executor import add_counts, run_days
+
+        monkeypatch.setattr(Config, "REPORT_DAY_WORKERS", 3)
+        db = self._file_session(tmp_path)
+        threads = set()
+
+        def work(session, suffix):
+            assert session is not db
+            threads.add(threading.get_ident())
+            if suffix == "20260903":
+                raise RuntimeError("broken day")
+            return Counter(days=session.execute(text("SELECT 1")).scalar())
+
+        suffixes = ["20260901", "20260902", "20260903", "20260904"]
+        totals = run_days(db, suffixes, work, add_counts, Counter())
+
+        assert totals == Counter(days=3)
+        assert threading.get_ident() not in threads
+        db.close()
+
+    def test_deadline_cancels_pending_days(self, tmp_path, monkeypatch):
+        import time
+        from collections import Counter
+
+        import pytest
+
+        from config import Config
+        from services.analytics.day_executor import (
+            DayQueryCancelled,
+            add_counts,
+            run_days,
+        )
+
+        monkeypatch.setattr(Config, "REPORT_DAY_WORKERS", 2)
+        db = self._file_session(tmp_path)
+        started = []
+
+        def work(session, suffix):
+            started.append(suffix)
+            time.sleep(0.2)
+            return Counter(days=1)
+
+        began = time.monotonic()
+        with pytest.raises(DayQueryCancelled):
+            run_days(
+                db,
+                [f"202609{day:02d}" for day in range(1, 21)],
+                work,
+                add_counts,
+                Counter(),
+                timeout=0.1,
+            )
+
+        assert time.monotonic() - began < 1
+        time.sleep(0.3)
+        assert len(started) <= 4
+        db.close()
+
+    def test_metrics_by_date_range_sums_days(self, patched_db):
+        from services.analytics.get_reports import get_metrics_by_date_range
+
+        TestAuditRangeQueries()._fill(patched_db)
+
+        metrics = get_metrics_by_date_range("20260901", "20260903", patched_db)
+
+        assert metrics["total_stats"]["total_requests"] == 42
+        assert metrics["top_users_by_activity"][0] == {
+            "username": "-",
+            "total_visits": 27,
+        }
+        assert metrics["top_pages"][0]["url"] == "https://news.example.cu/a"
+        assert metrics["top_pages"][0]["total_requests"] == 33
+        assert metrics["http_response_distribution"] == [
+            {"response_code": 200, "count": 36},
+            {"response_code": 403, "count": 6},
+        ]
+
+    def _fill_two_days(self, session):
+        from database.database import get_dynamic_models
+
+        models = [get_dynamic_models(day) for day in ("20260910", "20260911")]
+        for (UserModel, LogModel), other in zip(models, ("x", "y"), strict=True):
+            ana = UserModel(username="ana", ip="10.0.0.1")
+            busy = UserModel(username=other, ip="10.0.0.2")
+            session.add_all([ana, busy])
+            session.flush()
+            session.add_all(
+                [
+                    LogModel(
+                        user_id=busy.id,
+                        url=f"https://{other}.example.cu/",
+                        response=200,
+                        request_count=10,
+                        data_transmitted=100,
+                    ),
+                    LogModel(
+                        user_id=ana.id,
+                        url="https://news.example.cu/a",
+                        response=200,
+                        request_count=6,
+                        data_transmitted=80,
+                    ),
+                ]
+            )
+        session.commit()
+
+    def test_metrics_by_date_range_rank_after_merging_days(self, patched_db):
+        from services.analytics.get_reports import get_metrics_by_date_range
+
+        self._fill_two_days(patched_db)
+
+        metrics = get_metrics_by_date_range("20260910", "20260911", patched_db, limit=1)
+
+        # ana never tops a single day but does over both.
+        assert metrics["top_users_by_activity"] == [
+            {"username": "ana", "total_visits": 12}
+        ]
+        assert metrics["top_pages"] == [
+            {
+                "url": "https://news.example.cu/a",
+                "total_requests": 12,
+                "unique_visits": 1,
+                "total_data_bytes": 160,
+            }
+        ]
+        assert metrics["users_per_ip"] == [
+            {"ip": "10.0.0.2", "user_count": 2, "usernames": "x,y"}
+        ]
+        assert metrics["total_stats"]["total_users"] == 3
+
+    def test_metrics_by_date_range_skip_a_broken_day(self, patched_db):
+        from sqlalchemy import text
+
+        from database.table_catalog import table_catalog
+        from services.analytics.get_reports import get_metrics_by_date_range
+
+        self._fill_two_days(patched_db)
+        patched_db.execute(
+            text("CREATE TABLE user_20260912 (id INTEGER PRIMARY KEY, username TEXT)")
+        )
+        patched_db.execute(
+            text("CREATE TABLE log_20260912 (id INTEGER PRIMARY KEY, user_id INTEGER)")
+        )
+        patched_db.commit()
+        table_catalog.invalidate()
+
+        metrics = get_metrics_by_date_range("20260910", "20260912", patched_db)
+
+        assert metrics["total_stats"]["total_requests"] == 32
+        assert metrics["top_users_by_activity"][0] == {
+            "username": "ana",
+            "total_visits": 12,
+        }
+
+    def test_top_totals_fall_back_to_per_day_queries(self, patched_db):
+        from sqlalchemy import text
+
+        from database.table_catalog import table_catalog
+        from services.analytics import auditoria_service as audit
+
+        TestAuditRangeQueries()._fill(patched_db)
+        # An old day whose log table predates the data_transmitted column.
+        patched_db.execute(
+            text("CREATE TABLE user_20260904 (id INTEGER PRIMARY KEY, username TEXT)")
+        )
+        patched_db.execute(
+            text("CREATE TABLE log_20260904 (id INTEGER PRIMARY KEY, user_id INTEGER)")
+        )
+        patched_db.commit()
+        table_catalog.invalidate()
+
+        top = audit.get_top_users_by_data(patched_db, "2026-09-01", "2026-09-04", 1)
+
+        assert top["top_users"] == [{"username": "luis", "total_data_gb": 0.0}]
+
+
+class TestTimeWindow:
+    """Hour windows only touch the day tables they overlap."""
+
+    def test_days_in_window_bounds(self, patched_db):
+        from datetime import datetime
+
+        from database.database import get_dynamic_models
+        from services.analytics.range_query import days_in_window, window_filter
+
+        for day in ("20260901", "20260902", "20260903", "20260904"):
+            get_dynamic_models(day)
+
+        assert days_in_window(
+            patched_db, datetime(2026, 9, 1, 23), datetime(2026, 9, 3, 1)
+        ) == ["20260901", "20260902", "20260903"]
+        # Ending exactly at midnight does not reach into the next day.
+        assert days_in_window(
+            patched_db, datetime(2026, 9, 2, 12), datetime(2026, 9, 4)
+        ) == ["20260902", "20260903"]
+        assert (
+            days_in_window(patched_db, datetime(2026, 9, 3), datetime(2026, 9, 3)) == []
+        )
+
+        _, log = get_dynamic_models("20260902")
+        since, until = datetime(2026, 9, 1, 23), datetime(2026, 9, 3, 1)
+        assert window_filter(log.__table__, "20260902", since, until) == []
+        assert len(window_filter(log.__table__, "20260901", since, until)) == 1
+        assert len(window_filter(log.__table__, "20260903", since, until)) == 1
+
+    def test_select_window_counts_rows_inside_it(self, patched_db):
+        from datetime import datetime
+
+        from sqlalchemy import func, select
+
+        from database.database import get_dynamic_models
+        from services.analytics.range_query import select_window
+
+        models = {day: get_dynamic_models(day) for day in ("20260901", "20260902")}
+        for day, (UserModel, LogModel) in models.items():
+            user = UserModel(username="ana", ip="10.0.0.1")
+            patched_db.add(user)
+            patched_db.flush()
+            stamp = datetime.strptime(day, "%Y%m%d")
+            patched_db.add_all(
+                LogModel(
+                    user_id=user.id,
+                    url="http://example.org/",
+                    response=200,
+                    request_count=1,
+                    data_transmitted=10,
+                    created_at=stamp.replace(hour=hour),
+                )
+                for hour in (1, 12, 23)
+            )
+        patched_db.commit()
+
+        days = select_window(
+            patched_db,
+            datetime(2026, 9, 1, 12),
+            lambda user, log, suffix: select(
+                func.sum(log.c.request_count).label("requests")
+            ),
+            until=datetime(2026, 9, 2, 12),
+        )
+
+        assert patched_db.execute(select(func.sum(days.c.requests))).scalar() == 3
+
+
+class TestRetention:
+    """Expired daily tables are dropped whole; shared tables are chunk-deleted."""
+
+    def test_delete_in_chunks_removes_matching_rows(self, patched_db):
+        from datetime import datetime
+
+        from database.models.models import DeniedLog
+        from services.database.retention_service import delete_in_chunks
+
+        patched_db.add_all(
+            DeniedLog(
+                username="ana",
+                ip="10.0.0.1",
+                url=f"http://blocked.example.org/{index}",
+                method="GET",
+                status="TCP_DENIED/403",
+                response=403,
+                data_transmitted=10,
+                created_at=datetime(2026, 9, 1 + index % 2),
+            )
+            for index in range(25)
+        )
+        patched_db.commit()
+
+        deleted = delete_in_chunks(
+            patched_db,
+            DeniedLog,
+            DeniedLog.created_at < datetime(2026, 9, 2),
+            chunk=4,
+        )
+
+        assert deleted == 13
+        assert patched_db.query(DeniedLog).count() == 12
+
+    def test_delete_oldest_denied_logs_goes_by_created_at(self, patched_db):
+        from datetime import datetime
+
+        from database.models.models import DeniedLog
+        from services.database.retention_service import delete_oldest_denied_logs
+
+        def denied(day):
+            return DeniedLog(
+                username="ana",
+                ip="10.0.0.1",
+                url="http://blocked.example.org/",
+                method="GET",
+                status="TCP_DENIED/403",
+                created_at=datetime(2026, 9, day),
+            )
+
+        # Live rows first, then an imported archive of older days.
+        patched_db.add_all(denied(day) for day in (10, 11, 12))
+        patched_db.commit()
+        patched_db.add_all(denied(day) for day in (1, 2))
+        patched_db.commit()
+
+        deleted = delete_oldest_denied_logs(patched_db, 3, chunk=2)
+
+        assert deleted == 3
+        assert [row.created_at.day for row in patched_db.query(DeniedLog)] == [
+            11,
+            12,
+        ]
+
+    def test_expire_daily_tables_archives_and_drops_days(self, patched_db, tmp_path):
+        import csv
+        import gzip
+        from datetime import date
+
+        from database.database import dynamic_model_cache, table_exists
+        from services.database.retention_service import expire_daily_tables
+
+        TestAuditRangeQueries()._fill(patched_db)
+
+        expired = expire_daily_tables(patched_db, date(2026, 9, 3), tmp_path)
+
+        assert expired["days"] == ["20260901", "20260902"]
+        assert expired["archived"] == 2
+        engine = patched_db.get_bind()
+        assert not table_exists(engine, "log_20260901")
+        assert not table_exists(engine, "user_20260902")
+        assert table_exists(engine, "log_20260903")
+        assert "user_log_20260901" not in dynamic_model_cache
+
+        with gzip.open(tmp_path / "squidstats_20260901.csv.gz", "rt") as archive:
+            rows = list(csv.DictReader(archive))
+        assert len(rows) == 4
+        assert {row["username"] for row in rows} == {"ana", "luis", "-"}
+
+    def test_run_retention_records_the_run(self, patched_db, monkeypatch):
+        from datetime import date
+
+        from config import Config
+        from database.models.models import RetentionRun
+        from services.database.retention_service import (
+            get_retention_overview,
+            run_retention,
+        )
+
+        TestAuditRangeQueries()._fill(patched_db)
+        monkeypatch.setattr(Config, "RETENTION_LOG_DAYS", 2)
+        monkeypatch.setattr(Config, "RETENTION_ARCHIVE_DIR", "")
+
+        summary = run_retention(today=date(2026, 9, 3))
+
+        assert summary["days_dropped"] == 1
+        assert summary["archived_files"] == 0
+        assert summary["details"]["daily_tables"]["from"] == "20260901"
+        assert patched_db.query(RetentionRun).count() == 1
+        overview = get_retention_overview()
+        assert overview["settings"]["log_days"] == 2
+        assert overview["runs"][0]["days_dropped"] == 1
+
+
+class TestBlacklistMatcher:
+    """Blacklisted URLs are matched by host suffix, with no cap on the list."""
+
+    def test_matches_domains_subdomains_and_keywords(self):
+        from services.security.blacklist_matcher import BlacklistMatcher
+
+        matcher = BlacklistMatcher(
+            ["example.com", ".ads.net", "*.tracker.org", "casino"]
+        )
+
+        assert matcher.match_url("https://cdn.example.com/a.js") == "example.com"
+        assert matcher.match_url("ads.net:443") == "ads.net"
+        assert matcher.match_url("http://x.tracker.org/") == "tracker.org"
+        assert matcher.match_url("http://notexample.com/") is None
+        assert matcher.match_url("http://site.cu/?q=example.com") is None
+        assert matcher.match_url("http://online-casino.cu/") == "casino"
+
+    def test_blacklisted_sites_use_every_active_domain(self, patched_db):
+        from database.database import get_dynamic_models
+        from database.models.models import BlacklistDomain
+        from services.analytics import blacklist_users
+
+        UserModel, LogModel = get_dynamic_models("20260901")
+        patched_db.add_all(
+            BlacklistDomain(domain=f"blocked{index}.example.com", active=1)
+            for index in range(100)
+        )
+        user = UserModel(username="ana", ip="10.0.0.1")
+        patched_db.add(user)
+        patched_db.flush()
+        patched_db.add_all(
+            LogModel(user_id=user.id, url=url, response=200, request_count=count)
+            for url, count in [
+                ("https://blocked99.example.com/", 3),
+                ("https://www.blocked0.example.com/x", 2),
+                ("https://allowed.example.com/", 7),
+            ]
+        )
+        patched_db.commit()
+        blacklist_users.invalidate_blacklist_cache()
+        blacklist_users.wait_for_blacklist_sync()
+
+        result = blacklist_users.find_blacklisted_sites(patched_db)
+
+        assert result["pagination"]["total_requests"] == 5
+        assert {(row["domain"], row["count"]) for row in result["results"]} == {
+            ("example.com", 5)
+        }
+        blacklist_users.invalidate_blacklist_cache()
+        blacklist_users.wait_for_blacklist_sync()
+
+
+class TestBlacklistSummary:
+    """The blacklist page is served from a per-day summary kept incrementally."""
+
+    def _log(self, LogModel, user, host, count):
+        return LogModel(
+            user_id=user.id,
+            url=f"https://{host}/",
+            host=host,
+            domain=".".join(host.split(".")[-2:]),
+            response=200,
+            request_count=count,
+        )
+
+    def _hits(self, session):
+        from database.models.models import BlacklistHit
+
+        return {
+            (hit.day.isoformat(), hit.username, hit.host): hit.requests
+            for hit in session.query(BlacklistHit)
+        }
+
+    def test_refresh_counts_new_rows_only(self, patched_db):
+        from datetime import date
+
+        from database.database import get_dynamic_models
+        from database.models.models import BlacklistDomain
+        from services.analytics import blacklist_users
+        from services.analytics.blacklist_summary import refresh_blacklist_summary
+
+        OldUser, OldLog = get_dynamic_models("20260901")
+        TodayUser, TodayLog = get_dynamic_models("20260903")
+        patched_db.add(BlacklistDomain(domain="ads.net", active=1))
+        old_user = OldUser(username="ana", ip="10.0.0.1")
+        today_user = TodayUser(username="ana", ip="10.0.0.1")
+        patched_db.add_all([old_user, today_user])
+        patched_db.flush()
+        patched_db.add_all(
+            [
+                self._log(OldLog, old_user, "x.ads.net", 2),
+                self._log(OldLog, old_user, "allowed.org", 9),
+                self._log(TodayLog, today_user, "ads.net", 1),
+            ]
+        )
+        patched_db.commit()
+        blacklist_users.invalidate_blacklist_cache()
+        blacklist_users.wait_for_blacklist_sync()
+
+        try:
+            built = refresh_blacklist_summary(patched_db, today=date(2026, 9, 3))
+            assert built == [date(2026, 9, 1), date(2026, 9, 3)]
+
+            patched_db.add_all(
+                [
+                    self._log(OldLog, old_user, "x.ads.net", 5),
+                    self._log(TodayLog, today_user, "ads.net", 3),
+                ]
+            )
+            patched_db.commit()
+            refreshed = refresh_blacklist_summary(patched_db, today=date(2026, 9, 3))
+
+            # The closed day waits for the nightly pass.
+            assert refreshed == [date(2026, 9, 3)]
+            assert self._hits(patched_db) == {
+                ("2026-09-01", "ana", "x.ads.net"): 2,
+                ("2026-09-03", "ana", "ads.net"): 4,
+            }
+            assert refresh_blacklist_summary(
+                patched_db, today=date(2026, 9, 3), closed_days=True
+            ) == [date(2026, 9, 1)]
+            assert self._hits(patched_db)[("2026-09-01", "ana", "x.ads.net")] == 7
+        finally:
+            blacklist_users.invalidate_blacklist_cache()
+            blacklist_users.wait_for_blacklist_sync()
+
+    def test_edits_recount_only_affected_domains(self, patched_db):
+        from datetime import date
+
+        from database.database import get_dynamic_models
+        from services.analytics.blacklist_summary import (
+            apply_blacklist_changes,
+            refresh_day,
+        )
+        from services.security.blacklist_matcher import BlacklistMatcher
+
+        UserModel, LogModel = get_dynamic_models("20260901")
+        user = UserModel(username="luis", ip="10.0.0.2")
+        patched_db.add(user)
+        patched_db.flush()
+        patched_db.add_all(
+            [
+                self._log(LogModel, user, "a.ads.net", 2),
+                self._log(LogModel, user, "b.ads.net", 3),
+                self._log(LogModel, user, "cdn.tracker.org", 4),
+            ]
+        )
+        patched_db.commit()
+        old = BlacklistMatcher(["a.ads.net", "tracker.org"])
+        refresh_day(patched_db, date(2026, 9, 1), UserModel, LogModel, old)
+
+        new = BlacklistMatcher(["ads.net", "tracker.org"])
+        assert apply_blacklist_changes(patched_db, old, new) == [date(2026, 9, 1)]
+        assert self._hits(patched_db) == {
+            ("2026-09-01", "luis", "a.ads.net"): 2,
+            ("2026-09-01", "luis", "b.ads.net"): 3,
+            ("2026-09-01", "luis", "cdn.tracker.org"): 4,
+        }
+
+        newer = BlacklistMatcher(["ads.net"])
+        assert apply_blacklist_changes(patched_db, new, newer) == [date(2026, 9, 1)]
+        assert ("2026-09-01", "luis", "cdn.tracker.org") not in self._hits(patched_db)
+        assert apply_blacklist_changes(patched_db, newer, newer) == []
+
+    def test_sync_diffs_with_the_recorded_entries(self, patched_db):
+        from datetime import date
+
+        from database.database import get_dynamic_models
+        from database.models.models import BlacklistDomain, BlacklistHitDay
+        from services.analytics import blacklist_users
+        from services.analytics.blacklist_summary import (
+            counted_matcher,
+            refresh_blacklist_summary,
+            sync_blacklist_summary,
+        )
+        from services.security.blacklist_matcher import invalidate_blacklist_matcher
+
+        UserModel, LogModel = get_dynamic_models("20260901")
+        patched_db.add(BlacklistDomain(domain="ads.net", active=1))
+        user = UserModel(username="eva", ip="10.0.0.4")
+        patched_db.add(user)
+        patched_db.flush()
+        patched_db.add_all(
+            [
+                self._log(LogModel, user, "a.ads.net", 2),
+                self._log(LogModel, user, "cdn.tracker.org", 4),
+            ]
+        )
+        patched_db.commit()
+        blacklist_users.invalidate_blacklist_cache()
+        blacklist_users.wait_for_blacklist_sync()
+
+        try:
+            refresh_blacklist_summary(patched_db, today=date(2026, 9, 1))
+            assert self._hits(patched_db) == {("2026-09-01", "eva", "a.ads.net"): 2}
+
+            # A restart forgets the matcher; the recorded entries remain.
+            invalidate_blacklist_matcher()
+            patched_db.add(BlacklistDomain(domain="tracker.org", active=1))
+            patched_db.commit()
+            assert sync_blacklist_summary(patched_db) == [date(2026, 9, 1)]
+            assert self._hits(patched_db) == {
+                ("2026-09-01", "eva", "a.ads.net"): 2,
+                ("2026-09-01", "eva", "cdn.tracker.org"): 4,
+            }
+            assert counted_matcher(patched_db).domains == {"ads.net", "tracker.org"}
+
+            # Keyword entries recount each day in place.
+            invalidate_blacklist_matcher()
+            patched_db.add(BlacklistDomain(domain="cdn", active=1))
+            patched_db.commit()
+            assert sync_blacklist_summary(patched_db) == [date(2026, 9, 1)]
+            assert patched_db.query(BlacklistHitDay).count() == 1
+            assert len(self._hits(patched_db)) == 2
+            assert sync_blacklist_summary(patched_db) == []
+        finally:
+            blacklist_users.invalidate_blacklist_cache()
+            blacklist_users.wait_for_blacklist_sync()
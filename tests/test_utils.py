@@ -8,6 +8,13 @@ from utils.colors import color_map
 from utils.filters import divide_filter, format_bytes_filter, strftime_filter
 from utils.size import size_to_bytes
 from utils.social_media import SOCIAL_MEDIA_DOMAINS
+from utils.url_parsing import (
+    PublicSuffixes,
+    host_info,
+    host_suffixes,
+    parent_domain,
+    url_host,
+)
 
 # ── utils/size.py ────────────────────────────────────────────────────────
 
@@ -137,3 +144,52 @@ class TestSocialMediaDomains:
                 assert domain == domain.lower(), (
                     f"{domain} in {platform} should be lowercase"
                 )
+
+
+# ── utils/url_parsing.py ─────────────────────────────────────────────────
+
+
+class TestUrlParsing:
+    @pytest.mark.parametrize(
+        "url,host",
+        [
+            ("https://Www.Example.com/path?q=1", "www.example.com"),
+            ("http://user:pw@example.com:8080/", "example.com"),
+            ("example.com:443", "example.com"),
+            ("http://[2001:db8::1]:80/", "2001:db8::1"),
+            ("http://example.com./", "example.com"),
+            ("", ""),
+        ],
+    )
+    def test_url_host(self, url, host):
+        assert url_host(url) == host
+
+    def test_parent_domain(self):
+        assert parent_domain("www.news.example.com") == "example.com"
+        assert parent_domain("news.bbc.co.uk") == "bbc.co.uk"
+        assert parent_domain("mail.empresa.com.cu") == "empresa.com.cu"
+        assert parent_domain("10.0.0.1") == "10.0.0.1"
+        assert parent_domain("localhost") == "localhost"
+        assert parent_domain("") == "unknown"
+
+    def test_host_info_is_cached_per_host(self):
+        host_info.cache_clear()
+        first = host_info("cdn.example.co.uk")
+        assert first == host_info("cdn.example.co.uk")
+        assert first.suffix == "co.uk"
+        assert not first.is_ip
+        assert host_info.cache_info().hits == 1
+
+    def test_public_suffix_rules(self):
+        rules = PublicSuffixes(["// comment", "uk", "co.uk", "*.ck", "!www.ck"])
+        assert rules.suffix("a.b.co.uk") == "co.uk"
+        assert rules.suffix("shop.any.ck") == "any.ck"
+        assert rules.suffix("www.ck") == "ck"
+        assert rules.suffix("example.org") == "org"
+
+    def test_host_suffixes(self):
+        assert list(host_suffixes("a.example.com")) == [
+            "a.example.com",
+            "example.com",
+            "com",
+        ]
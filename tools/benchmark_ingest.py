@@ -0,0 +1,542 @@
+#!/usr/bin/env python3
+"""
+Ingestion benchmark for the Squid access-log importer.
+
+Generates realistic synthetic access logs in the DEFAULT, pipe and quoted
+DETAILED formats and measures, per format and database:
+
+* ``parse``          - ``parse_log_line`` (and the compiled per-file parser)
+* ``import_logs``    - a full-file import
+* ``process_logs``   - the scheduler path, fed the same file in increments
+
+Each stage reports lines/sec, peak RSS and rows written.  Database stages run
+in a fresh process, so peak RSS and module-level caches are per stage.
+SQLite always runs; PostgreSQL and MySQL/MariaDB run when a URL is given or
+set in SQUIDSTATS_BENCH_POSTGRES_URL / SQUIDSTATS_BENCH_MYSQL_URL and the
+server is reachable.
+
+Server databases must be scratch databases: the benchmark drops the daily
+tables of its own (2001) dates and clears ``denied_logs`` rows of those dates
+and ``log_metadata`` before every stage.
+
+Usage:
+    python tools/benchmark_ingest.py [--lines 200000] [--formats default,pipe,quoted]
+        [--users 200] [--urls 5000] [--denied-ratio 0.05] [--days 1]
+        [--increments 10] [--workers 1] [--postgres-url URL] [--mysql-url URL]
+        [--json results.json]
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from multiprocessing import get_context
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+FORMATS = ("default", "pipe", "quoted")
+# Synthetic traffic is dated far away from real data so its daily tables
+# (user_2001MMDD / log_2001MMDD) can be dropped safely between stages.
+BENCHMARK_START = datetime(2001, 1, 1)
+
+METHODS = (("GET", 70), ("CONNECT", 20), ("POST", 8), ("HEAD", 2))
+ALLOWED = (
+    ("TCP_MISS", 200, 55),
+    ("TCP_TUNNEL", 200, 20),
+    ("TCP_HIT", 200, 10),
+    ("TCP_REFRESH_MODIFIED", 304, 8),
+    ("TCP_MISS", 404, 5),
+    ("TCP_MISS", 500, 2),
+)
+CONTENT_TYPES = ("text/html", "application/json", "image/png", "text/css", "-")
+TLDS = ("com", "net", "org", "cu", "es", "io", "co.uk")
+
+
+class LogGenerator:
+    """Deterministic synthetic Squid traffic.
+
+    User and URL popularity follow a Zipf-like distribution, response sizes
+    are log-normal and timestamps increase monotonically across ``days``.
+    """
+
+    def __init__(
+        self,
+        users: int = 200,
+        urls: int = 5000,
+        denied_ratio: float = 0.05,
+        days: int = 1,
+        seed: int = 2001,
+    ):
+        self.denied_ratio = min(max(denied_ratio, 0.0), 1.0)
+        self.days = max(1, days)
+        self.seed = seed
+        rng = random.Random(seed)  # noqa: S311 - synthetic data
+
+        self.users = [
+            (
+                f"user{index:04d}",
+                f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}",
+            )
+            for index in range(max(1, users))
+        ]
+        hosts = [
+            f"site{index}.example.{rng.choice(TLDS)}"
+            for index in range(max(1, urls // 10))
+        ]
+        self.urls = []
+        for index in range(max(1, urls)):
+            host = hosts[index % len(hosts)]
+            if index % 5 == 0:
+                self.urls.append(("CONNECT", f"{host}:443"))
+            else:
+                self.urls.append((None, f"http://{host}/page/{index}?q={index * 7}"))
+
+        self._user_weights = _zipf_weights(len(self.users), 1.1)
+        self._url_weights = _zipf_weights(len(self.urls), 1.2)
+
+    def lines(self, log_format: str, count: int):
+        """Yield ``count`` log lines of ``log_format``."""
+        render = {
+            "default": _render_default,
+            "pipe": _render_pipe,
+            "quoted": _render_quoted,
+        }[log_format]
+        rng = random.Random(f"{self.seed}-{log_format}")  # noqa: S311
+        users = rng.choices(self.users, cum_weights=self._user_weights, k=count)
+        urls = rng.choices(self.urls, cum_weights=self._url_weights, k=count)
+        start = BENCHMARK_START.timestamp()
+        step = self.days * 86400 / max(count, 1)
+        methods = [method for method, _ in METHODS]
+        method_weights = [weight for _, weight in METHODS]
+        allowed_weights = [weight for *_, weight in ALLOWED]
+
+        for index in range(count):
+            username, ip = users[index]
+            connect, url = urls[index]
+            method = connect or rng.choices(methods, method_weights)[0]
+            if method == "CONNECT" and connect is None:
+                method = "GET"
+            if rng.random() < self.denied_ratio:
+                code, status, size = "TCP_DENIED", 403, 3900 + rng.randrange(200)
+            else:
+                code, status, _ = rng.choices(ALLOWED, allowed_weights)[0]
+                size = int(rng.lognormvariate(8.5, 1.6))
+            yield render(
+                timestamp=start + index * step + rng.random() * step,
+                elapsed=rng.randrange(1, 2000),
+                ip=ip,
+                username=username,
+                method=method,
+                url=url,
+                code=code,
+                status=status,
+                size=size,
+                content_type=rng.choice(CONTENT_TYPES),
+            )
+
+    def write(self, path, log_format: str, count: int) -> int:
+        """Write a log file and return its size in bytes."""
+        with open(path, "w", encoding="utf-8") as file:
+            file.writelines(self.lines(log_format, count))
+        return os.path.getsize(path)
+
+
+def _zipf_weights(size: int, exponent: float) -> list[float]:
+    total = 0.0
+    cumulative = []
+    for rank in range(1, size + 1):
+        total += 1 / rank**exponent
+        cumulative.append(total)
+    return cumulative
+
+
+def _hierarchy(code: str) -> str:
+    return "HIER_NONE/-" if code == "TCP_DENIED" else "HIER_DIRECT/192.0.2.10"
+
+
+def _render_default(**fields) -> str:
+    return (
+        "{timestamp:.3f} {elapsed:6d} {ip} {code}/{status} {size} {method} {url} "
+        "{username} {hierarchy} {content_type}\n"
+    ).format(hierarchy=_hierarchy(fields["code"]), **fields)
+
+
+def _render_pipe(**fields) -> str:
+    return (
+        "{timestamp:.3f}|{ip}|-|{username}|-|{method}|{url}|HTTP/1.1|{status}|"
+        "{size}|-|Mozilla/5.0|{content_type}|{code}/{status}\n"
+    ).format(**fields)
+
+
+def _render_quoted(**fields) -> str:
+    request_time = datetime.fromtimestamp(fields["timestamp"])
+    return (
+        '{timestamp:.3f} {ip} - {username} [{request_time}] "{method} {url} '
+        'HTTP/1.1" {status} {size} {code}:{hierarchy}\n'
+    ).format(
+        request_time=request_time.strftime("%d/%b/%Y:%H:%M:%S +0000"),
+        hierarchy=_hierarchy(fields["code"]).split("/")[0],
+        **fields,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Stages
+# ---------------------------------------------------------------------------
+
+
+def _peak_rss_mb() -> float:
+    """Peak RSS of this process or any finished child (Linux reports KiB)."""
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    return round(peak / 1024, 1)
+
+
+def _quiet_logging() -> None:
+    from loguru import logger
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+
+def run_parse_stage(log_path) -> dict:
+    """Time ``parse_log_line`` and the compiled parser over a log file."""
+    _quiet_logging()
+    from parsers.log import get_log_parser, parse_log_line
+
+    with open(log_path, encoding="utf-8") as file:
+        lines = file.readlines()
+
+    started = time.perf_counter()
+    parsed = sum(1 for line in lines if parse_log_line(line) is not None)
+    legacy_seconds = time.perf_counter() - started
+
+    _, parse_record = get_log_parser(str(log_path))
+    started = time.perf_counter()
+    compiled_parsed = sum(1 for line in lines if parse_record(line) is not None)
+    compiled_seconds = time.perf_counter() - started
+
+    return {
+        "lines": len(lines),
+        "seconds": round(legacy_seconds, 3),
+        "lines_per_second": round(len(lines) / legacy_seconds),
+        "rows": parsed,
+        "compiled_seconds": round(compiled_seconds, 3),
+        "compiled_lines_per_second": round(len(lines) / compiled_seconds),
+        "compiled_rows": compiled_parsed,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def run_database_stage(
+    stage: str,
+    log_path,
+    database_type: str,
+    database_url: str,
+    workers: int = 1,
+    increments: int = 10,
+) -> dict:
+    """Run ``import_logs`` or ``process_logs`` against one database.
+
+    Meant to run in a fresh process: configuration is read from the
+    environment when the project modules are first imported.
+    """
+    os.environ["DATABASE_TYPE"] = database_type
+    os.environ["DATABASE_STRING_CONNECTION"] = database_url
+    _quiet_logging()
+    from parsers.log import import_logs, process_logs
+
+    _reset_benchmark_data()
+    log_path = Path(log_path)
+    lines = 0
+
+    if stage == "import_logs":
+        started = time.perf_counter()
+        summary = import_logs(str(log_path), workers=workers)
+        seconds = time.perf_counter() - started
+        lines = summary["processed_lines"]
+        pipeline = summary.get("pipeline", {})
+    else:
+        # Grow a live log the way Squid does and poll it like the scheduler.
+        live_path = log_path.with_name(log_path.name + ".live")
+        data = log_path.read_bytes()
+        cut_points = _newline_cuts(data, increments)
+        live_path.write_bytes(b"")
+        seconds = 0.0
+        pipeline = {}
+        previous = 0
+        try:
+            for cut in cut_points:
+                with open(live_path, "ab") as live:
+                    live.write(data[previous:cut])
+                previous = cut
+                started = time.perf_counter()
+                summary = process_logs(str(live_path))
+                seconds += time.perf_counter() - started
+                lines += summary["processed_lines"]
+                pipeline = summary.get("pipeline", pipeline)
+        finally:
+            live_path.unlink(missing_ok=True)
+
+    rows = _count_benchmark_rows()
+    return {
+        "lines": lines,
+        "seconds": round(seconds, 3),
+        "lines_per_second": round(lines / seconds) if seconds else 0,
+        "rows": rows,
+        "peak_rss_mb": _peak_rss_mb(),
+        "max_queue_depth": pipeline.get("max_queue_depth"),
+    }
+
+
+def _newline_cuts(data: bytes, increments: int) -> list[int]:
+    cuts = []
+    step = max(1, len(data) // max(1, increments))
+    position = 0
+    while position < len(data):
+        newline = data.find(b"\n", position + step - 1)
+        position = len(data) if newline == -1 else newline + 1
+        cuts.append(position)
+    return cuts
+
+
+def _benchmark_tables(engine) -> list[str]:
+    from sqlalchemy import inspect
+
+    return [
+        name
+        for name in inspect(engine).get_table_names()
+        if name.startswith(("user_2001", "log_2001"))
+    ]
+
+
+def _benchmark_range() -> tuple[datetime, datetime]:
+    return BENCHMARK_START, BENCHMARK_START + timedelta(days=366)
+
+
+def _reset_benchmark_data() -> None:
+    from sqlalchemy import Table
+
+    from database.database import (
+        Base,
+        DeniedLog,
+        LogMetadata,
+        dynamic_model_cache,
+        get_engine,
+        get_session,
+    )
+
+    engine = get_engine()
+    Base.metadata.create_all(engine, checkfirst=True)
+    for table_name in _benchmark_tables(engine):
+        Table(table_name, Base.metadata.__class__()).drop(engine, checkfirst=True)
+    dynamic_model_cache.clear()
+
+    first, last = _benchmark_range()
+    session = get_session()
+    try:
+        session.query(DeniedLog).filter(
+            DeniedLog.created_at >= first, DeniedLog.created_at < last
+        ).delete(synchronize_session=False)
+        session.query(LogMetadata).delete(synchronize_session=False)
+        session.commit()
+    finally:
+        session.close()
+
+
+def _count_benchmark_rows() -> dict:
+    from sqlalchemy import func, select, table
+
+    from database.database import DeniedLog, get_engine, get_session
+
+    engine = get_engine()
+    rows = {"users": 0, "logs": 0, "denied": 0}
+    first, last = _benchmark_range()
+    with engine.connect() as connection:
+        for table_name in _benchmark_tables(engine):
+            key = "users" if table_name.startswith("user_") else "logs"
+            rows[key] += connection.execute(
+                select(func.count()).select_from(table(table_name))
+            ).scalar_one()
+    session = get_session()
+    try:
+        rows["denied"] = (
+            session.query(func.count(DeniedLog.id))
+            .filter(DeniedLog.created_at >= first, DeniedLog.created_at < last)
+            .scalar()
+        )
+    finally:
+        session.close()
+    return rows
+
+
+# ---------------------------------------------------------------------------
+# Databases and driver
+# ---------------------------------------------------------------------------
+
+
+def _database_targets(args, workdir: Path) -> list[tuple[str, str, str]]:
+    """Return ``(label, DATABASE_TYPE, DATABASE_STRING_CONNECTION)`` targets."""
+    targets = [("sqlite", "SQLITE", str(workdir / "benchmark.db"))]
+    for label, database_type, url in (
+        ("postgresql", "POSTGRESQL", args.postgres_url),
+        ("mysql", "MYSQL", args.mysql_url),
+    ):
+        if not url:
+            continue
+        reachable, reason = _server_reachable(url)
+        if reachable:
+            targets.append((label, database_type, url))
+        else:
+            print(f"Skipping {label}: {reason}", file=sys.stderr)
+    return targets
+
+
+def _server_reachable(url: str) -> tuple[bool, str]:
+    from sqlalchemy import create_engine, text
+
+    try:
+        engine = create_engine(url)
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        engine.dispose()
+        return True, ""
+    except Exception as error:
+        return False, str(error).splitlines()[0]
+
+
+def _run_isolated(function, *args, **kwargs) -> dict:
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        return pool.submit(function, *args, **kwargs).result()
+
+
+def run_benchmark(args) -> list[dict]:
+    generator = LogGenerator(
+        users=args.users,
+        urls=args.urls,
+        denied_ratio=args.denied_ratio,
+        days=args.days,
+        seed=args.seed,
+    )
+    results = []
+    with tempfile.TemporaryDirectory(prefix="squidstats-bench-") as tmp:
+        workdir = Path(tmp)
+        targets = _database_targets(args, workdir)
+        for log_format in args.formats:
+            log_path = workdir / f"access-{log_format}.log"
+            size = generator.write(log_path, log_format, args.lines)
+            base = {"format": log_format, "file_mb": round(size / 1024 / 1024, 1)}
+
+            results.append(
+                {
+                    **base,
+                    "stage": "parse",
+                    "database": "-",
+                    **_run_isolated(run_parse_stage, log_path),
+                }
+            )
+            for label, database_type, url in targets:
+                if database_type == "SQLITE":
+                    Path(url).unlink(missing_ok=True)
+                for stage in ("import_logs", "process_logs"):
+                    results.append(
+                        {
+                            **base,
+                            "stage": stage,
+                            "database": label,
+                            **_run_isolated(
+                                run_database_stage,
+                                stage,
+                                log_path,
+                                database_type,
+                                url,
+                                workers=args.workers,
+                                increments=args.increments,
+                            ),
+                        }
+                    )
+    return results
+
+
+def format_results(results: list[dict]) -> str:
+    header = (
+        f"{'format':<8} {'stage':<13} {'database':<10} {'lines':>9} "
+        f"{'lines/s':>9} {'peak MB':>8} {'rows (users/logs/denied)':>26}"
+    )
+    lines = [header, "-" * len(header)]
+    for result in results:
+        rows = result["rows"]
+        if isinstance(rows, dict):
+            rows = f"{rows['users']}/{rows['logs']}/{rows['denied']}"
+        lines.append(
+            f"{result['format']:<8} {result['stage']:<13} {result['database']:<10} "
+            f"{result['lines']:>9} {result['lines_per_second']:>9} "
+            f"{result['peak_rss_mb']:>8} {rows!s:>26}"
+        )
+        if result["stage"] == "parse":
+            lines.append(
+                f"{'':<8} {'(compiled)':<13} {'-':<10} {result['lines']:>9} "
+                f"{result['compiled_lines_per_second']:>9}"
+            )
+    return "\n".join(lines)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark SquidStats access-log ingestion."
+    )
+    parser.add_argument("--lines", type=int, default=200_000)
+    parser.add_argument(
+        "--formats",
+        default=",".join(FORMATS),
+        type=lambda value: [item.strip() for item in value.split(",") if item.strip()],
+        help="comma-separated subset of: " + ", ".join(FORMATS),
+    )
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--urls", type=int, default=5000)
+    parser.add_argument("--denied-ratio", type=float, default=0.05)
+    parser.add_argument("--days", type=int, default=1, help="days the log spans")
+    parser.add_argument("--seed", type=int, default=2001)
+    parser.add_argument(
+        "--increments",
+        type=int,
+        default=10,
+        help="appends (and process_logs runs) the live-log stage is split into",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="import_logs worker processes"
+    )
+    parser.add_argument(
+        "--postgres-url", default=os.getenv("SQUIDSTATS_BENCH_POSTGRES_URL")
+    )
+    parser.add_argument("--mysql-url", default=os.getenv("SQUIDSTATS_BENCH_MYSQL_URL"))
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    unknown = sorted(set(args.formats).difference(FORMATS))
+    if unknown:
+        parser.error(f"unknown formats: {', '.join(unknown)}")
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    results = run_benchmark(args)
+    print(format_results(results))
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the data behind the ``/logs`` page on a database with many days.
+
+Builds a SQLite database holding ``--days`` daily user/log table pairs, fills
+the most recent day with ``--users`` users and ``--logs-per-user`` log rows
+each, and times ``get_users_logs`` for one page of that day with:
+
+* ``automap``         - the former model lookup, which reflected every table
+                        of the database (``automap_base().prepare``) twice
+                        per page view;
+* ``registry (cold)`` - the first view of the day, which maps its two tables;
+* ``registry (warm)`` - later views, served from the model registry.
+
+Usage:
+    python tools/benchmark_logs_page.py [--days 500] [--users 200]
+        [--logs-per-user 20] [--repeat 5] [--database PATH]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+LAST_DAY = date(2001, 12, 31)
+
+
+def _quiet_logging() -> None:
+    from loguru import logger
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+
+def _automap_model(db, table_name: str, date_suffix: str):
+    """The ``get_dynamic_model`` lookup the registry replaced."""
+    from sqlalchemy.ext.automap import automap_base
+
+    Base = automap_base()
+    Base.prepare(autoload_with=db.get_bind())
+    return getattr(Base.classes, f"{table_name}_{date_suffix}", None)
+
+
+def build_database(days: int, users: int, logs_per_user: int) -> str:
+    """Create the daily tables and fill the last day; returns its suffix."""
+    from sqlalchemy import insert
+
+    from database.database import get_engine
+    from database.models.models import create_dynamic_models
+    from database.partitions import create_day_partitions, partitioned_storage
+
+    engine = get_engine()
+    # Oldest day first, so the models left over belong to LAST_DAY.
+    for offset in reversed(range(days)):
+        suffix = (LAST_DAY - timedelta(days=offset)).strftime("%Y%m%d")
+        if partitioned_storage(engine):
+            create_day_partitions(engine, f"user_{suffix}", f"log_{suffix}")
+        UserModel, LogModel = create_dynamic_models(
+            engine, f"user_{suffix}", f"log_{suffix}", ensure_indexes=False
+        )
+
+    with engine.begin() as conn:
+        conn.execute(
+            insert(UserModel),
+            [
+                {"username": f"user{index:04d}", "ip": f"10.0.{index // 250}.{index}"}
+                for index in range(1, users + 1)
+            ],
+        )
+        conn.execute(
+            insert(LogModel),
+            [
+                {
+                    "user_id": user_id,
+                    "url": f"https://site{entry}.example.com/",
+                    "response": 200,
+                    "request_count": 1 + entry,
+                    "data_transmitted": 1000 * entry,
+                }
+                for user_id in range(1, users + 1)
+                for entry in range(logs_per_user)
+            ],
+        )
+    return suffix
+
+
+def _time_page(date_suffix: str) -> float:
+    from database.database import get_session
+    from services.analytics.fetch_data_logs import get_users_logs
+
+    started = time.perf_counter()
+    result = get_users_logs(get_session(), date_suffix, page=1, per_page=15)
+    elapsed = time.perf_counter() - started
+    if not result["users"]:
+        raise RuntimeError(f"No users returned for {date_suffix}")
+    return elapsed
+
+
+def run_benchmark(args) -> list[dict]:
+    os.environ["DATABASE_TYPE"] = "SQLITE"
+    os.environ["DATABASE_STRING_CONNECTION"] = str(args.database)
+    _quiet_logging()
+
+    from database.database import dynamic_model_cache
+    from database.table_catalog import table_catalog
+    from services.analytics import fetch_data_logs
+
+    Path(args.database).unlink(missing_ok=True)
+    started = time.perf_counter()
+    date_suffix = build_database(args.days, args.users, args.logs_per_user)
+    print(
+        f"Built {args.days} daily table pairs in {time.perf_counter() - started:.1f}s",
+        file=sys.stderr,
+    )
+
+    results = []
+    registry_model = fetch_data_logs.get_dynamic_model
+    fetch_data_logs.get_dynamic_model = _automap_model
+    try:
+        samples = [_time_page(date_suffix) for _ in range(args.repeat)]
+    finally:
+        fetch_data_logs.get_dynamic_model = registry_model
+    results.append({"lookup": "automap", "samples": samples})
+
+    dynamic_model_cache.clear()
+    table_catalog.invalidate()
+    results.append({"lookup": "registry (cold)", "samples": [_time_page(date_suffix)]})
+    results.append(
+        {
+            "lookup": "registry (warm)",
+            "samples": [_time_page(date_suffix) for _ in range(args.repeat)],
+        }
+    )
+    return results
+
+
+def format_results(results: list[dict], days: int) -> str:
+    header = f"{'lookup':<17} {'tables':>7} {'median ms':>10} {'max ms':>9}"
+    lines = [header, "-" * len(header)]
+    for result in results:
+        samples = [sample * 1000 for sample in result["samples"]]
+        lines.append(
+            f"{result['lookup']:<17} {days * 2:>7} "
+            f"{statistics.median(samples):>10.1f} {max(samples):>9.1f}"
+        )
+    return "\n".join(lines)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the /logs page lookup on many daily tables."
+    )
+    parser.add_argument("--days", type=int, default=500)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--logs-per-user", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--database",
+        default=str(Path(tempfile.gettempdir()) / "squidstats_logs_bench.db"),
+        help="scratch SQLite file (overwritten)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    print(format_results(run_benchmark(args), args.days))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the host parsing done by the analytics over one day's URLs.
+
+Generates ``--urls`` distinct URLs spread over ``--hosts`` hosts (plain
+requests and ``host:443`` CONNECT tunnels) and measures the CPU time needed
+to derive, for every URL, the report country and the registrable domain:
+
+* ``urllib.parse``   - the former helpers: ``urlparse`` (twice for CONNECT
+                       entries) per URL, then the labels split per URL;
+* ``url_parsing``    - ``url_host`` plus ``host_info`` with its cache
+                       disabled, i.e. the string parsing alone;
+* ``url_parsing+LRU``- the shared ``host_info`` cache, which resolves each
+                       host once however many URLs point to it.
+
+Usage:
+    python tools/benchmark_url_parsing.py [--urls 1000000] [--hosts 20000]
+        [--repeat 3]
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+SUFFIXES = ("com", "net", "org", "cu", "com.cu", "co.uk", "es", "io", "com.br")
+
+
+def build_urls(count: int, hosts: int, seed: int = 1) -> list[str]:
+    rng = random.Random(seed)  # noqa: S311 - reproducible sample data
+    names = [
+        f"{rng.choice(('www.', 'cdn.', 'api.', ''))}site{index}.{rng.choice(SUFFIXES)}"
+        for index in range(hosts)
+    ]
+    urls = []
+    for index in range(count):
+        host = names[index % hosts]
+        if index % 5 == 0:
+            urls.append(f"{host}:443")
+        else:
+            urls.append(f"http://{host}/page/{index}?q={index % 97}")
+    return urls
+
+
+def _former_hostname(url: str) -> str:
+    try:
+        hostname = urlparse(url).hostname
+        if not hostname and url and "://" not in url:
+            hostname = urlparse("http://" + url).hostname
+    except ValueError:
+        return ""
+    return hostname or ""
+
+
+def _former_country(hostname: str) -> str:
+    labels = hostname.split(".")
+    if len(labels) < 2:
+        return "Otros"
+    tld = labels[-1]
+    return tld.upper() if len(tld) == 2 else "Global"
+
+
+def _former_domain(hostname: str) -> str:
+    if hostname.startswith("www."):
+        hostname = hostname[4:]
+    parts = [part for part in hostname.split(".") if part]
+    return ".".join(parts[-2:]) if len(parts) >= 2 else hostname or "unknown"
+
+
+def run_former(urls) -> int:
+    seen = 0
+    for url in urls:
+        hostname = _former_hostname(url)
+        _former_country(hostname)
+        _former_domain(_former_hostname(url))
+        seen += 1
+    return seen
+
+
+def _shared_country(info) -> str:
+    """``get_reports._country_from_hostname`` on an already parsed host."""
+    if not info.tld:
+        return "Otros"
+    return info.tld.upper() if len(info.tld) == 2 else "Global"
+
+
+def run_shared(urls, lookup) -> int:
+    from utils.url_parsing import url_host
+
+    seen = 0
+    for url in urls:
+        info = lookup(url_host(url))
+        _shared_country(info)
+        info.domain  # noqa: B018
+        seen += 1
+    return seen
+
+
+def _cpu(function, *args) -> float:
+    started = time.process_time()
+    function(*args)
+    return time.process_time() - started
+
+
+def run_benchmark(args) -> list[dict]:
+    from loguru import logger
+
+    logger.remove()
+    from utils.url_parsing import host_info
+
+    urls = build_urls(args.urls, args.hosts)
+    results = [
+        {
+            "parser": "urllib.parse",
+            "samples": [_cpu(run_former, urls) for _ in range(args.repeat)],
+        },
+    ]
+
+    uncached = host_info.__wrapped__
+    results.append(
+        {
+            "parser": "url_parsing",
+            "samples": [_cpu(run_shared, urls, uncached) for _ in range(args.repeat)],
+        }
+    )
+    samples = []
+    for _ in range(args.repeat):
+        host_info.cache_clear()
+        samples.append(_cpu(run_shared, urls, host_info))
+    results.append({"parser": "url_parsing+LRU", "samples": samples})
+    return results
+
+
+def format_results(results: list[dict], urls: int, hosts: int) -> str:
+    header = f"{'parser':<16} {'urls':>9} {'hosts':>7} {'median s':>9} {'us/url':>7}"
+    lines = [header, "-" * len(header)]
+    for result in results:
+        median = statistics.median(result["samples"])
+        lines.append(
+            f"{result['parser']:<16} {urls:>9} {hosts:>7} "
+            f"{median:>9.2f} {median / urls * 1e6:>7.2f}"
+        )
+    return "\n".join(lines)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark host parsing over a day of distinct URLs."
+    )
+    parser.add_argument("--urls", type=int, default=1_000_000)
+    parser.add_argument("--hosts", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    print(format_results(run_benchmark(args), args.urls, args.hosts))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
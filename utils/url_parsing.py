@@ -0,0 +1,198 @@
+"""Host extraction from the URLs Squid writes to access.log.
+
+Plain requests are logged as ``scheme://[user@]host[:port]/path`` and CONNECT
+tunnels as ``host:port``; both reduce to the same lowercase host here.  Plain
+string operations are used instead of ``urllib.parse`` because analytics call
+them once per distinct URL of a day.
+
+A busy day has far fewer hosts than URLs, so everything derived from a host
+(registrable domain, public suffix, TLD) is computed by ``host_info`` once per
+host and kept in a bounded LRU cache (``Config.HOST_CACHE_SIZE``) shared by
+the importer, the reports and the blacklist views.
+
+Registrable domains follow the public suffix rules: ``news.bbc.co.uk``
+belongs to ``bbc.co.uk``, not ``co.uk``.  A built-in list covers the common
+multi-label suffixes; ``Config.PUBLIC_SUFFIX_FILE`` may point to a full
+``public_suffix_list.dat`` (https://publicsuffix.org/list/) instead.
+"""
+
+from functools import cache, lru_cache
+from typing import NamedTuple
+
+from loguru import logger
+
+from config import Config
+
+# Multi-label public suffixes seen most in proxy logs.  Single-label TLDs need
+# no entry: a host without a listed suffix uses its last label.
+DEFAULT_PUBLIC_SUFFIXES = frozenset(
+    """
+    com.cu edu.cu gob.cu inf.cu nat.cu net.cu org.cu sld.cu
+    com.ar edu.ar gob.ar gov.ar int.ar mil.ar net.ar org.ar
+    com.bo edu.bo gob.bo net.bo org.bo
+    com.br edu.br gov.br net.br org.br
+    gob.cl
+    com.co edu.co gov.co net.co org.co
+    co.cr ed.cr go.cr or.cr
+    com.do edu.do gob.do net.do org.do
+    com.ec edu.ec gob.ec net.ec org.ec
+    com.es edu.es gob.es nom.es org.es
+    com.gt edu.gt gob.gt net.gt org.gt
+    com.hn edu.hn gob.hn net.hn org.hn
+    com.mx edu.mx gob.mx net.mx org.mx
+    com.ni edu.ni gob.ni net.ni org.ni
+    com.pa edu.pa gob.pa net.pa org.pa
+    com.pe edu.pe gob.pe net.pe org.pe
+    com.py edu.py gov.py net.py org.py
+    com.sv edu.sv gob.sv org.sv
+    com.uy edu.uy gub.uy net.uy org.uy
+    co.ve com.ve edu.ve gob.ve net.ve org.ve
+    ac.uk co.uk gov.uk ltd.uk me.uk mod.uk net.uk nhs.uk org.uk plc.uk
+    police.uk sch.uk
+    com.au edu.au gov.au net.au org.au
+    co.nz govt.nz net.nz org.nz
+    co.za gov.za org.za
+    ac.jp co.jp go.jp ne.jp or.jp
+    com.cn edu.cn gov.cn net.cn org.cn
+    com.hk com.sg com.tw com.tr com.ua com.ru
+    ac.in co.in gov.in net.in org.in
+    co.kr go.kr or.kr
+    co.id go.id or.id
+    co.il org.il
+    com.my com.ph com.pk com.vn com.eg com.sa
+    appspot.com blogspot.com cloudfront.net github.io herokuapp.com
+    netlify.app pages.dev vercel.app web.app firebaseapp.com
+    """.split()
+)
+
+
+class HostInfo(NamedTuple):
+    host: str
+    # Registrable domain ("bbc.co.uk"); the host itself for IPs, single
+    # labels and bare public suffixes; "unknown" when there is no host.
+    domain: str
+    # Public suffix ("co.uk", "com"); "" for IP addresses.
+    suffix: str
+    # Top-level label of the suffix ("uk", "com"); "" for IP addresses and
+    # hosts without a dot.
+    tld: str
+    is_ip: bool
+
+
+class PublicSuffixes:
+    """Public suffix rules: plain (``co.uk``), wildcard (``*.ck``), exception."""
+
+    def __init__(self, rules=()):
+        self.rules: set[str] = set()
+        self.wildcards: set[str] = set()
+        self.exceptions: set[str] = set()
+        for rule in rules:
+            rule = rule.strip().lower()
+            if not rule or rule.startswith("//"):
+                continue
+            rule = rule.split()[0]
+            if rule.startswith("!"):
+                self.exceptions.add(rule[1:])
+            elif rule.startswith("*."):
+                self.wildcards.add(rule[2:])
+            else:
+                self.rules.add(rule)
+
+    @classmethod
+    def from_file(cls, path: str) -> "PublicSuffixes":
+        """Rules of a file in the ``public_suffix_list.dat`` format."""
+        with open(path, encoding="utf-8") as rules:
+            return cls(rules)
+
+    def suffix(self, host: str) -> str:
+        """Longest public suffix of ``host`` (its last label by default)."""
+        for candidate in host_suffixes(host):
+            if candidate in self.exceptions:
+                return candidate.partition(".")[2]
+            if candidate in self.rules or (
+                candidate.partition(".")[2] in self.wildcards
+            ):
+                return candidate
+        return host.rpartition(".")[2]
+
+
+@cache
+def public_suffixes() -> PublicSuffixes:
+    """The suffix rules in use, loaded once per process."""
+    if Config.PUBLIC_SUFFIX_FILE:
+        try:
+            return PublicSuffixes.from_file(Config.PUBLIC_SUFFIX_FILE)
+        except OSError as exc:
+            logger.warning(
+                f"Public suffix file {Config.PUBLIC_SUFFIX_FILE} unreadable "
+                f"({exc}); using the built-in list"
+            )
+    return PublicSuffixes(DEFAULT_PUBLIC_SUFFIXES)
+
+
+def url_host(url: str) -> str:
+    """Lowercase host of a logged URL, without credentials or port ("" if none)."""
+    if not url:
+        return ""
+    url = url.strip()
+    scheme_end = url.find("://")
+    if scheme_end != -1:
+        url = url[scheme_end + 3 :]
+
+    end = len(url)
+    for separator in "/?#":
+        index = url.find(separator, 0, end)
+        if index != -1:
+            end = index
+    netloc = url[:end].rpartition("@")[2]
+
+    if netloc.startswith("["):
+        host = netloc[1:].partition("]")[0]
+    elif netloc.count(":") > 1:
+        host = netloc  # bare IPv6 address
+    else:
+        host = netloc.partition(":")[0]
+    return host.rstrip(".").lower()
+
+
+def _is_ip(host: str) -> bool:
+    return ":" in host or host.replace(".", "").isdigit()
+
+
+@lru_cache(maxsize=Config.HOST_CACHE_SIZE or None)
+def host_info(host: str) -> HostInfo:
+    """Registrable domain and public suffix of a host from ``url_host``."""
+    if not host:
+        return HostInfo(host, "unknown", "", "", False)
+    if _is_ip(host):
+        return HostInfo(host, host, "", "", True)
+    suffix = public_suffixes().suffix(host)
+    tld = suffix.rpartition(".")[2] if "." in host else ""
+    if suffix == host:
+        return HostInfo(host, host, suffix, tld, False)
+    label = host[: -len(suffix) - 1].rpartition(".")[2]
+    return HostInfo(host, f"{label}.{suffix}" if label else host, suffix, tld, False)
+
+
+def url_info(url: str) -> HostInfo:
+    """``host_info`` of the host of a logged URL."""
+    return host_info(url_host(url))
+
+
+def parent_domain(host: str) -> str:
+    """Registrable domain of ``host`` ("unknown" if empty)."""
+    return host_info(host).domain
+
+
+def host_suffixes(host: str):
+    """``host`` followed by each of its parent domains, longest first.
+
+    ``a.b.example.com`` yields ``a.b.example.com``, ``b.example.com``,
+    ``example.com`` and ``com``.
+    """
+    index = 0
+    while True:
+        yield host[index:]
+        index = host.find(".", index) + 1
+        if index == 0 or index == len(host):
+            return